@@ -1,3 +1,4 @@
+import re
 from enum import Enum
 
 
@@ -49,9 +50,32 @@ EVENT_INDEXES_BY_INSTANCES = dict(
     ALL="event_manager*",
 )
 
+
+EVENT_DEAD_LETTER_INDEX = "event_dead_letter"
+
+
+class InventoryStateIndexes(Enum):
+    TMO = "event_state_object_type"
+    MO = "event_state_object"
+    TPRM = "event_state_parameter_type"
+    PRM = "event_state_parameter"
+
+
 INSTANCE_BY_EVENT_MANAGER_INDEX = {
     InventoryChangesIndexes.TMO.value: "TMO",
     InventoryChangesIndexes.MO.value: "MO",
     InventoryChangesIndexes.TPRM.value: "TPRM",
     InventoryChangesIndexes.PRM.value: "PRM",
 }
+
+# rebuilt, legacy and rollover backing indexes behind the events aliases
+_EVENT_INDEX_NAME = re.compile(
+    r"^(?:rebuild_|legacy_)?(event_manager_[a-z_]+?)(?:_\d{14})?(?:-\d+)*$"
+)
+
+
+def get_instance_by_event_index(index: str) -> str | None:
+    match = _EVENT_INDEX_NAME.match(index)
+    if match is None:
+        return None
+    return INSTANCE_BY_EVENT_MANAGER_INDEX.get(match.group(1))
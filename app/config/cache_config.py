@@ -0,0 +1,31 @@
+import os
+
+# off by default: entries go stale when another consumer, the migration
+# consumer or a replay writes the same instances
+ACTIVE_EVENTS_CACHE_MAX_BYTES = int(
+    os.environ.get("ACTIVE_EVENTS_CACHE_MAX_BYTES", 0)
+)
+
+PARAMETER_TYPE_CACHE_MAX_SIZE = int(
+    os.environ.get("PARAMETER_TYPE_CACHE_MAX_SIZE", 100_000)
+)
+PARAMETER_TYPE_CACHE_TTL_SECONDS = int(
+    os.environ.get("PARAMETER_TYPE_CACHE_TTL_SECONDS", 300)
+)
+
+LINKED_VALUE_CACHE_MAX_SIZE = int(
+    os.environ.get("LINKED_VALUE_CACHE_MAX_SIZE", 100_000)
+)
+LINKED_VALUE_CACHE_TTL_SECONDS = int(
+    os.environ.get("LINKED_VALUE_CACHE_TTL_SECONDS", 60)
+)
+
+USER_DIRECTORY_CACHE_MAX_SIZE = int(
+    os.environ.get("USER_DIRECTORY_CACHE_MAX_SIZE", 10_000)
+)
+USER_DIRECTORY_CACHE_TTL_SECONDS = int(
+    os.environ.get("USER_DIRECTORY_CACHE_TTL_SECONDS", 600)
+)
+USER_DIRECTORY_MAX_CONCURRENT_REQUESTS = int(
+    os.environ.get("USER_DIRECTORY_MAX_CONCURRENT_REQUESTS", 10)
+)
@@ -7,5 +7,59 @@ ES_PASS = os.environ.get("ES_PASS", "")
 ES_USER = os.environ.get("ES_USER", "event_manager_user")
 ES_URL = f"{ES_PROTOCOL}://{ES_HOST}"
 
+ES_BULK_MAX_BYTES = int(os.environ.get("ES_BULK_MAX_BYTES", 10 * 1024 * 1024))
+ES_BULK_MAX_IN_FLIGHT = int(os.environ.get("ES_BULK_MAX_IN_FLIGHT", 2))
+ES_BULK_MAX_RETRIES = int(os.environ.get("ES_BULK_MAX_RETRIES", 5))
+ES_BULK_INITIAL_BACKOFF = float(os.environ.get("ES_BULK_INITIAL_BACKOFF", 0.5))
+ES_BULK_MAX_BACKOFF = float(os.environ.get("ES_BULK_MAX_BACKOFF", 30))
+ES_BULK_REQUEST_TIMEOUT = float(os.environ.get("ES_BULK_REQUEST_TIMEOUT", 60))
+
+ES_API_CONNECTIONS_PER_NODE = int(
+    os.environ.get("ES_API_CONNECTIONS_PER_NODE", 32)
+)
+ES_API_REQUEST_TIMEOUT = float(os.environ.get("ES_API_REQUEST_TIMEOUT", 30))
+ES_API_CURSOR_KEEP_ALIVE = os.environ.get("ES_API_CURSOR_KEEP_ALIVE", "5m")
+ES_API_EXPORT_PAGE_SIZE = int(os.environ.get("ES_API_EXPORT_PAGE_SIZE", 5000))
+
+ES_BACKPRESSURE_ENABLED = os.environ.get(
+    "ES_BACKPRESSURE_ENABLED", "True"
+).upper() in ("TRUE", "Y", "YES", "1")
+ES_BACKPRESSURE_TARGET_LATENCY = float(
+    os.environ.get("ES_BACKPRESSURE_TARGET_LATENCY", 2)
+)
+ES_BACKPRESSURE_PAUSE_LATENCY = float(
+    os.environ.get("ES_BACKPRESSURE_PAUSE_LATENCY", 10)
+)
+ES_BACKPRESSURE_PAUSE_REJECTION_RATE = float(
+    os.environ.get("ES_BACKPRESSURE_PAUSE_REJECTION_RATE", 0.5)
+)
+ES_BACKPRESSURE_PAUSE_SECONDS = float(
+    os.environ.get("ES_BACKPRESSURE_PAUSE_SECONDS", 15)
+)
+ES_BACKPRESSURE_MIN_BATCH_SIZE = int(
+    os.environ.get("ES_BACKPRESSURE_MIN_BATCH_SIZE", 500)
+)
+
+ES_STATE_INDEXES_ENABLED = os.environ.get(
+    "ES_STATE_INDEXES_ENABLED", "False"
+).upper() in ("TRUE", "Y", "YES", "1")
+
+ES_ROLLOVER_ENABLED = os.environ.get(
+    "ES_ROLLOVER_ENABLED", "False"
+).upper() in ("TRUE", "Y", "YES", "1")
+ES_ROLLOVER_MAX_AGE = os.environ.get("ES_ROLLOVER_MAX_AGE", "30d")
+ES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE = os.environ.get(
+    "ES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE", "50gb"
+)
+
+ES_EVENTS_INDEX_PROFILE = int(os.environ.get("ES_EVENTS_INDEX_PROFILE", 2))
+
+ES_ROUTING_ENABLED = os.environ.get("ES_ROUTING_ENABLED", "False").upper() in (
+    "TRUE",
+    "Y",
+    "YES",
+    "1",
+)
+
 if ES_PORT:
     ES_URL += f":{ES_PORT}"
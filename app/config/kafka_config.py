@@ -8,18 +8,59 @@ KAFKA_TURN_ON = (
 KAFKA_SECURED = (
     str(os.environ.get("KAFKA_SECURED", False)).upper() in AVAILABLE_TRUE_VALUES
 )
+KAFKA_CONSUMER_STANDALONE = (
+    str(os.environ.get("KAFKA_CONSUMER_STANDALONE", False)).upper()
+    in AVAILABLE_TRUE_VALUES
+)
 
 KAFKA_URL = os.environ.get("KAFKA_URL", "kafka:9092")
 KAFKA_CONSUMER_GROUP_ID = os.environ.get(
     "KAFKA_CONSUMER_GROUP_ID", "Event_Manager"
 )
 KAFKA_CONSUMER_OFFSET = os.environ.get("KAFKA_CONSUMER_OFFSET", "latest")
+KAFKA_MICRO_BATCHING = (
+    str(os.environ.get("KAFKA_MICRO_BATCHING", False)).upper()
+    in AVAILABLE_TRUE_VALUES
+)
+KAFKA_BATCH_MAX_OBJECTS = int(os.environ.get("KAFKA_BATCH_MAX_OBJECTS", 10_000))
+KAFKA_BATCH_MAX_WAIT_MS = int(os.environ.get("KAFKA_BATCH_MAX_WAIT_MS", 500))
+KAFKA_INGESTION_WORKERS = int(os.environ.get("KAFKA_INGESTION_WORKERS", 1))
+KAFKA_PROTOBUF_FAST_PATH = (
+    str(os.environ.get("KAFKA_PROTOBUF_FAST_PATH", True)).upper()
+    in AVAILABLE_TRUE_VALUES
+)
 KAFKA_SUBSCRIBE_TOPICS = os.environ.get(
     "KAFKA_SUBSCRIBE_TOPICS", "inventory.changes"
 )
 KAFKA_EVENT_CHANGES_TOPICS = os.environ.get(
     "KAFKA_EVENT_CHANGES_TOPICS", "event_migrate"
 )
+KAFKA_EVENT_CHANGES_TURN_ON = (
+    str(os.environ.get("KAFKA_EVENT_CHANGES_TURN_ON", False)).upper()
+    in AVAILABLE_TRUE_VALUES
+)
+KAFKA_EVENT_CHANGES_GROUP_ID = os.environ.get(
+    "KAFKA_EVENT_CHANGES_GROUP_ID", f"{KAFKA_CONSUMER_GROUP_ID}_Migration"
+)
+KAFKA_EVENT_CHANGES_OFFSET = os.environ.get(
+    "KAFKA_EVENT_CHANGES_OFFSET", "earliest"
+)
+KAFKA_EVENT_CHANGES_BATCH_MAX_OBJECTS = int(
+    os.environ.get("KAFKA_EVENT_CHANGES_BATCH_MAX_OBJECTS", 50_000)
+)
+KAFKA_EVENT_CHANGES_BATCH_MAX_WAIT_MS = int(
+    os.environ.get("KAFKA_EVENT_CHANGES_BATCH_MAX_WAIT_MS", 2_000)
+)
+KAFKA_EVENT_CHANGES_BULK_BATCH_SIZE = int(
+    os.environ.get("KAFKA_EVENT_CHANGES_BULK_BATCH_SIZE", 10_000)
+)
+KAFKA_EVENT_CHANGES_BULK_IN_FLIGHT = int(
+    os.environ.get("KAFKA_EVENT_CHANGES_BULK_IN_FLIGHT", 2)
+)
+KAFKA_EVENT_CHANGES_REFRESH_AFTER_BATCH = (
+    str(os.environ.get("KAFKA_EVENT_CHANGES_REFRESH_AFTER_BATCH", True)).upper()
+    in AVAILABLE_TRUE_VALUES
+)
 
 KAFKA_KEYCLOAK_SCOPES = os.environ.get("KAFKA_KEYCLOAK_SCOPES", "profile")
 KAFKA_KEYCLOAK_CLIENT_ID = os.environ.get("KAFKA_KEYCLOAK_CLIENT_ID", "kafka")
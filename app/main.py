@@ -5,15 +5,18 @@ from config import app_config
 from config.app_config import APP_PREFIX, APP_VERSION
 from config.kafka_config import (
     KAFKA_TURN_ON,
+    KAFKA_CONSUMER_STANDALONE,
 )
 from create_fastapi_app import create_app
 from routers.event_router.router import event_router
 from services.elastic_service.elastic_client import (
+    async_elastic_client,
     create_basic_indexes_if_not_exists,
 )
 from services.kafka_service.kafka_connection_utils import (
     start_kafka_consumer,
 )
+from services.user_service.user_directory import user_directory
 
 app = create_app(root_path=APP_PREFIX)
 
@@ -38,7 +41,13 @@ app_v1.include_router(event_router)
 
 @app.on_event("startup")
 async def on_startup():
-    if KAFKA_TURN_ON:
+    if KAFKA_TURN_ON and not KAFKA_CONSUMER_STANDALONE:
         start_kafka_consumer()
 
     create_basic_indexes_if_not_exists()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await async_elastic_client.close()
+    await user_directory.close()
@@ -3,3 +3,8 @@ class EventException(Exception):
         super().__init__(detail)
         self.status_code = status_code
         self.detail = detail
+
+
+class InvalidCursor(EventException):
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail, status_code=status_code)
@@ -0,0 +1,176 @@
+import base64
+import hashlib
+from typing import Any, AsyncIterator
+
+import orjson
+from elasticsearch import NotFoundError
+
+from config.elastic_config import ES_API_CURSOR_KEEP_ALIVE
+from routers.event_router.exceptions import InvalidCursor
+from services.elastic_service.elastic_client import async_elastic_client
+
+# tiebreaker of equal sort values, unique within a point in time
+_TIEBREAKER = {"_shard_doc": "asc"}
+
+
+def _get_query_hash(body: dict[str, Any]) -> str:
+    query = {
+        key: value
+        for key, value in body.items()
+        if key not in ("from", "size", "track_total_hits")
+    }
+    return hashlib.sha1(
+        orjson.dumps(query, option=orjson.OPT_SORT_KEYS), usedforsecurity=False
+    ).hexdigest()
+
+
+def encode_cursor(
+    pit_id: str, search_after: list, total: int, query_hash: str
+) -> str:
+    return base64.urlsafe_b64encode(
+        orjson.dumps(
+            {
+                "pit": pit_id,
+                "after": search_after,
+                "total": total,
+                "query": query_hash,
+            }
+        )
+    ).decode()
+
+
+def decode_cursor(cursor: str, query_hash: str) -> dict[str, Any]:
+    try:
+        state = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        pit_id, total = state["pit"], state["total"]
+        search_after = state["after"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Malformed cursor")
+
+    if state.get("query") != query_hash:
+        raise InvalidCursor("The cursor belongs to another query")
+
+    return {"pit": pit_id, "after": search_after, "total": total}
+
+
+def _get_page_body(
+    body: dict[str, Any],
+    pit_id: str,
+    search_after: list | None,
+    track_total_hits: bool,
+) -> dict[str, Any]:
+    page = {
+        key: value
+        for key, value in body.items()
+        if key not in ("from", "track_total_hits")
+    }
+    page["pit"] = {"id": pit_id, "keep_alive": ES_API_CURSOR_KEEP_ALIVE}
+    page["sort"] = [*body.get("sort", []), _TIEBREAKER]
+    page["track_total_hits"] = track_total_hits
+    if search_after is not None:
+        page["search_after"] = search_after
+    return page
+
+
+async def _open_point_in_time(index: str, routing: str | None) -> str:
+    response = await async_elastic_client.open_point_in_time(
+        index=index, keep_alive=ES_API_CURSOR_KEEP_ALIVE, routing=routing
+    )
+    return response["id"]
+
+
+async def _close_point_in_time(pit_id: str) -> None:
+    try:
+        await async_elastic_client.close_point_in_time(id=pit_id)
+    except NotFoundError:
+        pass
+
+
+async def search_page(
+    *,
+    index: str,
+    body: dict[str, Any],
+    cursor: str | None,
+    routing: str | None = None,
+    **params,
+) -> tuple[list[dict], int, str | None]:
+    """One page of hits after the cursor, from a point in time opened by
+    the first page, and the cursor of the next page. A page continues from
+    the sort values of the last hit, so it costs the same at any depth.
+    The total is counted on the first page and carried by the cursor."""
+    query_hash = _get_query_hash(body)
+    if cursor is None:
+        pit_id = await _open_point_in_time(index=index, routing=routing)
+        search_after, total = None, None
+    else:
+        state = decode_cursor(cursor, query_hash)
+        pit_id, search_after, total = (
+            state["pit"],
+            state["after"],
+            state["total"],
+        )
+
+    page = _get_page_body(
+        body=body,
+        pit_id=pit_id,
+        search_after=search_after,
+        track_total_hits=total is None,
+    )
+    try:
+        response = await async_elastic_client.search(body=page, **params)
+    except NotFoundError:
+        raise InvalidCursor("The cursor has expired", status_code=410)
+
+    hits = response["hits"]["hits"]
+    pit_id = response.get("pit_id", pit_id)
+    if total is None:
+        total = response["hits"]["total"]["value"]
+
+    if len(hits) < page.get("size", 10):
+        await _close_point_in_time(pit_id)
+        return hits, total, None
+
+    return (
+        hits,
+        total,
+        encode_cursor(
+            pit_id=pit_id,
+            search_after=hits[-1]["sort"],
+            total=total,
+            query_hash=query_hash,
+        ),
+    )
+
+
+async def iter_pages(
+    *,
+    index: str,
+    body: dict[str, Any],
+    page_size: int,
+    routing: str | None = None,
+    **params,
+) -> AsyncIterator[list[dict]]:
+    """Every hit of the query in pages of `page_size`, from a point in
+    time closed once the iteration ends or is abandoned."""
+    pit_id = await _open_point_in_time(index=index, routing=routing)
+    search_after = None
+    try:
+        while True:
+            page = _get_page_body(
+                body={**body, "size": page_size},
+                pit_id=pit_id,
+                search_after=search_after,
+                track_total_hits=False,
+            )
+            response = await async_elastic_client.search(body=page, **params)
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            if hits:
+                search_after = hits[-1]["sort"]
+                yield hits
+
+            if len(hits) < page_size:
+                break
+
+    finally:
+        await _close_point_in_time(pit_id)
@@ -1,33 +1,57 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from typing import Any
+from typing import Any, AsyncIterator
 
-import requests
+import orjson
 from sqlalchemy.orm import Session
 
 from common.constants import (
     InventoryChangesIndexes,
     ConditionsOrders,
-    INSTANCE_BY_EVENT_MANAGER_INDEX,
     EVENT_INDEXES_BY_INSTANCES,
+    get_instance_by_event_index,
 )
-from config.security_config import (
-    KEYCLOAK_REDIRECT_PROTOCOL,
-    KEYCLOAK_REDIRECT_HOST,
-    KEYCLOAK_REALM,
-    SECURITY_TYPE,
-)
+from config.elastic_config import ES_API_EXPORT_PAGE_SIZE
+from config.security_config import SECURITY_TYPE
+from routers.event_router.exceptions import EventException
+from routers.event_router.pagination import iter_pages, search_page
 from routers.event_router.schemas import (
     GetEventsByInstanceTypeRequest,
     GetParameterHistoryByObjectIdsRequest,
     GetEventsByInstanceTypeResponse,
     ElasticSearchResponse,
 )
-from services.elastic_service.elastic_client import elastic_client
+from services.elastic_service.elastic_client import (
+    async_elastic_client,
+    get_instance_routing,
+)
 from services.event_processor.inventory_processor.constants import (
     AvailableInventoryInstances,
+    PARAMETER_PARENT_FIELDS,
+)
+from services.event_processor.inventory_processor.typed_values import (
+    TYPED_VALUE_FIELDS,
 )
+from services.user_service.exceptions import (
+    UserDirectoryAccessDenied,
+    UserDirectoryUnavailable,
+)
+from services.user_service.user_directory import user_directory
+
+# indexed copies of event fields, stored for reindexing but not returned
+EVENT_SOURCE_EXCLUDES = [*TYPED_VALUE_FIELDS, *PARAMETER_PARENT_FIELDS]
+
+
+def get_pre_filter_shard_size(
+    request: GetEventsByInstanceTypeRequest
+    | GetParameterHistoryByObjectIdsRequest,
+) -> int | None:
+    # a date range lets the can match phase skip the backing indexes out of
+    # it before the query runs on their shards
+    if request.date_from or request.date_to:
+        return 1
+    return None
 
 
 class GetEventsByFilters:
@@ -95,6 +119,25 @@ class GetEventsByFilters:
 
         return query
 
+    @staticmethod
+    def _get_routing(request: GetEventsByInstanceTypeRequest) -> str | None:
+        # events of an instance share a shard, a required instance_id
+        # narrows the search to it
+        instance_ids = []
+        for filter_instance in request.filter_column:
+            if (
+                filter_instance.field != "instance_id"
+                or filter_instance.condition.value.lower()
+                != ConditionsOrders.AND.value.lower()
+            ):
+                continue
+            try:
+                instance_ids.append(int(filter_instance.value))
+            except (TypeError, ValueError):
+                return None
+
+        return get_instance_routing(instance_ids)
+
     @staticmethod
     def _create_sort_query(
         filter_query: dict, request: GetEventsByInstanceTypeRequest
@@ -106,22 +149,45 @@ class GetEventsByFilters:
         )
         return updated_query
 
-    def _get_event_instances_by_filters(self) -> ElasticSearchResponse:
-        filter_conditions = self._create_filter_query(request=self._request)
-        filter_with_sorting = self._create_sort_query(
-            filter_query=filter_conditions, request=self._request
-        )
+    def _get_index(self) -> str:
         index = InventoryChangesIndexes.ALL.value
         for filter_instance in self._request.filter_column:
             if filter_instance.field == "instance":
                 index = EVENT_INDEXES_BY_INSTANCES.get(
                     filter_instance.value, InventoryChangesIndexes.ALL.value
                 )
+        return index
 
-        response = elastic_client.search(
+    def _get_search_query(self) -> dict[str, Any]:
+        filter_conditions = self._create_filter_query(request=self._request)
+        query = self._create_sort_query(
+            filter_query=filter_conditions, request=self._request
+        )
+        query["_source"] = {"excludes": EVENT_SOURCE_EXCLUDES}
+        return query
+
+    async def _get_event_instances_by_filters(self) -> ElasticSearchResponse:
+        filter_with_sorting = self._get_search_query()
+        index = self._get_index()
+
+        if self._request.cursor_mode:
+            hits, total, next_cursor = await search_page(
+                index=index,
+                body=filter_with_sorting,
+                cursor=self._request.cursor,
+                routing=self._get_routing(self._request),
+                pre_filter_shard_size=get_pre_filter_shard_size(self._request),
+            )
+            return ElasticSearchResponse(
+                response=hits, total_count=total, next_cursor=next_cursor
+            )
+
+        response = await async_elastic_client.search(
             index=index,
             body=filter_with_sorting,
             track_total_hits=True,
+            pre_filter_shard_size=get_pre_filter_shard_size(self._request),
+            routing=self._get_routing(self._request),
         )
 
         return ElasticSearchResponse(
@@ -129,45 +195,90 @@ class GetEventsByFilters:
             total_count=response["hits"]["total"]["value"],
         )
 
-    def _get_username_by_user_ids(self) -> dict[str, str]:
-        url = f"{KEYCLOAK_REDIRECT_PROTOCOL}://{KEYCLOAK_REDIRECT_HOST}/admin/realms/{KEYCLOAK_REALM}/users"
-        response = requests.get(
-            url=url, headers={"Authorization": self._token}, timeout=10
-        )
-        return {
-            user_instance["id"]: user_instance["username"]
-            for user_instance in response.json()
+    async def check_user_access(self) -> None:
+        """Fail unless the caller may read the users its events are shown
+        with."""
+        if SECURITY_TYPE != "KEYCLOAK":
+            return
+
+        try:
+            await user_directory.check_access(self._token)
+        except UserDirectoryAccessDenied as e:
+            raise EventException(str(e), status_code=403)
+        except UserDirectoryUnavailable as e:
+            raise EventException(str(e), status_code=503)
+
+    async def _get_usernames(
+        self, hits: list[dict[str, Any]]
+    ) -> dict[str, str | None] | None:
+        if SECURITY_TYPE != "KEYCLOAK":
+            return None
+
+        await self.check_user_access()
+
+        user_ids = {
+            str(hit["_source"]["user_id"])
+            for hit in hits
+            if hit["_source"].get("user_id") is not None
         }
+        return await user_directory.get_usernames(user_ids, token=self._token)
 
+    @staticmethod
     def _replace_user_id_by_username(
-        self, parameter_event_instances: list[dict[str, Any]]
+        parameter_event_instances: list[dict[str, Any]],
+        username_by_user_id: dict[str, str] | None,
     ):
-        if SECURITY_TYPE == "KEYCLOAK":
-            username_by_user_id = self._get_username_by_user_ids()
-
+        if username_by_user_id is not None:
             for event_instance in parameter_event_instances:
+                user_id = event_instance["_source"].get("user_id")
                 event_instance["_source"]["user_id"] = username_by_user_id.get(
-                    event_instance["_source"]["user_id"]
+                    str(user_id)
                 )
 
         return parameter_event_instances
 
-    def execute(self):
-        event_instances = self._get_event_instances_by_filters()
-        hits = self._replace_user_id_by_username(event_instances.response)
-
+    @staticmethod
+    def _get_events(hits: list[dict[str, Any]]) -> list[dict[str, Any]]:
         response = []
         for event in hits:
             data = event["_source"]
-            data["instance"] = INSTANCE_BY_EVENT_MANAGER_INDEX.get(
-                event["_index"]
-            )
+            data["instance"] = get_instance_by_event_index(event["_index"])
             response.append(data)
+        return response
+
+    async def execute(self):
+        event_instances = await self._get_event_instances_by_filters()
+        hits = self._replace_user_id_by_username(
+            event_instances.response,
+            await self._get_usernames(event_instances.response),
+        )
+        response = self._get_events(hits)
 
         return GetEventsByInstanceTypeResponse(
-            data=response, total=event_instances.total_count
+            data=response,
+            total=event_instances.total_count,
+            next_cursor=event_instances.next_cursor,
         )
 
+    async def export(self) -> AsyncIterator[bytes]:
+        """Every event matching the filters as NDJSON lines, read page by
+        page from a point in time, so memory does not grow with the
+        export. Offset and limit of the request are ignored."""
+        async for hits in iter_pages(
+            index=self._get_index(),
+            body=self._get_search_query(),
+            page_size=ES_API_EXPORT_PAGE_SIZE,
+            routing=self._get_routing(self._request),
+            pre_filter_shard_size=get_pre_filter_shard_size(self._request),
+        ):
+            hits = self._replace_user_id_by_username(
+                hits, await self._get_usernames(hits)
+            )
+            yield b"".join(
+                orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+                for event in self._get_events(hits)
+            )
+
 
 class GetParameterEventsByObjectIds:
     def __init__(
@@ -179,6 +290,7 @@ class GetParameterEventsByObjectIds:
         self._request = request
         self._session = session
         self._token = token
+        self.next_cursor: str | None = None
 
     @staticmethod
     def _add_filter_by_date(
@@ -196,30 +308,14 @@ class GetParameterEventsByObjectIds:
             )
         return updated_query
 
-    def _get_query_for_getting_parameter_ids(self) -> dict[str, Any]:
-        query: dict[str, Any] = {
-            "query": {
-                "bool": {
-                    "filter": [
-                        {
-                            "terms": {
-                                "new_value_str": list(self._request.object_ids)
-                            }
-                        },
-                        {"term": {"attribute": "mo_id"}},
-                    ]
-                }
-            },
-            "_source": ["instance_id", "new_value"],
-        }
-        return query
-
-    def _get_query_for_parameter_values(self, parameter_ids: set[str]):
+    def _get_query_for_parameter_values(
+        self, object_ids: list[int]
+    ) -> dict[str, Any]:
         query = {
             "query": {
                 "bool": {
                     "filter": [
-                        {"terms": {"instance_id": list(parameter_ids)}},
+                        {"terms": {"mo_id": object_ids}},
                         {"term": {"attribute": "value"}},
                     ]
                 }
@@ -229,77 +325,119 @@ class GetParameterEventsByObjectIds:
             ],
             "from": self._request.offset,
             "size": self._request.limit,
+            # the parent ids are read to group the values
+            "_source": {"excludes": TYPED_VALUE_FIELDS},
         }
         query = self._add_filter_by_date(
             filter_query=query, request=self._request
         )
         return query
 
-    def execute(self):
-        query = self._get_query_for_getting_parameter_ids()
-        parameter_instances_on_requested_object_id = elastic_client.search(
-            index=InventoryChangesIndexes.PRM.value,
-            body=query,
-        )
+    async def _get_parameter_values(self) -> list[dict[str, Any]]:
+        # PRM events are routed by the PRM id, a search by object id goes
+        # to every shard
+        if self._request.cursor_mode:
+            hits, _, self.next_cursor = await search_page(
+                index=InventoryChangesIndexes.PRM.value,
+                body=self._get_query_for_parameter_values(
+                    object_ids=list(self._request.object_ids)
+                ),
+                cursor=self._request.cursor,
+                pre_filter_shard_size=get_pre_filter_shard_size(self._request),
+            )
+            return [hit["_source"] for hit in hits]
 
-        parameter_instances_on_requested_object_id = (
-            parameter_instances_on_requested_object_id["hits"]["hits"]
-        )
-        parameter_ids = set()
-        object_id_by_parameter_id = dict()
-        for instance in parameter_instances_on_requested_object_id:
-            parameter_id = instance["_source"]["instance_id"]
-            object_id = instance["_source"]["new_value"]
-            parameter_ids.add(parameter_id)
-            object_id_by_parameter_id[parameter_id] = object_id
-
-        parameter_instances = elastic_client.search(
+        parameter_instances = await async_elastic_client.search(
             index=InventoryChangesIndexes.PRM.value,
             body=self._get_query_for_parameter_values(
-                parameter_ids=parameter_ids
+                object_ids=list(self._request.object_ids)
             ),
             track_total_hits=True,
+            pre_filter_shard_size=get_pre_filter_shard_size(self._request),
         )
-        response_parameter_instances: list[dict[str, Any]] = []
+        return [
+            parameter_instance["_source"]
+            for parameter_instance in parameter_instances["hits"]["hits"]
+        ]
+
+    async def _get_parameter_values_by_object(
+        self, object_ids: list[int]
+    ) -> dict[int, tuple[list[dict[str, Any]], int]]:
+        """Page of the parameter values of every object and the number of
+        its values, one search per object in a single msearch."""
+        if not object_ids:
+            return {}
+
+        searches = []
+        for object_id in object_ids:
+            searches.append({})
+            searches.append(
+                {
+                    **self._get_query_for_parameter_values(
+                        object_ids=[object_id]
+                    ),
+                    "track_total_hits": True,
+                }
+            )
 
-        for parameter_instance in parameter_instances["hits"]["hits"]:
-            src = parameter_instance["_source"]
-            response_parameter_instances.append(src)
+        responses = await async_elastic_client.msearch(
+            index=InventoryChangesIndexes.PRM.value,
+            searches=searches,
+            pre_filter_shard_size=get_pre_filter_shard_size(self._request),
+        )
 
-        tprm_by_param: dict[int, Any] = {}
-        if parameter_ids:
-            tprm_hits = elastic_client.search(
-                index=InventoryChangesIndexes.PRM.value,
-                body={
-                    "query": {
-                        "bool": {
-                            "filter": [
-                                {"terms": {"instance_id": list(parameter_ids)}},
-                                {"term": {"attribute": {"value": "tprm_id"}}},
-                            ]
-                        }
-                    },
-                    "_source": ["instance_id", "new_value"],
-                },
-                track_total_hits=False,
-            )["hits"]["hits"]
-            tprm_by_param = {
-                th["_source"]["instance_id"]: int(th["_source"]["new_value"])
-                for th in tprm_hits
-            }
+        values_by_object = {}
+        for object_id, response in zip(object_ids, responses["responses"]):
+            if "error" in response:
+                raise EventException(
+                    response["error"].get("reason"),
+                    status_code=response.get("status", 500),
+                )
 
-        response = defaultdict(list)
-        for parameter_instance in response_parameter_instances:
-            parameter_id = parameter_instance.get("instance_id")
-            object_id = object_id_by_parameter_id[parameter_id]
+            values_by_object[object_id] = (
+                [hit["_source"] for hit in response["hits"]["hits"]],
+                response["hits"]["total"]["value"],
+            )
+        return values_by_object
 
-            parameter_instance["instance"] = (
-                AvailableInventoryInstances.PRM.value
+    @staticmethod
+    def _format_parameter_value(
+        parameter_instance: dict[str, Any],
+    ) -> dict[str, Any]:
+        parameter_instance.pop("mo_id", None)
+        parameter_instance["instance"] = AvailableInventoryInstances.PRM.value
+        parameter_instance["parameter_type_id"] = parameter_instance.pop(
+            "tprm_id", None
+        )
+        return parameter_instance
+
+    async def execute(self):
+        if self._request.per_object:
+            if self._request.cursor_mode:
+                raise EventException(
+                    "Cursors are not supported with per_object", 400
+                )
+
+            values_by_object = await self._get_parameter_values_by_object(
+                object_ids=list(dict.fromkeys(self._request.object_ids))
             )
-            parameter_instance["parameter_type_id"] = tprm_by_param.get(
-                parameter_id
+            return {
+                object_id: {
+                    "data": [
+                        self._format_parameter_value(parameter_instance)
+                        for parameter_instance in parameters
+                    ],
+                    "total": total,
+                }
+                for object_id, (parameters, total) in values_by_object.items()
+            }
+
+        response = defaultdict(list)
+        for parameter_instance in await self._get_parameter_values():
+            object_id = parameter_instance["mo_id"]
+            response[object_id].append(
+                self._format_parameter_value(parameter_instance)
             )
-            response[object_id].append(parameter_instance)
 
         return {
             object_id: {"data": parameters, "total": len(parameters)}
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from database import get_session
+from routers.event_router.exceptions import EventException
 from routers.event_router.processors import (
     GetEventsByFilters,
     GetParameterEventsByObjectIds,
@@ -11,6 +13,7 @@ from routers.event_router.schemas import (
     GetEventsByInstanceTypeResponse,
     GetParameterHistoryByObjectIdsRequest,
 )
+from routers.event_router.utils import gzip_stream
 
 event_router = APIRouter(tags=["Events"], prefix="/events")
 
@@ -43,13 +46,59 @@ async def get_events_by_filter(
         [{field: str,
           value: Any,
           condition: AND / OR}]
+
+    - **Deep pagination:** send `use_cursor: true` instead of an offset,
+      then the same request with `cursor` set to the returned
+      `next_cursor` until it is null
     """
     token = request.headers.get("Authorization")
 
     task = GetEventsByFilters(
         session=session, request=user_request, token=token
     )
-    return task.execute()
+    try:
+        return await task.execute()
+    except EventException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@event_router.post(path="/export_events_by_filter")
+async def export_events_by_filter(
+    request: Request,
+    user_request: GetEventsByInstanceTypeRequest,
+    gzip: bool = False,
+    session: Session = Depends(get_session),
+):
+    """
+    Streams every event matching the filters of `get_events_by_filter` as
+    NDJSON, one event per line in the requested order, gzip compressed
+    with `?gzip=true`. Offset, limit and cursor are ignored.
+    """
+    task = GetEventsByFilters(
+        session=session,
+        request=user_request,
+        token=request.headers.get("Authorization"),
+    )
+    # checked before the stream starts, as an error can't be sent after it
+    try:
+        await task.check_user_access()
+    except EventException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if gzip:
+        return StreamingResponse(
+            gzip_stream(task.export()),
+            media_type="application/gzip",
+            headers={
+                "Content-Disposition": "attachment; filename=events.ndjson.gz"
+            },
+        )
+
+    return StreamingResponse(
+        task.export(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=events.ndjson"},
+    )
 
 
 @event_router.post(
@@ -58,12 +107,27 @@ async def get_events_by_filter(
 )
 async def get_parameter_by_object_ids(
     request: Request,
+    response: Response,
     user_request: GetParameterHistoryByObjectIdsRequest,
     session: Session = Depends(get_session),
 ):
+    """
+    With `use_cursor: true` the cursor of the next page is returned in the
+    `X-Next-Cursor` header, to be sent as `cursor` with the same request.
+
+    With `per_object: true` every requested object gets its own page of
+    `offset` and `limit` and the `total` of its values.
+    """
     task = GetParameterEventsByObjectIds(
         session=session,
         request=user_request,
         token=request.headers.get("Authorization"),
     )
-    return task.execute()
+    try:
+        result = await task.execute()
+    except EventException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if task.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = task.next_cursor
+    return result
@@ -43,7 +43,18 @@ class SortBy(BaseModel):
         )
 
 
-class GetEventsByInstanceTypeRequest(BaseModel):
+class CursorPagination(BaseModel):
+    # pages follow a point in time instead of offsets, the first page is
+    # requested with use_cursor and the next ones with the returned cursor
+    use_cursor: bool = False
+    cursor: str | None = None
+
+    @property
+    def cursor_mode(self) -> bool:
+        return self.use_cursor or self.cursor is not None
+
+
+class GetEventsByInstanceTypeRequest(CursorPagination):
     filter_column: List[FilterColumn] = []
     sort_by: SortBy = SortBy(
         field="valid_from", descending=DescendingOrders.DESC.value
@@ -72,15 +83,20 @@ class GetEventsByInstanceTypeData(BaseModel):
 class GetEventsByInstanceTypeResponse(BaseModel):
     data: List[GetEventsByInstanceTypeData]
     total: int
+    next_cursor: str | None = None
 
 
-class GetParameterHistoryByObjectIdsRequest(BaseModel):
+class GetParameterHistoryByObjectIdsRequest(CursorPagination):
     date_to: datetime | None = None
     date_from: datetime | None = None
     limit: int = 10
     offset: int = 0
     object_ids: List[int]
     sort_by_datetime: DescendingOrders = DescendingOrders.DESC
+    # offset and limit apply to the values of each object and total is the
+    # number of values of the object, instead of a single page of values of
+    # all the objects
+    per_object: bool = False
 
 
 class ParameterHistoryByObjectIds(BaseModel):
@@ -109,3 +125,4 @@ class CreateEventRequest(BaseModel):
 class ElasticSearchResponse(BaseModel):
     response: list[dict]
     total_count: int
+    next_cursor: str | None = None
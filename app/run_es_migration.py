@@ -0,0 +1,37 @@
+"""Run a migration of the Elasticsearch indexes.
+
+python run_es_migration.py typed_value_fields
+"""
+
+import argparse
+import logging
+
+from services.elastic_service.migrations import (
+    index_profile,
+    instance_routing,
+    parameter_parent_fields,
+    rollover_indexes,
+    typed_value_fields,
+)
+
+MIGRATIONS = {
+    "typed_value_fields": typed_value_fields.migrate,
+    "rollover_indexes": rollover_indexes.migrate,
+    "instance_routing": instance_routing.migrate,
+    "index_profile": index_profile.migrate,
+    "parameter_parent_fields": parameter_parent_fields.migrate,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("migration", choices=list(MIGRATIONS))
+    args = parser.parse_args()
+
+    MIGRATIONS[args.migration]()
+    logging.info("Migration %s finished", args.migration)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
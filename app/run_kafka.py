@@ -0,0 +1,12 @@
+import logging
+import asyncio
+
+from config.kafka_config import KAFKA_TURN_ON, KAFKA_CONSUMER_STANDALONE
+from services.kafka_service.kafka_connection_utils import run_kafka_consumer
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if KAFKA_TURN_ON and KAFKA_CONSUMER_STANDALONE:
+        asyncio.run(run_kafka_consumer())
+    else:
+        logging.info("Standalone Kafka consumer is disabled")
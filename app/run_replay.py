@@ -0,0 +1,107 @@
+"""Rebuild the event indexes from a Kafka topic.
+
+python run_replay.py --source inventory --delete-old
+python run_replay.py --from-timestamp 2024-01-01T00:00:00 --no-swap
+"""
+
+import argparse
+import logging
+from datetime import datetime, timezone
+
+from services.replay_service.replay import (
+    REPLAY_INSTANCES,
+    REPLAY_SOURCE_TOPICS,
+    TopicReplay,
+)
+
+
+def parse_offsets(value: str) -> int | dict[int, int]:
+    """Either one offset for every partition or `partition:offset` pairs
+    separated by commas."""
+    if ":" not in value:
+        return int(value)
+
+    offsets = {}
+    for pair in value.split(","):
+        partition, offset = pair.split(":")
+        offsets[int(partition)] = int(offset)
+    return offsets
+
+
+def parse_timestamp(value: str) -> datetime:
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def parse_instances(value: str) -> list[str]:
+    instances = [name.strip().upper() for name in value.split(",")]
+    for name in instances:
+        if name not in REPLAY_INSTANCES:
+            raise argparse.ArgumentTypeError(f"Unknown instance: {name}")
+    return instances
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--source", choices=list(REPLAY_SOURCE_TOPICS), default="inventory"
+    )
+    parser.add_argument(
+        "--topic", help="topic to read instead of the one of the source"
+    )
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument("--from-offset", type=parse_offsets, dest="offsets")
+    start.add_argument(
+        "--from-timestamp", type=parse_timestamp, dest="timestamp"
+    )
+    parser.add_argument(
+        "--instances",
+        type=parse_instances,
+        default=list(REPLAY_INSTANCES),
+        help="comma separated instances to rebuild, e.g. TPRM,PRM",
+    )
+    parser.add_argument(
+        "--batch-objects",
+        type=int,
+        default=50_000,
+        help="objects of consecutive messages processed together",
+    )
+    parser.add_argument("--bulk-in-flight", type=int, default=8)
+    parser.add_argument(
+        "--delete-old",
+        action="store_true",
+        help="delete the indexes replaced by the rebuilt ones",
+    )
+    parser.add_argument(
+        "--no-swap",
+        action="store_false",
+        dest="swap",
+        help="keep the rebuilt indexes without switching the aliases",
+    )
+    parser.add_argument(
+        "--allow-partial",
+        action="store_true",
+        help="switch the aliases after a replay from an offset or timestamp",
+    )
+    args = parser.parse_args()
+
+    stats = TopicReplay(
+        source=args.source,
+        topic=args.topic,
+        from_offsets=args.offsets,
+        from_timestamp=args.timestamp,
+        instances=args.instances,
+        batch_objects=args.batch_objects,
+        bulk_in_flight=args.bulk_in_flight,
+        swap=args.swap,
+        delete_old=args.delete_old,
+        allow_partial=args.allow_partial,
+    ).run()
+    logging.info("Replay finished: %s", stats.as_dict())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, NamedTuple
+
+from cachetools import TTLCache
+
+from config.cache_config import (
+    PARAMETER_TYPE_CACHE_MAX_SIZE,
+    PARAMETER_TYPE_CACHE_TTL_SECONDS,
+    LINKED_VALUE_CACHE_MAX_SIZE,
+    LINKED_VALUE_CACHE_TTL_SECONDS,
+)
+
+
+class ParameterTypeMetadata(NamedTuple):
+    val_type: str
+    multiple: bool
+
+
+def build_parameter_type_metadata(
+    val_type: str | None, multiple: bool | None
+) -> ParameterTypeMetadata:
+    return ParameterTypeMetadata(
+        val_type=val_type or "str", multiple=bool(multiple)
+    )
+
+
+class ParameterTypeMetadataCache:
+    """TPRM attributes needed to convert PRM values, keyed by tprm id.
+
+    Entries are replaced whenever this process writes TPRM events; the TTL
+    only bounds staleness for changes written by other processes.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self._cache: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get_many(
+        self, tprm_ids: set[int]
+    ) -> tuple[dict[int, ParameterTypeMetadata], set[int]]:
+        found: dict[int, ParameterTypeMetadata] = {}
+        with self._lock:
+            for tprm_id in tprm_ids:
+                metadata = self._cache.get(tprm_id)
+                if metadata is not None:
+                    found[tprm_id] = metadata
+
+        return found, tprm_ids.difference(found)
+
+    def set(self, tprm_id: int, metadata: ParameterTypeMetadata) -> None:
+        with self._lock:
+            self._cache[tprm_id] = metadata
+
+    def invalidate(self, tprm_id: int) -> None:
+        with self._lock:
+            self._cache.pop(tprm_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+parameter_type_cache = ParameterTypeMetadataCache(
+    max_size=PARAMETER_TYPE_CACHE_MAX_SIZE,
+    ttl=PARAMETER_TYPE_CACHE_TTL_SECONDS,
+)
+
+
+class LinkedValueCache:
+    """Resolved names of linked MOs and values of linked PRMs, keyed by
+    (index, instance id)."""
+
+    def __init__(self, max_size: int, ttl: int):
+        self._cache: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get_many(
+        self, index: str, instance_ids: set[int]
+    ) -> tuple[dict[int, Any], set[int]]:
+        found: dict[int, Any] = {}
+        with self._lock:
+            for instance_id in instance_ids:
+                key = (index, instance_id)
+                if key in self._cache:
+                    found[instance_id] = self._cache[key]
+
+        return found, instance_ids.difference(found)
+
+    def set_many(self, index: str, values: dict[int, Any]) -> None:
+        with self._lock:
+            for instance_id, value in values.items():
+                self._cache[(index, instance_id)] = value
+
+    def invalidate(self, index: str, instance_id: int) -> None:
+        with self._lock:
+            self._cache.pop((index, instance_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+linked_value_cache = LinkedValueCache(
+    max_size=LINKED_VALUE_CACHE_MAX_SIZE,
+    ttl=LINKED_VALUE_CACHE_TTL_SECONDS,
+)
@@ -1,37 +1,200 @@
 import pickle
+from collections import defaultdict
+from typing import Any, Iterable
 
 from common.constants import InventoryChangesIndexes
+from services.converter_service.cache import (
+    ParameterTypeMetadata,
+    build_parameter_type_metadata,
+    parameter_type_cache,
+    linked_value_cache,
+)
 from services.converter_service.schemas import ParameterInstance
-from services.elastic_service.elastic_client import elastic_client
+from services.elastic_service.elastic_client import (
+    elastic_client,
+    get_instance_routing,
+)
+from services.event_processor.inventory_processor.constants import (
+    ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE,
+    ACTIVE_EVENTS_LOOKUP_PAGE_SIZE,
+)
+from services.event_processor.inventory_processor.utils import (
+    split_into_chunks,
+)
+
+PARAMETER_TYPE_ATTRIBUTES = ["multiple", "val_type"]
+
+# value type -> index and attribute holding the value shown for the link
+LINKED_VALUE_SOURCES = {
+    "mo_link": (InventoryChangesIndexes.MO, "name"),
+    "prm_link": (InventoryChangesIndexes.PRM, "value"),
+}
 
 
 class ConvertParameterValues:
-    @staticmethod
-    def _get_parameter_type_attribute_by_id(
-        parameter_type_id: int, attribute: str
-    ):
-        query = {
-            "query": {
-                "bool": {
-                    "filter": [
-                        {"term": {"instance_id": parameter_type_id}},
-                        {"term": {"attribute": attribute}},
-                        {"term": {"is_active": True}},
-                    ]
-                }
+    def __init__(self, indexes: dict[str, str] | None = None):
+        # instance name -> index to read from instead of the default one
+        self._indexes = indexes or {}
+
+    def _get_index(self, index: InventoryChangesIndexes) -> str:
+        return self._indexes.get(index.name, index.value)
+
+    def _fetch_parameter_types(
+        self,
+        parameter_type_ids: set[int],
+    ) -> dict[int, ParameterTypeMetadata]:
+        values_by_parameter_type: dict[int, dict] = defaultdict(dict)
+
+        for ids_chunk in split_into_chunks(
+            sorted(parameter_type_ids), ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE
+        ):
+            query = {
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"terms": {"instance_id": ids_chunk}},
+                            {"terms": {"attribute": PARAMETER_TYPE_ATTRIBUTES}},
+                            {"term": {"is_active": True}},
+                        ]
+                    }
+                },
+                "_source": ["instance_id", "attribute", "new_value"],
+                "size": ACTIVE_EVENTS_LOOKUP_PAGE_SIZE,
+                "track_total_hits": False,
             }
+            response = elastic_client.search(
+                index=self._get_index(InventoryChangesIndexes.TPRM),
+                body=query,
+                routing=get_instance_routing(ids_chunk),
+            )
+            for hit in response["hits"]["hits"]:
+                source = hit["_source"]
+                values_by_parameter_type[source["instance_id"]][
+                    source["attribute"]
+                ] = source.get("new_value")
+
+        return {
+            parameter_type_id: build_parameter_type_metadata(
+                val_type=values.get("val_type"),
+                multiple=values.get("multiple"),
+            )
+            for parameter_type_id, values in values_by_parameter_type.items()
         }
-        response = elastic_client.search(
-            index=InventoryChangesIndexes.TPRM.value, body=query
+
+    def get_parameter_types(
+        self, parameter_type_ids: set[int]
+    ) -> dict[int, ParameterTypeMetadata]:
+        found, missing_ids = parameter_type_cache.get_many(parameter_type_ids)
+        if not missing_ids:
+            return found
+
+        fetched = self._fetch_parameter_types(missing_ids)
+        for parameter_type_id in missing_ids:
+            metadata = fetched.get(parameter_type_id)
+            if metadata is None:
+                # not searchable yet, e.g. written just before the refresh
+                # or by another worker, so the default is not cached
+                found[parameter_type_id] = build_parameter_type_metadata(
+                    val_type=None, multiple=None
+                )
+                continue
+
+            parameter_type_cache.set(parameter_type_id, metadata)
+            found[parameter_type_id] = metadata
+
+        return found
+
+    def _fetch_linked_values(
+        self, index: str, attribute: str, instance_ids: set[int]
+    ) -> dict[int, Any]:
+        linked_values: dict[int, Any] = {}
+
+        for ids_chunk in split_into_chunks(
+            sorted(instance_ids), ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE
+        ):
+            query = {
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"terms": {"instance_id": ids_chunk}},
+                            {"term": {"attribute": attribute}},
+                            {"term": {"is_active": True}},
+                        ]
+                    }
+                },
+                "_source": ["instance_id", "new_value"],
+                "size": ACTIVE_EVENTS_LOOKUP_PAGE_SIZE,
+                "track_total_hits": False,
+            }
+            response = elastic_client.search(
+                index=index, body=query, routing=get_instance_routing(ids_chunk)
+            )
+            for hit in response["hits"]["hits"]:
+                source = hit["_source"]
+                linked_values[source["instance_id"]] = source.get("new_value")
+
+        return linked_values
+
+    def get_linked_values(
+        self, value_type: str, instance_ids: set[int]
+    ) -> dict[int, Any]:
+        source_index, attribute = LINKED_VALUE_SOURCES[value_type]
+        index = self._get_index(source_index)
+
+        found, missing_ids = linked_value_cache.get_many(index, instance_ids)
+        if missing_ids:
+            fetched = self._fetch_linked_values(
+                index=index, attribute=attribute, instance_ids=missing_ids
+            )
+            linked_value_cache.set_many(index, fetched)
+            found.update(fetched)
+
+        return found
+
+    def _get_linked_value(self, value_type: str, instance_id: int) -> Any:
+        linked_values = self.get_linked_values(
+            value_type=value_type, instance_ids={instance_id}
         )
-        if response["hits"]["hits"]:
-            if response["hits"]["hits"][0]["_source"]:
-                return response["hits"]["hits"][0]["_source"]["new_value"]
+        try:
+            return linked_values[instance_id]
 
-        return False
+        except KeyError:
+            raise LookupError(
+                f"Linked instance {instance_id} of {value_type} is not found"
+            )
 
-    @staticmethod
-    def _convert_parameter_value_single(parameter_value: str, value_type: str):
+    def prefetch(self, instances: Iterable[dict]) -> None:
+        instances = [
+            instance
+            for instance in instances
+            if instance.get("tprm_id") is not None
+        ]
+        parameter_types = self.get_parameter_types(
+            {int(instance["tprm_id"]) for instance in instances}
+        )
+
+        linked_ids: dict[str, set[int]] = defaultdict(set)
+        for instance in instances:
+            parameter_type = parameter_types[int(instance["tprm_id"])]
+            if (
+                parameter_type.multiple
+                or parameter_type.val_type not in LINKED_VALUE_SOURCES
+            ):
+                continue
+
+            try:
+                linked_ids[parameter_type.val_type].add(int(instance["value"]))
+            except (TypeError, ValueError):
+                continue
+
+        for value_type, instance_ids in linked_ids.items():
+            self.get_linked_values(
+                value_type=value_type, instance_ids=instance_ids
+            )
+
+    def _convert_parameter_value_single(
+        self, parameter_value: str, value_type: str
+    ):
         match value_type:
             case "int" | "two-way link":
                 if "." in parameter_value:
@@ -48,44 +211,16 @@ class ConvertParameterValues:
                 }
                 return conditions[parameter_value.lower()]
 
-            case "mo_link":
-                query = {
-                    "query": {
-                        "bool": {
-                            "filter": [
-                                {"term": {"instance_id": int(parameter_value)}},
-                                {"term": {"attribute": "name"}},
-                                {"term": {"is_active": True}},
-                            ]
-                        }
-                    }
-                }
-                return elastic_client.search(
-                    index=InventoryChangesIndexes.MO.value, body=query
-                )["hits"]["hits"][0]["_source"]["new_value"]
-
-            case "prm_link":
-                query = {
-                    "query": {
-                        "bool": {
-                            "filter": [
-                                {"term": {"instance_id": int(parameter_value)}},
-                                {"term": {"attribute": "value"}},
-                                {"term": {"is_active": True}},
-                            ]
-                        }
-                    }
-                }
-                return elastic_client.search(
-                    index=InventoryChangesIndexes.PRM.value, body=query
-                )["hits"]["hits"][0]["_source"]["new_value"]
+            case "mo_link" | "prm_link":
+                return self._get_linked_value(
+                    value_type=value_type, instance_id=int(parameter_value)
+                )
 
             case _:
                 return parameter_value
 
-    @staticmethod
     def _convert_parameter_value_multiple(
-        parameter_value: list, value_type: str
+        self, parameter_value: list, value_type: str
     ):
         match value_type:
             case "int" | "two-way link":
@@ -111,68 +246,28 @@ class ConvertParameterValues:
 
                 return new_value
 
-            case "mo_link":
-                new_value = []
-                for unit in parameter_value:
-                    query = {
-                        "query": {
-                            "bool": {
-                                "filter": [
-                                    {"term": {"instance_id": int(unit)}},
-                                    {"term": {"attribute": "name"}},
-                                    {"term": {"is_active": True}},
-                                ]
-                            }
-                        }
-                    }
-                    new_value.append(
-                        elastic_client.search(
-                            index=InventoryChangesIndexes.MO.value, body=query
-                        )["hits"]["hits"][0]["_source"]["new_value"]
-                    )
-                return new_value
-
-            case "prm_link":
-                new_value = []
-                for unit in parameter_value:
-                    query = {
-                        "query": {
-                            "bool": {
-                                "filter": [
-                                    {"term": {"instance_id": int(unit)}},
-                                    {"term": {"attribute": "value"}},
-                                    {"term": {"is_active": True}},
-                                ]
-                            }
-                        }
-                    }
-                    new_value.append(
-                        elastic_client.search(
-                            index=InventoryChangesIndexes.PRM.value, body=query
-                        )["hits"]["hits"][0]["_source"]["new_value"]
-                    )
-                return new_value
+            case "mo_link" | "prm_link":
+                instance_ids = [int(unit) for unit in parameter_value]
+                linked_values = self.get_linked_values(
+                    value_type=value_type, instance_ids=set(instance_ids)
+                )
+                return [
+                    linked_values[instance_id] for instance_id in instance_ids
+                ]
 
             case _:
                 return parameter_value
 
     def convert(self, parameter_instance: ParameterInstance):
-        is_multiple = self._get_parameter_type_attribute_by_id(
-            parameter_type_id=parameter_instance.tprm_id,
-            attribute="multiple",
-        )
-        val_type = self._get_parameter_type_attribute_by_id(
-            parameter_type_id=parameter_instance.tprm_id,
-            attribute="val_type",
-        )
-
-        if not val_type:
-            val_type = "str"
+        parameter_type = self.get_parameter_types({parameter_instance.tprm_id})[
+            parameter_instance.tprm_id
+        ]
 
-        if is_multiple:
+        if parameter_type.multiple:
             value = pickle.loads(bytes.fromhex(parameter_instance.value))
             return value
 
         return self._convert_parameter_value_single(
-            parameter_value=parameter_instance.value, value_type=val_type
+            parameter_value=parameter_instance.value,
+            value_type=parameter_type.val_type,
         )
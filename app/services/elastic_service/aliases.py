@@ -0,0 +1,51 @@
+from services.elastic_service.elastic_client import (
+    elastic_client,
+    get_write_alias,
+)
+
+
+def get_alias_switch_actions(
+    alias: str, indexes: list[str]
+) -> tuple[list[dict], list[str]]:
+    """Alias actions pointing the alias to the indexes instead of the ones
+    behind it, and the replaced indexes. An index named like the alias is
+    deleted by the switch to free its name."""
+    actions = []
+    replaced = []
+    if elastic_client.indices.exists_alias(name=alias):
+        replaced = list(elastic_client.indices.get_alias(name=alias))
+        actions.extend(
+            {"remove": {"index": index, "alias": alias}} for index in replaced
+        )
+    elif elastic_client.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+
+    actions.extend(
+        {"add": {"index": index, "alias": alias}} for index in indexes
+    )
+    return actions, replaced
+
+
+def get_write_alias_switch_actions(alias: str, index: str) -> list[dict]:
+    write_alias = get_write_alias(alias)
+    actions = []
+    if elastic_client.indices.exists_alias(name=write_alias):
+        actions.extend(
+            {"remove": {"index": current, "alias": write_alias}}
+            for current in elastic_client.indices.get_alias(name=write_alias)
+        )
+    actions.append(
+        {"add": {"index": index, "alias": write_alias, "is_write_index": True}}
+    )
+    return actions
+
+
+def roll_over_to_backing_index(alias: str, suffix: str) -> str:
+    """Send new events to a backing index created from the template, the
+    index that held the write alias keeps receiving updates of its
+    events."""
+    new_index = f"{alias}-{suffix}-000001"
+    elastic_client.indices.rollover(
+        alias=get_write_alias(alias), new_index=new_index
+    )
+    return new_index
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from typing import NamedTuple
+
+from config.elastic_config import (
+    ES_BACKPRESSURE_ENABLED,
+    ES_BACKPRESSURE_MIN_BATCH_SIZE,
+    ES_BACKPRESSURE_PAUSE_LATENCY,
+    ES_BACKPRESSURE_PAUSE_REJECTION_RATE,
+    ES_BACKPRESSURE_TARGET_LATENCY,
+)
+from services.elastic_service.elastic_client import elastic_client
+
+logger = logging.getLogger(__name__)
+
+# weight of the newest request in the moving averages
+_SMOOTHING = 0.3
+
+
+class BulkSample(NamedTuple):
+    seconds: float
+    items: int
+    rejected: int
+
+
+class ElasticsearchBackpressure:
+    """Moving averages of bulk latency and rejected items reported by the
+    bulk writers.
+
+    The batch size follows AIMD: it is halved when a request is slower than
+    the target latency or has rejections and grows back by a tenth of the
+    configured size on healthy requests. `overloaded` tells consumers to pause
+    fetching until Elasticsearch recovers.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        target_latency: float,
+        pause_latency: float,
+        pause_rejection_rate: float,
+        min_batch_size: int,
+    ):
+        self.enabled = enabled
+        self._target_latency = target_latency
+        self._pause_latency = pause_latency
+        self._pause_rejection_rate = pause_rejection_rate
+        self._min_batch_size = min_batch_size
+        self._lock = threading.Lock()
+        self._latency: float | None = None
+        self._rejection_rate = 0.0
+        self._batch_scale = 1.0
+        self._samples: list[BulkSample] | None = None
+
+    def record(self, seconds: float, items: int, rejected: int) -> None:
+        if not self.enabled:
+            return
+
+        rejection_rate = rejected / items if items else 0.0
+        with self._lock:
+            if self._latency is None:
+                self._latency = seconds
+                self._rejection_rate = rejection_rate
+            else:
+                self._latency += _SMOOTHING * (seconds - self._latency)
+                self._rejection_rate += _SMOOTHING * (
+                    rejection_rate - self._rejection_rate
+                )
+
+            if rejected or seconds > self._target_latency:
+                self._batch_scale = max(0.01, self._batch_scale / 2)
+            else:
+                self._batch_scale = min(1.0, self._batch_scale + 0.1)
+
+            if self._samples is not None:
+                self._samples.append(BulkSample(seconds, items, rejected))
+
+    def batch_size(self, limit: int) -> int:
+        if not self.enabled:
+            return limit
+
+        return min(
+            limit, max(self._min_batch_size, int(limit * self._batch_scale))
+        )
+
+    @property
+    def overloaded(self) -> bool:
+        if not self.enabled or self._latency is None:
+            return False
+
+        return (
+            self._latency >= self._pause_latency
+            or self._rejection_rate >= self._pause_rejection_rate
+        )
+
+    @property
+    def busy(self) -> bool:
+        """Slower than the target latency or rejecting items, consumers of
+        lower priority give way before it gets overloaded."""
+        if not self.enabled or self._latency is None:
+            return False
+
+        return self._latency >= self._target_latency or self._rejection_rate > 0
+
+    def relax(self) -> None:
+        """Forget the averages before resuming, the reduced batch size is
+        kept and grows back with healthy requests."""
+        with self._lock:
+            self._latency = None
+            self._rejection_rate = 0.0
+
+    def collect_samples(self) -> None:
+        """Keep the recorded requests so that a worker process can report
+        them to the process consuming from Kafka."""
+        with self._lock:
+            self._samples = []
+
+    def take_samples(self) -> list[BulkSample]:
+        with self._lock:
+            samples = self._samples or []
+            if self._samples is not None:
+                self._samples = []
+        return samples
+
+    def stats(self) -> dict:
+        return {
+            "latency": self._latency,
+            "rejection_rate": self._rejection_rate,
+            "batch_scale": self._batch_scale,
+        }
+
+
+elastic_backpressure = ElasticsearchBackpressure(
+    enabled=ES_BACKPRESSURE_ENABLED,
+    target_latency=ES_BACKPRESSURE_TARGET_LATENCY,
+    pause_latency=ES_BACKPRESSURE_PAUSE_LATENCY,
+    pause_rejection_rate=ES_BACKPRESSURE_PAUSE_REJECTION_RATE,
+    min_batch_size=ES_BACKPRESSURE_MIN_BATCH_SIZE,
+)
+
+
+def elasticsearch_is_available() -> bool:
+    """Cheap probe used before resuming paused consumers."""
+    started = time.perf_counter()
+    try:
+        health = elastic_client.options(
+            request_timeout=ES_BACKPRESSURE_PAUSE_LATENCY
+        ).cluster.health()
+
+    except Exception as e:
+        logger.warning("Elasticsearch health check failed: %s", e)
+        return False
+
+    return (
+        health["status"] != "red"
+        and time.perf_counter() - started < ES_BACKPRESSURE_PAUSE_LATENCY
+    )
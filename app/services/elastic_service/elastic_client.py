@@ -1,7 +1,33 @@
-from elasticsearch import Elasticsearch
+import logging
+from typing import Iterable
 
-from common.constants import InventoryChangesIndexes
-from config.elastic_config import ES_URL, ES_PROTOCOL, ES_PASS, ES_USER
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+
+from common.constants import (
+    EVENT_DEAD_LETTER_INDEX,
+    InventoryChangesIndexes,
+    InventoryStateIndexes,
+)
+from config.elastic_config import (
+    ES_URL,
+    ES_API_CONNECTIONS_PER_NODE,
+    ES_API_REQUEST_TIMEOUT,
+    ES_PROTOCOL,
+    ES_PASS,
+    ES_USER,
+    ES_STATE_INDEXES_ENABLED,
+    ES_ROLLOVER_ENABLED,
+    ES_ROLLOVER_MAX_AGE,
+    ES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE,
+    ES_ROUTING_ENABLED,
+    ES_EVENTS_INDEX_PROFILE,
+)
+from services.event_processor.inventory_processor.typed_values import (
+    TYPED_VALUE_MAPPINGS,
+    VALUE_ATTRIBUTES,
+)
+
+logger = logging.getLogger(__name__)
 
 if ES_PROTOCOL == "https":
     print("Creating certified client...")
@@ -20,9 +46,274 @@ else:
     print("Creating client...")
     elastic_client = Elasticsearch(ES_URL)
 
+# the HTTP API reads through the async client, so a slow query does not
+# block the event loop it shares with the Kafka consumer
+if ES_PROTOCOL == "https":
+    async_elastic_client = AsyncElasticsearch(
+        ES_URL,
+        verify_certs=False,
+        basic_auth=(ES_USER, ES_PASS),
+        connections_per_node=ES_API_CONNECTIONS_PER_NODE,
+        request_timeout=ES_API_REQUEST_TIMEOUT,
+        retry_on_status=(502, 503, 504),
+        max_retries=3,
+    )
+
+else:
+    async_elastic_client = AsyncElasticsearch(
+        ES_URL,
+        connections_per_node=ES_API_CONNECTIONS_PER_NODE,
+        request_timeout=ES_API_REQUEST_TIMEOUT,
+    )
+
+
+INDEX_SETTINGS = {
+    "number_of_shards": 3,
+    "number_of_replicas": 1,
+    "refresh_interval": "1s",
+}
+# settings of an index filled in bulk before it serves reads
+BULK_LOAD_SETTINGS = {
+    "refresh_interval": "-1",
+    "number_of_replicas": 0,
+    "translog.durability": "async",
+}
+SERVING_SETTINGS = {
+    "refresh_interval": INDEX_SETTINGS["refresh_interval"],
+    "number_of_replicas": INDEX_SETTINGS["number_of_replicas"],
+    "translog.durability": "request",
+}
+
+STATE_INDEX_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "instance_id": {"type": "long"},
+        "attributes": {"type": "object", "enabled": False},
+    },
+}
+
+EVENTS_INDEX_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "event_type": {"type": "keyword"},
+        "user_id": {
+            "type": "long",
+            "ignore_malformed": True,
+            "null_value": None,
+        },
+        "session_id": {"type": "keyword", "null_value": None},
+        "instance_id": {"type": "long"},
+        "attribute": {"type": "keyword"},
+        "version": {"type": "integer"},
+        "valid_to": {
+            "type": "date",
+            "ignore_malformed": True,
+            "null_value": None,
+        },
+        "is_active": {"type": "boolean"},
+        "valid_from": {"type": "date"},
+        # parents of PRM events, see PARAMETER_PARENT_FIELDS
+        "mo_id": {"type": "long"},
+        "tprm_id": {"type": "long"},
+        **{
+            f"{attribute}_{suffix}": mapping
+            for attribute in VALUE_ATTRIBUTES
+            for suffix, mapping in TYPED_VALUE_MAPPINGS.items()
+        },
+    },
+}
+
+# versioned settings and mappings of the event indexes, every index keeps
+# the version it was created with in the `_meta` of its mapping
+EVENTS_INDEX_PROFILES = {
+    1: {"settings": {}, "mappings": EVENTS_INDEX_MAPPINGS},
+    2: {
+        # the events of an instance are stored together and newest first,
+        # so history reads touch fewer blocks and values compress better
+        "settings": {
+            "codec": "best_compression",
+            "sort.field": ["instance_id", "valid_from"],
+            "sort.order": ["asc", "desc"],
+        },
+        "mappings": {
+            **EVENTS_INDEX_MAPPINGS,
+            "properties": {
+                **EVENTS_INDEX_MAPPINGS["properties"],
+                # only sorted by in the active events lookup
+                "version": {"type": "integer", "index": False},
+            },
+        },
+    },
+}
+
+
+def get_instance_routing(instance_ids: Iterable[int]) -> str | None:
+    """Routing of the events of the instances. Events are routed by
+    instance id when routing is enabled, so a lookup of a few instances only
+    touches their shards."""
+    if not ES_ROUTING_ENABLED:
+        return None
+
+    routing = sorted({str(int(instance_id)) for instance_id in instance_ids})
+    return ",".join(routing) or None
+
+
+def get_state_index_body(**settings) -> dict:
+    return {
+        "settings": {**INDEX_SETTINGS, **settings},
+        "mappings": STATE_INDEX_MAPPINGS,
+    }
+
+
+def get_events_index_body(
+    profile_version: int = ES_EVENTS_INDEX_PROFILE,
+    routing: bool = ES_ROUTING_ENABLED,
+    **settings,
+) -> dict:
+    profile = EVENTS_INDEX_PROFILES[profile_version]
+    mappings = {**profile["mappings"], "_meta": {"profile": profile_version}}
+    if routing:
+        mappings["_routing"] = {"required": True}
+
+    return {
+        "settings": {**INDEX_SETTINGS, **profile["settings"], **settings},
+        "mappings": mappings,
+    }
+
+
+def get_events_index_profile(mappings: dict) -> int:
+    # indexes created before the profiles have no version
+    return mappings.get("_meta", {}).get("profile", 1)
+
+
+EVENT_ROLLOVER_POLICY = "event_manager_rollover"
+
+
+def get_write_alias(alias: str) -> str:
+    return f"{alias}_write"
+
+
+def get_backing_index_name(alias: str, generation: int = 1) -> str:
+    # rollover increments the trailing number of the write index
+    return f"{alias}-{generation:06d}"
+
+
+def create_rollover_templates():
+    """Rollover policy and index templates of the time based backing
+    indexes. A backing index joins the read alias, named like the former
+    single index, when it is created."""
+    elastic_client.ilm.put_lifecycle(
+        name=EVENT_ROLLOVER_POLICY,
+        policy={
+            "phases": {
+                "hot": {
+                    "min_age": "0ms",
+                    "actions": {
+                        "rollover": {
+                            "max_age": ES_ROLLOVER_MAX_AGE,
+                            "max_primary_shard_size": (
+                                ES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE
+                            ),
+                        }
+                    },
+                }
+            }
+        },
+    )
+
+    for index in InventoryChangesIndexes:
+        if index == InventoryChangesIndexes.ALL:
+            continue
+
+        body = get_events_index_body(
+            **{
+                "index.lifecycle.name": EVENT_ROLLOVER_POLICY,
+                "index.lifecycle.rollover_alias": get_write_alias(index.value),
+            }
+        )
+        elastic_client.indices.put_index_template(
+            name=f"{index.value}_template",
+            index_patterns=[f"{index.value}-*"],
+            priority=100,
+            template={**body, "aliases": {index.value: {}}},
+        )
+
+
+def create_rollover_indexes_if_not_exists():
+    create_rollover_templates()
+
+    for index in InventoryChangesIndexes:
+        if index == InventoryChangesIndexes.ALL:
+            continue
+
+        write_alias = get_write_alias(index.value)
+        if elastic_client.indices.exists_alias(name=write_alias):
+            continue
+
+        if elastic_client.indices.exists(index=index.value):
+            logger.warning(
+                "%s has no write alias, events are written to it without "
+                "rollover until `run_es_migration.py rollover_indexes`",
+                index.value,
+            )
+            continue
+
+        elastic_client.indices.create(
+            index=get_backing_index_name(index.value),
+            aliases={write_alias: {"is_write_index": True}},
+        )
+
+
+def create_state_indexes_if_not_exists():
+    for index in InventoryStateIndexes:
+        if elastic_client.indices.exists(index=index.value):
+            continue
+
+        elastic_client.indices.create(
+            index=index.value,
+            body=get_state_index_body(),
+        )
+
+
+def create_dead_letter_index_if_not_exists():
+    if elastic_client.indices.exists(index=EVENT_DEAD_LETTER_INDEX):
+        return
+
+    elastic_client.indices.create(
+        index=EVENT_DEAD_LETTER_INDEX,
+        body={
+            "settings": {
+                "number_of_shards": 1,
+                "number_of_replicas": 1,
+                "refresh_interval": "1s",
+            },
+            "mappings": {
+                "dynamic": "false",
+                "properties": {
+                    "index": {"type": "keyword"},
+                    "doc_id": {"type": "keyword"},
+                    "action": {"type": "keyword"},
+                    "status": {"type": "integer"},
+                    "error_type": {"type": "keyword"},
+                    "error": {"type": "object", "enabled": False},
+                    "source": {"type": "object", "enabled": False},
+                    "failed_at": {"type": "date"},
+                },
+            },
+        },
+    )
+
 
 def create_basic_indexes_if_not_exists():
     print(ES_URL)
+    if ES_STATE_INDEXES_ENABLED:
+        create_state_indexes_if_not_exists()
+    create_dead_letter_index_if_not_exists()
+
+    if ES_ROLLOVER_ENABLED:
+        create_rollover_indexes_if_not_exists()
+        return
+
     indexes_list = [
         InventoryChangesIndexes.TMO.value,
         InventoryChangesIndexes.MO.value,
@@ -36,165 +327,5 @@ def create_basic_indexes_if_not_exists():
 
         elastic_client.indices.create(
             index=index,
-            body={
-                "settings": {
-                    "number_of_shards": 3,
-                    "number_of_replicas": 1,
-                    "refresh_interval": "1s",
-                },
-                "mappings": {
-                    "dynamic": "false",
-                    "properties": {
-                        "event_type": {"type": "keyword"},
-                        "user_id": {
-                            "type": "long",
-                            "ignore_malformed": True,
-                            "null_value": None,
-                        },
-                        "session_id": {"type": "keyword", "null_value": None},
-                        "instance_id": {"type": "long"},
-                        "attribute": {"type": "keyword"},
-                        "version": {"type": "integer"},
-                        "valid_to": {
-                            "type": "date",
-                            "ignore_malformed": True,
-                            "null_value": None,
-                        },
-                        "is_active": {"type": "boolean"},
-                        "valid_from": {"type": "date"},
-                    },
-                    "runtime": {
-                        "old_value_num": {
-                            "type": "double",
-                            "script": """
-def v = params._source.old_value;
-if (v == null) return;
-if (v instanceof List) { for (def x : (List)v) { if (x instanceof Number) emit(((Number)x).doubleValue()); } }
-else if (v instanceof Number) { emit(((Number)v).doubleValue()); }
-""",
-                        },
-                        "new_value_num": {
-                            "type": "double",
-                            "script": """
-def v = params._source.new_value;
-if (v == null) return;
-if (v instanceof List) { for (def x : (List)v) { if (x instanceof Number) emit(((Number)x).doubleValue()); } }
-else if (v instanceof Number) { emit(((Number)v).doubleValue()); }
-""",
-                        },
-                        "old_value_str": {
-                            "type": "keyword",
-                            "script": """
-def v = params._source.old_value;
-if (v == null) return;
-if (v instanceof List) { for (def x : (List)v) { if (x instanceof String) emit(x); } }
-else if (v instanceof String) { emit(v); }
-""",
-                        },
-                        "new_value_str": {
-                            "type": "keyword",
-                            "script": """
-def v = params._source.new_value;
-if (v == null) return;
-if (v instanceof List) { for (def x : (List)v) { if (x instanceof String) emit(x); } }
-else if (v instanceof String) { emit(v); }
-""",
-                        },
-                        "old_value_bool": {
-                            "type": "boolean",
-                            "script": """
-def v = params._source.old_value;
-if (v == null) return;
-if (v instanceof List) { for (def x : (List)v) { if (x instanceof Boolean) emit(x); } }
-else if (v instanceof Boolean) { emit(v); }
-""",
-                        },
-                        "new_value_bool": {
-                            "type": "boolean",
-                            "script": """
-def v = params._source.new_value;
-if (v == null) return;
-if (v instanceof List) { for (def x : (List)v) { if (x instanceof Boolean) emit(x); } }
-else if (v instanceof Boolean) { emit(v); }
-""",
-                        },
-                        "old_value_dt": {
-                            "type": "date",
-                            "script": """
-def v = params._source.old_value;
-if (v == null) return;
-if (v instanceof List) {
-  for (def x : (List)v) {
-    if (x == null) continue;
-    if (x instanceof String) {
-      try { emit(java.time.Instant.parse(x).toEpochMilli()); }
-      catch (Exception e1) {
-        try { emit(java.time.ZonedDateTime.parse(x).toInstant().toEpochMilli()); }
-        catch (Exception e2) {}
-      }
-    } else if (x instanceof Number) {
-      emit(((Number)x).longValue()); // epoch millis
-    }
-  }
-} else {
-  if (v instanceof String) {
-    try { emit(java.time.Instant.parse(v).toEpochMilli()); }
-    catch (Exception e1) {
-      try { emit(java.time.ZonedDateTime.parse(v).toInstant().toEpochMilli()); }
-      catch (Exception e2) {}
-    }
-  } else if (v instanceof Number) {
-    emit(((Number)v).longValue()); // epoch millis
-  }
-}
-""",
-                        },
-                        "new_value_dt": {
-                            "type": "date",
-                            "script": """
-def v = params._source.new_value;
-if (v == null) return;
-if (v instanceof List) {
-  for (def x : (List)v) {
-    if (x == null) continue;
-    if (x instanceof String) {
-      try { emit(java.time.Instant.parse(x).toEpochMilli()); }
-      catch (Exception e1) {
-        try { emit(java.time.ZonedDateTime.parse(x).toInstant().toEpochMilli()); }
-        catch (Exception e2) {}
-      }
-    } else if (x instanceof Number) {
-      emit(((Number)x).longValue()); // epoch millis
-    }
-  }
-} else {
-  if (v instanceof String) {
-    try { emit(java.time.Instant.parse(v).toEpochMilli()); }
-    catch (Exception e1) {
-      try { emit(java.time.ZonedDateTime.parse(v).toInstant().toEpochMilli()); }
-      catch (Exception e2) {}
-    }
-  } else if (v instanceof Number) {
-    emit(((Number)v).longValue()); // epoch millis
-  }
-}
-""",
-                        },
-                        "old_value_len": {
-                            "type": "long",
-                            "script": """
-def v = params._source.old_value;
-if (v instanceof List) emit(((List)v).size());
-""",
-                        },
-                        "new_value_len": {
-                            "type": "long",
-                            "script": """
-def v = params._source.new_value;
-if (v instanceof List) emit(((List)v).size());
-""",
-                        },
-                    },
-                },
-            },
+            body=get_events_index_body(),
         )
@@ -0,0 +1,60 @@
+from typing import Iterator
+
+from common.constants import InventoryChangesIndexes
+from services.elastic_service.elastic_client import elastic_client
+
+EVENT_INDEXES = [
+    InventoryChangesIndexes.TMO.value,
+    InventoryChangesIndexes.MO.value,
+    InventoryChangesIndexes.TPRM.value,
+    InventoryChangesIndexes.PRM.value,
+]
+
+_KEEP_ALIVE = "5m"
+
+
+def get_concrete_indexes(names: list[str]) -> list[str]:
+    """Indexes behind the given index names or aliases."""
+    return sorted(
+        elastic_client.indices.get(
+            index=",".join(names), ignore_unavailable=True
+        )
+    )
+
+
+def iter_index_documents(
+    index: str,
+    source: list[str] | bool = True,
+    page_size: int = 5_000,
+    filter_query: dict | None = None,
+) -> Iterator[dict]:
+    """Yield every document of the index, or the ones matching the query,
+    from a point in time, so writes made meanwhile neither repeat nor skip
+    documents."""
+    pit_id = elastic_client.open_point_in_time(
+        index=index, keep_alive=_KEEP_ALIVE
+    )["id"]
+    query = {
+        "pit": {"id": pit_id, "keep_alive": _KEEP_ALIVE},
+        "sort": ["_shard_doc"],
+        "_source": source,
+        "size": page_size,
+        "track_total_hits": False,
+    }
+    if filter_query is not None:
+        query["query"] = filter_query
+
+    try:
+        while True:
+            response = elastic_client.search(body=query)
+            hits = response["hits"]["hits"]
+            yield from hits
+
+            if len(hits) < page_size:
+                break
+
+            query["pit"]["id"] = response.get("pit_id", query["pit"]["id"])
+            query["search_after"] = hits[-1]["sort"]
+
+    finally:
+        elastic_client.close_point_in_time(id=query["pit"]["id"])
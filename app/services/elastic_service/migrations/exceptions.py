@@ -0,0 +1,10 @@
+class MigrationException(Exception):
+    pass
+
+
+class RoutingIsNotEnabled(MigrationException):
+    pass
+
+
+class MigrationTaskFailed(MigrationException):
+    pass
@@ -0,0 +1,19 @@
+"""Move the event indexes to the profile set by ES_EVENTS_INDEX_PROFILE.
+
+Index sorting and the codec are fixed when an index is created, so the
+event indexes of another profile are reindexed, see `migrations.reindex`.
+"""
+
+from config.elastic_config import ES_EVENTS_INDEX_PROFILE, ES_ROUTING_ENABLED
+from services.elastic_service.elastic_client import get_events_index_profile
+from services.elastic_service.migrations.reindex import reindex_event_indexes
+
+
+def _is_current(mappings: dict) -> bool:
+    if ES_ROUTING_ENABLED and not mappings.get("_routing", {}).get("required"):
+        return False
+    return get_events_index_profile(mappings) == ES_EVENTS_INDEX_PROFILE
+
+
+def migrate() -> None:
+    reindex_event_indexes(is_current=_is_current)
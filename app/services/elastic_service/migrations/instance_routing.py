@@ -0,0 +1,23 @@
+"""Route the events of an instance to a single shard.
+
+`_routing` of an existing index can not change, so the event indexes are
+reindexed with the instance id as routing, see `migrations.reindex`. Set
+ES_ROUTING_ENABLED first, so that new indexes require the routing too.
+"""
+
+from config.elastic_config import ES_ROUTING_ENABLED
+from services.elastic_service.migrations.exceptions import RoutingIsNotEnabled
+from services.elastic_service.migrations.reindex import reindex_event_indexes
+
+
+def _is_routed(mappings: dict) -> bool:
+    return mappings.get("_routing", {}).get("required", False)
+
+
+def migrate() -> None:
+    if not ES_ROUTING_ENABLED:
+        raise RoutingIsNotEnabled(
+            "Set ES_ROUTING_ENABLED to route the events by instance id"
+        )
+
+    reindex_event_indexes(is_current=_is_routed)
@@ -0,0 +1,139 @@
+"""Copy the object and parameter type ids of the PRMs onto their events.
+
+The ids are mapped first, so events written by the consumer meanwhile
+already come with them. The events without them are then read in chunks,
+the current ids of the PRMs of a chunk are read from their `mo_id` and
+`tprm_id` events and set on the chunk. Events of PRMs whose ids were never
+recorded are left as they are.
+
+Updated events no longer match the scan, so an interrupted migration
+continues with the events left when it is run again.
+"""
+
+import logging
+
+from common.constants import InventoryChangesIndexes
+from services.elastic_service.elastic_client import (
+    EVENTS_INDEX_MAPPINGS,
+    elastic_client,
+)
+from services.elastic_service.migrations.common import (
+    get_concrete_indexes,
+    iter_index_documents,
+)
+from services.event_processor.inventory_processor.bulk_writer import (
+    ElasticsearchBulkWriter,
+)
+from services.event_processor.inventory_processor.constants import (
+    PARAMETER_PARENT_FIELDS,
+)
+from services.event_processor.inventory_processor.utils import (
+    split_into_chunks,
+)
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 10_000
+_PROGRESS_INTERVAL = 100_000
+
+
+def _get_parent_fields(
+    indexes: list[str], instance_ids: list[int]
+) -> dict[int, dict[str, int]]:
+    """Parent ids of the PRMs taken from their newest events with a
+    value."""
+    versions: dict[tuple[int, str], int] = {}
+    parents: dict[int, dict[str, int]] = {}
+    for hit in iter_index_documents(
+        index=",".join(indexes),
+        source=["instance_id", "attribute", "version", "new_value"],
+        filter_query={
+            "bool": {
+                "filter": [
+                    {"terms": {"instance_id": instance_ids}},
+                    {"terms": {"attribute": list(PARAMETER_PARENT_FIELDS)}},
+                ]
+            }
+        },
+    ):
+        source = hit["_source"]
+        key = (source["instance_id"], source["attribute"])
+        version = source.get("version") or 0
+        if source.get("new_value") is None or versions.get(key, -1) > version:
+            continue
+
+        versions[key] = version
+        parents.setdefault(source["instance_id"], {})[source["attribute"]] = (
+            int(source["new_value"])
+        )
+
+    return parents
+
+
+def _backfill_chunk(
+    writer: ElasticsearchBulkWriter, indexes: list[str], hits: list[dict]
+) -> int:
+    parents = _get_parent_fields(
+        indexes, sorted({hit["_source"]["instance_id"] for hit in hits})
+    )
+    documents = 0
+    for hit in hits:
+        fields = parents.get(hit["_source"]["instance_id"])
+        if not fields:
+            continue
+
+        # the consumer may deactivate the event at the same time
+        writer.add_update(
+            doc_id=hit["_id"],
+            document=fields,
+            index=hit["_index"],
+            retry_on_conflict=3,
+            routing=hit.get("_routing"),
+        )
+        documents += 1
+
+    return documents
+
+
+def _backfill(indexes: list[str]) -> int:
+    writer = ElasticsearchBulkWriter(indexes[0])
+    scanned = documents = 0
+    hits = iter_index_documents(
+        index=",".join(indexes),
+        source=["instance_id"],
+        filter_query={
+            "bool": {
+                "must_not": [
+                    {"exists": {"field": field}}
+                    for field in PARAMETER_PARENT_FIELDS
+                ]
+            }
+        },
+    )
+    for chunk in split_into_chunks(hits, _CHUNK_SIZE):
+        documents += _backfill_chunk(writer, indexes, chunk)
+        scanned += len(chunk)
+        if scanned % _PROGRESS_INTERVAL == 0:
+            logger.info("%s documents, %s updated", scanned, documents)
+
+    writer.flush()
+    return documents
+
+
+def migrate() -> None:
+    indexes = get_concrete_indexes([InventoryChangesIndexes.PRM.value])
+    if not indexes:
+        logger.info("No PRM event indexes")
+        return
+
+    elastic_client.indices.put_mapping(
+        index=",".join(indexes),
+        properties={
+            field: EVENTS_INDEX_MAPPINGS["properties"][field]
+            for field in PARAMETER_PARENT_FIELDS
+        },
+    )
+
+    documents = _backfill(indexes)
+    elastic_client.indices.refresh(index=",".join(indexes))
+    logger.info("Parent ids set on %s PRM events", documents)
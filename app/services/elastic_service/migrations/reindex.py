@@ -0,0 +1,212 @@
+"""Reindex the event indexes into new ones created with the current
+settings and mappings, for changes an existing index can not take.
+
+Every index behind an event index name is reindexed into
+`rebuild_<name>_<timestamp>`, routed by instance id when routing is
+enabled, then the name is switched to the new indexes. With rollover the
+rebuilt write index takes the write alias, the state documents follow the
+renamed indexes and new events go to a fresh backing index.
+
+Stop the consumers during a reindex: writes made meanwhile are not copied.
+An index named like the alias is deleted by the switch to free its name,
+indexes that were behind an alias are kept to be deleted once the new ones
+are checked.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from common.constants import InventoryChangesIndexes, InventoryStateIndexes
+from config.elastic_config import (
+    ES_ROLLOVER_ENABLED,
+    ES_ROUTING_ENABLED,
+    ES_STATE_INDEXES_ENABLED,
+)
+from services.elastic_service.aliases import (
+    get_alias_switch_actions,
+    get_write_alias_switch_actions,
+    roll_over_to_backing_index,
+)
+from services.elastic_service.elastic_client import (
+    BULK_LOAD_SETTINGS,
+    SERVING_SETTINGS,
+    create_rollover_templates,
+    elastic_client,
+    get_events_index_body,
+    get_write_alias,
+)
+from services.elastic_service.migrations.common import get_concrete_indexes
+from services.elastic_service.migrations.exceptions import MigrationTaskFailed
+
+logger = logging.getLogger(__name__)
+
+_ROUTING_SCRIPT = "ctx._routing = String.valueOf(ctx._source.instance_id)"
+_RENAME_STATE_INDEXES_SCRIPT = """
+for (event in ctx._source.attributes.values()) {
+    if (event.index != null && params.indexes.containsKey(event.index)) {
+        event.index = params.indexes[event.index];
+    }
+}
+"""
+_REINDEX_BATCH_SIZE = 5_000
+_TASK_POLL_SECONDS = 10
+
+
+def _wait_for_task(task_id: str) -> dict:
+    while True:
+        result = elastic_client.tasks.get(task_id=task_id)
+        if result.get("completed"):
+            break
+
+        status = result["task"]["status"]
+        logger.info(
+            "%s: %s of %s documents",
+            result["task"]["description"],
+            status.get("created", 0) + status.get("updated", 0),
+            status.get("total"),
+        )
+        time.sleep(_TASK_POLL_SECONDS)
+
+    response = result.get("response") or {}
+    if result.get("error") or response.get("failures"):
+        raise MigrationTaskFailed(
+            f"Task {task_id} failed: "
+            f"{result.get('error') or response['failures'][:10]}"
+        )
+    return response
+
+
+def _get_targets(alias: str, indexes: list[str], suffix: str) -> dict[str, str]:
+    if len(indexes) == 1:
+        return {indexes[0]: f"rebuild_{alias}_{suffix}"}
+
+    return {
+        index: f"rebuild_{alias}_{suffix}-{generation:06d}"
+        for generation, index in enumerate(indexes, start=1)
+    }
+
+
+def _reindex(index: str, target: str) -> int:
+    elastic_client.indices.create(
+        index=target, body=get_events_index_body(**BULK_LOAD_SETTINGS)
+    )
+
+    task_id = elastic_client.reindex(
+        source={"index": index, "size": _REINDEX_BATCH_SIZE},
+        dest={"index": target, "op_type": "create"},
+        script=(
+            {"lang": "painless", "source": _ROUTING_SCRIPT}
+            if ES_ROUTING_ENABLED
+            else None
+        ),
+        slices="auto",
+        wait_for_completion=False,
+    )["task"]
+    return _wait_for_task(task_id).get("created", 0)
+
+
+def _get_write_index(alias: str) -> str | None:
+    write_alias = get_write_alias(alias)
+    if not elastic_client.indices.exists_alias(name=write_alias):
+        return None
+
+    for index, data in elastic_client.indices.get_alias(
+        name=write_alias
+    ).items():
+        if data["aliases"][write_alias].get("is_write_index"):
+            return index
+    return None
+
+
+def _rename_state_event_indexes(
+    state_index: str, targets: dict[str, str]
+) -> None:
+    # events of the state documents are updated in the index they live in
+    if not elastic_client.indices.exists(index=state_index):
+        return
+
+    task_id = elastic_client.update_by_query(
+        index=state_index,
+        script={
+            "lang": "painless",
+            "source": _RENAME_STATE_INDEXES_SCRIPT,
+            "params": {"indexes": targets},
+        },
+        slices="auto",
+        wait_for_completion=False,
+    )["task"]
+    _wait_for_task(task_id)
+
+
+def reindex_event_index(
+    alias: str,
+    state_index: str,
+    suffix: str,
+    is_current: Callable[[dict], bool],
+) -> None:
+    """Reindex the indexes behind the alias unless the mappings of all of
+    them are current."""
+    indexes = get_concrete_indexes([alias])
+    if not indexes:
+        logger.info("%s does not exist", alias)
+        return
+
+    mappings = elastic_client.indices.get_mapping(index=",".join(indexes))
+    if all(is_current(mappings[index]["mappings"]) for index in indexes):
+        logger.info("%s is up to date", alias)
+        return
+
+    targets = _get_targets(alias=alias, indexes=indexes, suffix=suffix)
+    for index, target in targets.items():
+        documents = _reindex(index=index, target=target)
+        logger.info(
+            "%s: %s documents reindexed into %s", index, documents, target
+        )
+
+    new_indexes = ",".join(targets.values())
+    elastic_client.indices.put_settings(
+        index=new_indexes, settings=SERVING_SETTINGS
+    )
+    elastic_client.indices.refresh(index=new_indexes)
+
+    actions, replaced = get_alias_switch_actions(
+        alias=alias, indexes=list(targets.values())
+    )
+    write_index = _get_write_index(alias) if ES_ROLLOVER_ENABLED else None
+    if write_index is not None:
+        actions.extend(
+            get_write_alias_switch_actions(
+                alias=alias, index=targets[write_index]
+            )
+        )
+    elastic_client.indices.update_aliases(actions=actions)
+    logger.info("Aliases switched: %s", actions)
+
+    if write_index is not None:
+        if ES_STATE_INDEXES_ENABLED:
+            _rename_state_event_indexes(
+                state_index=state_index, targets=targets
+            )
+        roll_over_to_backing_index(alias=alias, suffix=suffix)
+
+    if replaced:
+        logger.info("Previous indexes are kept: %s", replaced)
+
+
+def reindex_event_indexes(is_current: Callable[[dict], bool]) -> None:
+    if ES_ROLLOVER_ENABLED:
+        # backing indexes created from now on get the current mappings
+        create_rollover_templates()
+
+    suffix = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    for index in InventoryChangesIndexes:
+        if index == InventoryChangesIndexes.ALL:
+            continue
+        reindex_event_index(
+            alias=index.value,
+            state_index=InventoryStateIndexes[index.name].value,
+            suffix=suffix,
+            is_current=is_current,
+        )
@@ -0,0 +1,74 @@
+"""Move the event indexes behind read and write aliases with rollover.
+
+A single events index is cloned into `legacy_<name>` and deleted, so that
+its name becomes the read alias. The legacy index, or the indexes already
+behind the alias after a replay, stay in the read alias and receive the
+updates of the events they hold, new events go to a fresh backing index
+created by a rollover.
+
+The consumers should be stopped while an index is cloned, as it is read
+only meanwhile.
+"""
+
+import logging
+
+from services.elastic_service.elastic_client import (
+    create_rollover_templates,
+    elastic_client,
+    get_backing_index_name,
+    get_write_alias,
+)
+from services.elastic_service.migrations.common import EVENT_INDEXES
+
+logger = logging.getLogger(__name__)
+
+
+def _clone_into_legacy_index(index: str) -> str:
+    legacy_index = f"legacy_{index}"
+    elastic_client.indices.add_block(index=index, block="write")
+    elastic_client.indices.clone(
+        index=index,
+        target=legacy_index,
+        settings={"index.blocks.write": False},
+        wait_for_active_shards="all",
+    )
+    elastic_client.indices.delete(index=index)
+    elastic_client.indices.update_aliases(
+        actions=[{"add": {"index": legacy_index, "alias": index}}]
+    )
+    logger.info("%s moved into %s", index, legacy_index)
+    return legacy_index
+
+
+def migrate_index(index: str) -> None:
+    write_alias = get_write_alias(index)
+    if elastic_client.indices.exists_alias(name=write_alias):
+        logger.info("%s already has a write alias", index)
+        return
+
+    if elastic_client.indices.exists_alias(name=index):
+        current_index = sorted(elastic_client.indices.get_alias(name=index))[-1]
+    else:
+        current_index = _clone_into_legacy_index(index)
+
+    elastic_client.indices.update_aliases(
+        actions=[
+            {
+                "add": {
+                    "index": current_index,
+                    "alias": write_alias,
+                    "is_write_index": True,
+                }
+            }
+        ]
+    )
+    elastic_client.indices.rollover(
+        alias=write_alias, new_index=get_backing_index_name(index)
+    )
+    logger.info("%s rolled over to %s", index, get_backing_index_name(index))
+
+
+def migrate() -> None:
+    create_rollover_templates()
+    for index in EVENT_INDEXES:
+        migrate_index(index)
@@ -0,0 +1,91 @@
+"""Replace the Painless runtime value fields of the event indexes with
+indexed fields.
+
+The typed fields are added to the mapping first, the runtime fields keep
+shadowing them while every document gets its typed values, then the
+runtime fields are removed and filters on values become index lookups.
+"""
+
+import logging
+
+from services.elastic_service.elastic_client import elastic_client
+from services.elastic_service.migrations.common import (
+    EVENT_INDEXES,
+    get_concrete_indexes,
+    iter_index_documents,
+)
+from services.event_processor.inventory_processor.bulk_writer import (
+    ElasticsearchBulkWriter,
+)
+from services.event_processor.inventory_processor.typed_values import (
+    TYPED_VALUE_FIELDS,
+    TYPED_VALUE_MAPPINGS,
+    VALUE_ATTRIBUTES,
+    build_typed_value_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+_PROGRESS_INTERVAL = 100_000
+
+
+def _backfill(index: str) -> int:
+    writer = ElasticsearchBulkWriter(index)
+    documents = 0
+    for documents, hit in enumerate(
+        iter_index_documents(index=index, source=list(VALUE_ATTRIBUTES)),
+        start=1,
+    ):
+        source = hit.get("_source") or {}
+        fields = {}
+        for attribute in VALUE_ATTRIBUTES:
+            fields.update(
+                build_typed_value_fields(attribute, source.get(attribute))
+            )
+
+        if fields:
+            # the consumer may deactivate the event at the same time
+            writer.add_update(
+                doc_id=hit["_id"],
+                document=fields,
+                retry_on_conflict=3,
+                routing=hit.get("_routing"),
+            )
+
+        if documents % _PROGRESS_INTERVAL == 0:
+            logger.info("%s: %s documents", index, documents)
+
+    writer.flush()
+    return documents
+
+
+def migrate_index(index: str) -> None:
+    mappings = elastic_client.indices.get_mapping(index=index)[index][
+        "mappings"
+    ]
+    if "runtime" not in mappings:
+        # created with the typed fields, possibly with another profile
+        logger.info("%s has no runtime value fields", index)
+        return
+
+    elastic_client.indices.put_mapping(
+        index=index,
+        properties={
+            f"{attribute}_{suffix}": mapping
+            for attribute in VALUE_ATTRIBUTES
+            for suffix, mapping in TYPED_VALUE_MAPPINGS.items()
+        },
+    )
+
+    documents = _backfill(index)
+    elastic_client.indices.refresh(index=index)
+
+    elastic_client.indices.put_mapping(
+        index=index, runtime={field: None for field in TYPED_VALUE_FIELDS}
+    )
+    logger.info("%s: typed value fields of %s documents", index, documents)
+
+
+def migrate() -> None:
+    for index in get_concrete_indexes(EVENT_INDEXES):
+        migrate_index(index)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from elasticsearch import NotFoundError
+
+from services.elastic_service.elastic_client import (
+    elastic_client,
+    get_write_alias,
+)
+
+_WRITE_INDEX_TTL_SECONDS = 60
+
+
+class WriteIndexResolver:
+    """Current index behind the write alias of an events index.
+
+    New events are created directly in it, so the concrete index of every
+    event is known and its later update goes to the backing index holding
+    it. The result is kept for a minute: an event created in the previous
+    index right after a rollover is still found there.
+    """
+
+    def __init__(self, ttl: float = _WRITE_INDEX_TTL_SECONDS):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._write_indexes: dict[str, tuple[float, str]] = {}
+
+    @staticmethod
+    def _fetch(index: str) -> str:
+        write_alias = get_write_alias(index)
+        try:
+            aliases = elastic_client.indices.get_alias(name=write_alias)
+        except NotFoundError:
+            # a single index without rollover
+            return index
+
+        for name, meta in aliases.items():
+            alias = meta["aliases"][write_alias]
+            if alias.get("is_write_index", len(aliases) == 1):
+                return name
+
+        return index
+
+    def resolve(self, index: str) -> str:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._write_indexes.get(index)
+        if cached is not None and now - cached[0] < self._ttl:
+            return cached[1]
+
+        write_index = self._fetch(index)
+        with self._lock:
+            self._write_indexes[index] = (now, write_index)
+        return write_index
+
+    def clear(self) -> None:
+        with self._lock:
+            self._write_indexes.clear()
+
+
+write_index_resolver = WriteIndexResolver()
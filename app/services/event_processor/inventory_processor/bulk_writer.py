@@ -0,0 +1,401 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout
+
+from config.elastic_config import (
+    ES_BULK_INITIAL_BACKOFF,
+    ES_BULK_MAX_BACKOFF,
+    ES_BULK_MAX_BYTES,
+    ES_BULK_MAX_IN_FLIGHT,
+    ES_BULK_MAX_RETRIES,
+    ES_BULK_REQUEST_TIMEOUT,
+)
+from services.elastic_service.backpressure import elastic_backpressure
+from services.elastic_service.elastic_client import elastic_client
+from services.event_processor.inventory_processor.constants import (
+    INSTANCES_BATCH_SIZE,
+)
+from services.event_processor.inventory_processor.dead_letter import (
+    FailedBulkItem,
+    send_to_dead_letter,
+)
+
+logger = logging.getLogger(__name__)
+
+_RETRY_STATUSES = {429, 502, 503, 504}
+_RETRY_ERROR_TYPES = {"es_rejected_execution_exception"}
+
+_max_in_flight = ES_BULK_MAX_IN_FLIGHT
+_bulk_executor = ThreadPoolExecutor(
+    max_workers=_max_in_flight, thread_name_prefix="es-bulk"
+)
+
+
+def configure_bulk_parallelism(max_in_flight: int) -> None:
+    """Change the number of bulk requests in flight for writers created
+    afterwards, e.g. for a replay that owns the whole cluster."""
+    global _max_in_flight, _bulk_executor
+    # requests already submitted to the old pool still finish
+    _bulk_executor.shutdown(wait=False)
+    _max_in_flight = max_in_flight
+    _bulk_executor = ThreadPoolExecutor(
+        max_workers=max_in_flight, thread_name_prefix="es-bulk"
+    )
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+
+    raise TypeError(f"Unable to serialize {value!r} (type: {type(value)})")
+
+
+def dump_ndjson_line(data: Any) -> bytes:
+    try:
+        return orjson.dumps(
+            data,
+            default=_json_default,
+            option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS,
+        )
+    except orjson.JSONEncodeError:
+        # e.g. integers beyond 64 bits, Elasticsearch rejects the item alone
+        return (json.dumps(data, default=_json_default) + "\n").encode()
+
+
+def _get_document(item: bytes) -> tuple[str, str]:
+    ((_, meta),) = orjson.loads(item.split(b"\n", 1)[0]).items()
+    return meta["_index"], meta["_id"]
+
+
+def _is_retryable(outcome: dict) -> bool:
+    error = outcome.get("error") or {}
+    return (
+        outcome.get("status") in _RETRY_STATUSES
+        or error.get("type") in _RETRY_ERROR_TYPES
+    )
+
+
+def split_failed_items(
+    items: list[bytes], response: dict
+) -> tuple[list[FailedBulkItem], list[FailedBulkItem]]:
+    """Return the items to retry and the items failed permanently. A
+    conflict on create means the event is already stored, so it counts as
+    written."""
+    if not response.get("errors"):
+        return [], []
+
+    to_retry, failed = [], []
+    for item, result in zip(items, response["items"]):
+        ((action, outcome),) = result.items()
+        if "error" not in outcome:
+            continue
+        if action == "create" and outcome.get("status") == 409:
+            continue
+
+        if _is_retryable(outcome):
+            to_retry.append(FailedBulkItem(item=item, outcome=outcome))
+        else:
+            failed.append(FailedBulkItem(item=item, outcome=outcome))
+
+    return to_retry, failed
+
+
+@dataclass
+class BulkWriterMetrics:
+    requests: int = 0
+    actions: int = 0
+    bytes: int = 0
+    retried_items: int = 0
+    dead_letters: int = 0
+    seconds: float = 0.0
+    max_bytes: int = 0
+    max_seconds: float = 0.0
+
+    def add(
+        self,
+        actions: int,
+        size: int,
+        seconds: float,
+        retried_items: int,
+        dead_letters: int,
+    ) -> None:
+        self.requests += 1
+        self.actions += actions
+        self.bytes += size
+        self.retried_items += retried_items
+        self.dead_letters += dead_letters
+        self.seconds += seconds
+        self.max_bytes = max(self.max_bytes, size)
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ElasticsearchBulkWriter:
+    """Serializes bulk actions to NDJSON as they are added and sends them
+    once `batch_size` actions or `max_bytes` are buffered.
+
+    Up to `max_in_flight` requests run in the background, on `executor` or
+    the shared bulk pool, while the caller
+    prepares the next ones. A request touching a document of a request
+    still in flight waits for it, so writes of one document keep their
+    order.
+
+    Items rejected under load are retried with exponential backoff, items
+    that fail permanently or run out of retries go to the dead letter
+    index and the `key` they were added with is reported by
+    `pop_failed_keys`. Latency and rejections of every request are reported to
+    `elastic_backpressure`, which shrinks the batch size while
+    Elasticsearch struggles.
+    """
+
+    def __init__(
+        self,
+        index: str,
+        batch_size: int = INSTANCES_BATCH_SIZE,
+        max_bytes: int = ES_BULK_MAX_BYTES,
+        max_in_flight: int | None = None,
+        max_retries: int = ES_BULK_MAX_RETRIES,
+        initial_backoff: float = ES_BULK_INITIAL_BACKOFF,
+        max_backoff: float = ES_BULK_MAX_BACKOFF,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        self.index = index
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_in_flight = max_in_flight or _max_in_flight
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._executor = executor
+        self.metrics = BulkWriterMetrics()
+        self._metrics_lock = threading.Lock()
+        self._items: list[bytes] = []
+        self._size = 0
+        self._failed_keys: set = set()
+        # (index, doc id) -> key of the buffered actions
+        self._documents: dict[tuple[str, str], Any] = {}
+        self._in_flight: deque[tuple[Future, dict[tuple[str, str], Any]]] = (
+            deque()
+        )
+
+    def add_index(
+        self,
+        *,
+        doc_id: str,
+        document: dict,
+        index: str | None = None,
+        routing: str | None = None,
+        key: Any = None,
+    ) -> None:
+        self._add(
+            action="create",
+            index=index or self.index,
+            doc_id=doc_id,
+            source=document,
+            routing=routing,
+            key=key,
+        )
+
+    def add_update(
+        self,
+        *,
+        doc_id: str,
+        document: dict,
+        index: str | None = None,
+        retry_on_conflict: int | None = None,
+        routing: str | None = None,
+        key: Any = None,
+    ) -> None:
+        self._add(
+            action="update",
+            index=index or self.index,
+            doc_id=doc_id,
+            source={"doc": document},
+            retry_on_conflict=retry_on_conflict,
+            routing=routing,
+            key=key,
+        )
+
+    def add_document(
+        self, *, index: str, doc_id: str, document: dict, key: Any = None
+    ) -> None:
+        self._add(
+            action="index", index=index, doc_id=doc_id, source=document, key=key
+        )
+
+    def add_delete(self, *, index: str, doc_id: str, key: Any = None) -> None:
+        self._add(action="delete", index=index, doc_id=doc_id, key=key)
+
+    def _add(
+        self,
+        *,
+        action: str,
+        index: str,
+        doc_id: str,
+        source: Any = None,
+        retry_on_conflict: int | None = None,
+        routing: str | None = None,
+        key: Any = None,
+    ) -> None:
+        meta = {"_index": index, "_id": doc_id}
+        if routing is not None:
+            meta["routing"] = routing
+        if retry_on_conflict is not None:
+            meta["retry_on_conflict"] = retry_on_conflict
+        item = dump_ndjson_line({action: meta})
+        if source is not None:
+            item += dump_ndjson_line(source)
+
+        if self._items and self._size + len(item) > self.max_bytes:
+            self._send()
+
+        self._items.append(item)
+        self._size += len(item)
+        self._documents[(index, doc_id)] = key
+
+        if (
+            len(self._items) >= elastic_backpressure.batch_size(self.batch_size)
+            or self._size >= self.max_bytes
+        ):
+            self._send()
+
+    @staticmethod
+    def _bulk(
+        items: list[bytes],
+    ) -> tuple[list[FailedBulkItem], list[FailedBulkItem]]:
+        started = time.perf_counter()
+        try:
+            response = elastic_client.options(
+                request_timeout=ES_BULK_REQUEST_TIMEOUT
+            ).bulk(body=b"".join(items))
+
+        except (ApiError, ConnectionError, ConnectionTimeout) as e:
+            # the whole request was rejected, e.g. 429 from a busy node or a
+            # node restarting
+            status = e.meta.status if isinstance(e, ApiError) else None
+            if isinstance(e, ApiError) and status not in _RETRY_STATUSES:
+                raise
+            elastic_backpressure.record(
+                seconds=time.perf_counter() - started,
+                items=len(items),
+                rejected=len(items),
+            )
+            outcome = {"status": status, "error": {"reason": str(e)}}
+            return [
+                FailedBulkItem(item=item, outcome=outcome) for item in items
+            ], []
+
+        to_retry, failed = split_failed_items(items=items, response=response)
+        elastic_backpressure.record(
+            seconds=time.perf_counter() - started,
+            items=len(items),
+            rejected=len(to_retry),
+        )
+        return to_retry, failed
+
+    def _request(
+        self, items: list[bytes], documents: dict[tuple[str, str], Any]
+    ) -> None:
+        started = time.perf_counter()
+        size = sum(len(item) for item in items)
+        retried_items = 0
+
+        to_retry, dead_letters = self._bulk(items)
+        for attempt in range(self.max_retries):
+            if not to_retry:
+                break
+
+            time.sleep(min(self.max_backoff, self.initial_backoff * 2**attempt))
+            retried_items += len(to_retry)
+            to_retry, failed = self._bulk([failed.item for failed in to_retry])
+            dead_letters.extend(failed)
+
+        dead_letters.extend(to_retry)
+        send_to_dead_letter(dead_letters)
+        elapsed = time.perf_counter() - started
+        failed_keys = {
+            documents.get(_get_document(failed.item)) for failed in dead_letters
+        }
+        failed_keys.discard(None)
+
+        with self._metrics_lock:
+            self._failed_keys.update(failed_keys)
+            self.metrics.add(
+                actions=len(items),
+                size=size,
+                seconds=elapsed,
+                retried_items=retried_items,
+                dead_letters=len(dead_letters),
+            )
+        logger.debug(
+            "Bulk request of %s actions, %s bytes took %.3f s, %s retried",
+            len(items),
+            size,
+            elapsed,
+            retried_items,
+        )
+
+    def _collect_done(self) -> None:
+        in_flight = deque()
+        for future, documents in self._in_flight:
+            if future.done():
+                future.result()
+            else:
+                in_flight.append((future, documents))
+        self._in_flight = in_flight
+
+    def _send(self) -> None:
+        if not self._items:
+            return
+
+        items = self._items
+        documents = self._documents
+        self._items = []
+        self._size = 0
+        self._documents = {}
+
+        for future, in_flight_documents in self._in_flight:
+            if not documents.keys().isdisjoint(in_flight_documents):
+                future.result()
+        self._collect_done()
+
+        while len(self._in_flight) >= self.max_in_flight:
+            self._in_flight[0][0].result()
+            self._collect_done()
+
+        executor = self._executor or _bulk_executor
+        future = executor.submit(self._request, items, documents)
+        self._in_flight.append((future, documents))
+
+    def flush(self) -> None:
+        self._send()
+        while self._in_flight:
+            future, _ = self._in_flight.popleft()
+            future.result()
+
+    def pop_failed_keys(self) -> set:
+        """Keys of the actions that failed permanently since the last
+        call."""
+        with self._metrics_lock:
+            failed_keys, self._failed_keys = self._failed_keys, set()
+        return failed_keys
+
+    def abort(self) -> None:
+        """Drop buffered actions and wait for the requests in flight,
+        ignoring their errors."""
+        self._items = []
+        self._size = 0
+        self._documents = {}
+        wait([future for future, _ in self._in_flight])
+        self._in_flight.clear()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, NamedTuple
+
+from cachetools import LRUCache
+
+from config.cache_config import ACTIVE_EVENTS_CACHE_MAX_BYTES
+
+# rough per-entry overhead of the key, dict slot and ActiveEvent tuple
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class ActiveEvent(NamedTuple):
+    doc_id: str
+    version: int
+    new_value: Any
+    # backing index holding the event, None for a single events index
+    index: str | None = None
+
+
+def estimate_active_events_size(events: dict[str, ActiveEvent]) -> int:
+    size = _ENTRY_OVERHEAD_BYTES
+    for attribute, event in events.items():
+        size += (
+            _ENTRY_OVERHEAD_BYTES
+            + len(attribute)
+            + len(event.doc_id)
+            + len(event.index or "")
+            + len(str(event.new_value))
+        )
+    return size
+
+
+class ActiveEventsCache:
+    """Memory-bounded LRU of the active events of recently seen instances.
+
+    An entry always holds the complete set of active events of an instance,
+    so a hit makes the Elasticsearch lookup unnecessary.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._cache: LRUCache | None = None
+        if max_bytes > 0:
+            self._cache = LRUCache(
+                maxsize=max_bytes, getsizeof=estimate_active_events_size
+            )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache is not None
+
+    def get_many(
+        self, index: str, instance_ids: list[int]
+    ) -> tuple[dict[int, dict[str, ActiveEvent]], list[int]]:
+        if self._cache is None:
+            return {}, list(instance_ids)
+
+        found: dict[int, dict[str, ActiveEvent]] = {}
+        missing_ids: list[int] = []
+        with self._lock:
+            for instance_id in instance_ids:
+                events = self._cache.get((index, instance_id))
+                if events is None:
+                    missing_ids.append(instance_id)
+                    continue
+                found[instance_id] = dict(events)
+
+            self.hits += len(found)
+            self.misses += len(missing_ids)
+
+        return found, missing_ids
+
+    def set(
+        self, index: str, instance_id: int, events: dict[str, ActiveEvent]
+    ) -> None:
+        if self._cache is None:
+            return
+
+        with self._lock:
+            try:
+                self._cache[(index, instance_id)] = dict(events)
+            except ValueError:
+                # value is larger than the whole budget
+                self._cache.pop((index, instance_id), None)
+
+    def clear(self) -> None:
+        if self._cache is None:
+            return
+
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._cache) if self._cache is not None else 0,
+                "size_bytes": (
+                    self._cache.currsize if self._cache is not None else 0
+                ),
+            }
+
+
+active_events_cache = ActiveEventsCache(max_bytes=ACTIVE_EVENTS_CACHE_MAX_BYTES)
@@ -15,3 +15,17 @@ class AvailableInventoryInstances(Enum):
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
 INSTANCES_BATCH_SIZE = 10_000
+
+ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE = 1_000
+ACTIVE_EVENTS_LOOKUP_PAGE_SIZE = 10_000
+ACTIVE_EVENTS_LOOKUP_KEEP_ALIVE = "1m"
+ACTIVE_EVENTS_SOURCE_FIELDS = [
+    "instance_id",
+    "attribute",
+    "new_value",
+    "version",
+]
+
+# ids of the object and parameter type of a PRM, copied onto every event of
+# the PRM so its history is found by object without joins
+PARAMETER_PARENT_FIELDS = ("mo_id", "tprm_id")
@@ -0,0 +1,64 @@
+import logging
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import orjson
+
+from common.constants import EVENT_DEAD_LETTER_INDEX
+from services.elastic_service.elastic_client import elastic_client
+
+logger = logging.getLogger(__name__)
+
+
+class FailedBulkItem(NamedTuple):
+    item: bytes
+    outcome: dict
+
+
+def _build_dead_letter(failed: FailedBulkItem, failed_at: str) -> dict:
+    lines = failed.item.splitlines()
+    ((action, meta),) = orjson.loads(lines[0]).items()
+    error = failed.outcome.get("error") or {}
+
+    return {
+        "index": meta.get("_index"),
+        "doc_id": meta.get("_id"),
+        "action": action,
+        "status": failed.outcome.get("status"),
+        "error_type": error.get("type"),
+        "error": error,
+        "source": orjson.loads(lines[1]) if len(lines) > 1 else None,
+        "failed_at": failed_at,
+    }
+
+
+def send_to_dead_letter(failed_items: list[FailedBulkItem]) -> None:
+    """Store bulk items that can't be written, so they can be inspected
+    and replayed instead of being lost."""
+    if not failed_items:
+        return
+
+    failed_at = datetime.now(timezone.utc).isoformat()
+    operations = []
+    for failed in failed_items:
+        operations.append({"index": {"_index": EVENT_DEAD_LETTER_INDEX}})
+        operations.append(_build_dead_letter(failed, failed_at))
+
+    logger.error(
+        "%s bulk items failed permanently, storing them in %s",
+        len(failed_items),
+        EVENT_DEAD_LETTER_INDEX,
+    )
+    try:
+        response = elastic_client.bulk(operations=operations)
+        if response.get("errors"):
+            raise RuntimeError("Dead letter index rejected some items")
+
+    except Exception:
+        logger.exception("Unable to store dead letters")
+        for failed in failed_items:
+            logger.error(
+                "Dead letter: %s %s",
+                failed.item.decode("utf-8", "replace"),
+                failed.outcome,
+            )
@@ -1,16 +1,46 @@
 from __future__ import annotations
 
-from typing import Any, Iterable
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Iterator
 
-from common.constants import InventoryChangesIndexes
+from common.constants import InventoryChangesIndexes, InventoryStateIndexes
+from config.elastic_config import ES_ROLLOVER_ENABLED, ES_STATE_INDEXES_ENABLED
 from models import EventType
-from services.converter_service.processor import ConvertParameterValues
+from services.converter_service.cache import (
+    build_parameter_type_metadata,
+    parameter_type_cache,
+    linked_value_cache,
+)
+from services.converter_service.processor import (
+    LINKED_VALUE_SOURCES,
+    ConvertParameterValues,
+)
 from services.converter_service.schemas import ParameterInstance
-from services.elastic_service.elastic_client import elastic_client
+from services.elastic_service.elastic_client import (
+    elastic_client,
+    get_instance_routing,
+)
+from services.elastic_service.rollover import write_index_resolver
+from services.event_processor.inventory_processor.bulk_writer import (
+    BulkWriterMetrics,
+    ElasticsearchBulkWriter,
+)
+from services.event_processor.inventory_processor.cache import (
+    ActiveEvent,
+    active_events_cache,
+)
 from services.event_processor.inventory_processor.constants import (
     AvailableInventoryInstances,
     INSTANCES_BATCH_SIZE,
+    ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE,
+    ACTIVE_EVENTS_LOOKUP_KEEP_ALIVE,
+    ACTIVE_EVENTS_LOOKUP_PAGE_SIZE,
+    ACTIVE_EVENTS_SOURCE_FIELDS,
+    PARAMETER_PARENT_FIELDS,
 )
+from services.event_processor.inventory_processor.records import EventRecord
 from services.event_processor.inventory_processor.exceptions import (
     NotImplementedInstance,
     NotImplementedEventType,
@@ -22,38 +52,16 @@ from services.event_processor.inventory_processor.utils import (
     generate_record_id,
     format_recording_datetime,
     compare_values_equal,
-)
-from services.kafka_service.inventory_changes_processor.schemas import (
-    EventsBase,
+    split_into_chunks,
 )
 
+logger = logging.getLogger(__name__)
 
-class ElasticsearchBulkWriter:
-    def __init__(self, index: str, batch_size: int = INSTANCES_BATCH_SIZE):
-        self.index = index
-        self.batch_size = batch_size
-        self._actions: list[dict] = []
-
-    def add_index(self, *, doc_id: str, document: dict) -> None:
-        self._actions.append({"create": {"_index": self.index, "_id": doc_id}})
-        self._actions.append(document)
-        self.flush_on_limit()
-
-    def add_update(self, *, doc_id: str, document: dict) -> None:
-        self._actions.append({"update": {"_index": self.index, "_id": doc_id}})
-        self._actions.append({"doc": document})
-        self.flush_on_limit()
-
-    def flush_on_limit(self):
-        if len(self._actions) >= 2 * self.batch_size:
-            self.flush()
-
-    def flush(self) -> None:
-        if not self._actions:
-            return
-
-        elastic_client.bulk(body=self._actions)
-        self._actions.clear()
+# instance name -> attribute shown as the value of PRMs linking to it
+LINKED_VALUE_ATTRIBUTES = {
+    source_index.name: attribute
+    for source_index, attribute in LINKED_VALUE_SOURCES.values()
+}
 
 
 class InventoryAdapterFunction:
@@ -105,15 +113,38 @@ class InventoryEventProcessor:
         instance_name: AvailableInventoryInstances | str,
         stop_list_attributes: set[str],
         batch_size: int = INSTANCES_BATCH_SIZE,
+        elastic_index: str | None = None,
+        state_index: str | None = None,
+        converter: ConvertParameterValues | None = None,
+        search_fallback: bool = True,
+        bulk_in_flight: int | None = None,
+        bulk_executor: ThreadPoolExecutor | None = None,
     ):
         self._stop_list_attributes = stop_list_attributes
         self._instance_name = get_value_from_enum(instance_name)
-        self._elastic_index = self._determine_index_for_store(
+        self._elastic_index = elastic_index or self._determine_index_for_store(
             self._instance_name
         )
+        # backing index new events are created in with rollover, events
+        # without it are in the single index
+        self._write_index: str | None = None
+        self._state_index = state_index
+        if state_index is None and ES_STATE_INDEXES_ENABLED:
+            self._state_index = self._determine_state_index(self._instance_name)
         self._bulk = ElasticsearchBulkWriter(
-            self._elastic_index, batch_size=batch_size
+            self._elastic_index,
+            batch_size=batch_size,
+            max_in_flight=bulk_in_flight,
+            executor=bulk_executor,
         )
+        self._converter = converter or ConvertParameterValues()
+        # without the fallback the state index is the only source of
+        # active events, e.g. for indexes rebuilt from scratch
+        self._search_fallback = search_fallback
+
+    @property
+    def bulk_metrics(self) -> BulkWriterMetrics:
+        return self._bulk.metrics
 
     @staticmethod
     def check_required_attributes(instance: dict, instance_name: str) -> bool:
@@ -141,10 +172,18 @@ class InventoryEventProcessor:
             )
 
     @staticmethod
-    def convert_parameter_value_by_val_type(instance: dict) -> None:
+    def _determine_state_index(instance_name: str) -> str:
+        try:
+            return InventoryStateIndexes[instance_name].value
+
+        except KeyError:
+            raise NotImplementedInstance(
+                f"Instance with name {instance_name} can't be determined"
+            )
+
+    def convert_parameter_value_by_val_type(self, instance: dict) -> None:
         try:
-            task = ConvertParameterValues()
-            instance["value"] = task.convert(
+            instance["value"] = self._converter.convert(
                 parameter_instance=ParameterInstance(**instance)
             )
         except Exception as e:
@@ -152,7 +191,238 @@ class InventoryEventProcessor:
             print("Can not convert parameter value")
             print(instance, "\n")
 
-    def _create(self, instance: dict, user_id: str, session_id: str) -> None:
+    def _get_active_events(
+        self, instance_ids: list[int]
+    ) -> dict[int, dict[str, ActiveEvent]]:
+        active_events: dict[int, dict[str, ActiveEvent]] = defaultdict(dict)
+
+        cached_events, missing_ids = active_events_cache.get_many(
+            index=self._elastic_index, instance_ids=instance_ids
+        )
+        active_events.update(cached_events)
+        if not missing_ids:
+            return active_events
+
+        if self._state_index is not None:
+            # instances written before the state index was enabled are
+            # still missing there and fall through to the search
+            state_events, missing_ids = self._get_active_events_from_state(
+                instance_ids=missing_ids
+            )
+            active_events.update(state_events)
+
+        if missing_ids and self._search_fallback:
+            active_events.update(
+                self._search_active_events(instance_ids=missing_ids)
+            )
+
+        return active_events
+
+    def _get_active_events_from_state(
+        self, instance_ids: list[int]
+    ) -> tuple[dict[int, dict[str, ActiveEvent]], list[int]]:
+        active_events: dict[int, dict[str, ActiveEvent]] = defaultdict(dict)
+        missing_ids: list[int] = []
+
+        for ids_chunk in split_into_chunks(
+            instance_ids, ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE
+        ):
+            response = elastic_client.mget(
+                index=self._state_index,
+                body={"ids": [str(instance_id) for instance_id in ids_chunk]},
+            )
+            for doc in response["docs"]:
+                if not doc.get("found"):
+                    missing_ids.append(int(doc["_id"]))
+                    continue
+
+                attributes = doc["_source"]["attributes"]
+                if ES_ROLLOVER_ENABLED and any(
+                    event.get("index") is None for event in attributes.values()
+                ):
+                    # stored before rollover, the search finds the index
+                    missing_ids.append(int(doc["_id"]))
+                    continue
+
+                for attribute, event in attributes.items():
+                    active_events[int(doc["_id"])][attribute] = ActiveEvent(
+                        **event
+                    )
+
+        return active_events, missing_ids
+
+    def _store_active_events(
+        self,
+        instance_id: int,
+        active_events: dict[int, dict[str, ActiveEvent]],
+    ) -> None:
+        current_events = active_events.get(instance_id) or {}
+        active_events_cache.set(
+            index=self._elastic_index,
+            instance_id=instance_id,
+            events=current_events,
+        )
+
+        if self._instance_name == AvailableInventoryInstances.TPRM.value:
+            self._refresh_parameter_type_cache(
+                parameter_type_id=instance_id, current_events=current_events
+            )
+
+        if self._instance_name in LINKED_VALUE_ATTRIBUTES:
+            # MO names and PRM values are shown as values of linked PRMs,
+            # the written value is cached as the index is not refreshed yet
+            linked_event = current_events.get(
+                LINKED_VALUE_ATTRIBUTES[self._instance_name]
+            )
+            if linked_event is None:
+                linked_value_cache.invalidate(
+                    index=self._elastic_index, instance_id=instance_id
+                )
+            else:
+                linked_value_cache.set_many(
+                    index=self._elastic_index,
+                    values={instance_id: linked_event.new_value},
+                )
+
+        if self._state_index is None:
+            return
+
+        if not current_events:
+            self._bulk.add_delete(
+                index=self._state_index,
+                doc_id=str(instance_id),
+                key=instance_id,
+            )
+            return
+
+        self._bulk.add_document(
+            index=self._state_index,
+            doc_id=str(instance_id),
+            key=instance_id,
+            document={
+                "instance_id": instance_id,
+                "attributes": {
+                    attribute: event._asdict()
+                    for attribute, event in current_events.items()
+                },
+            },
+        )
+
+    @staticmethod
+    def _refresh_parameter_type_cache(
+        parameter_type_id: int, current_events: dict[str, ActiveEvent]
+    ) -> None:
+        if not current_events:
+            parameter_type_cache.invalidate(parameter_type_id)
+            return
+
+        val_type = current_events.get("val_type")
+        multiple = current_events.get("multiple")
+        parameter_type_cache.set(
+            parameter_type_id,
+            build_parameter_type_metadata(
+                val_type=val_type.new_value if val_type else None,
+                multiple=multiple.new_value if multiple else None,
+            ),
+        )
+
+    def _get_instance_fields(
+        self, instance: dict, current_events: dict[str, ActiveEvent]
+    ) -> dict[str, Any]:
+        """Fields of the instance stamped on each event written for it."""
+        return {}
+
+    def _search_active_events(
+        self, instance_ids: list[int]
+    ) -> dict[int, dict[str, ActiveEvent]]:
+        """Fetch active events of instances grouped by instance id and
+        attribute, using one `terms` query per chunk of ids."""
+        active_events: dict[int, dict[str, ActiveEvent]] = defaultdict(dict)
+
+        for ids_chunk in split_into_chunks(
+            instance_ids, ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE
+        ):
+            query: dict[str, Any] = {
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"terms": {"instance_id": ids_chunk}},
+                            {"term": {"is_active": True}},
+                        ]
+                    }
+                },
+                "_source": ACTIVE_EVENTS_SOURCE_FIELDS,
+                "sort": [
+                    {"instance_id": "asc"},
+                    {"attribute": "asc"},
+                    {"version": "asc"},
+                ],
+                "size": ACTIVE_EVENTS_LOOKUP_PAGE_SIZE,
+                "track_total_hits": False,
+            }
+
+            routing = get_instance_routing(ids_chunk)
+            hits = elastic_client.search(
+                index=self._elastic_index, body=query, routing=routing
+            )["hits"]["hits"]
+            if len(hits) >= ACTIVE_EVENTS_LOOKUP_PAGE_SIZE:
+                hits = self._iter_active_event_pages(query, routing)
+
+            for doc in hits:
+                source = doc["_source"]
+                active_events[source["instance_id"]][source["attribute"]] = (
+                    ActiveEvent(
+                        doc_id=doc["_id"],
+                        version=source.get("version") or 0,
+                        new_value=source.get("new_value"),
+                        index=doc["_index"] if ES_ROLLOVER_ENABLED else None,
+                    )
+                )
+
+        return active_events
+
+    def _iter_active_event_pages(
+        self, query: dict[str, Any], routing: str | None
+    ) -> Iterator[dict]:
+        """Page through every hit of the query from a point in time. The
+        sort is not unique on its own, `_shard_doc` breaks the ties, so no
+        event is skipped or repeated between pages."""
+        pit_id = elastic_client.open_point_in_time(
+            index=self._elastic_index,
+            keep_alive=ACTIVE_EVENTS_LOOKUP_KEEP_ALIVE,
+            routing=routing,
+        )["id"]
+        query = {
+            **query,
+            "pit": {
+                "id": pit_id,
+                "keep_alive": ACTIVE_EVENTS_LOOKUP_KEEP_ALIVE,
+            },
+            "sort": [*query["sort"], "_shard_doc"],
+        }
+
+        try:
+            while True:
+                response = elastic_client.search(body=query)
+                hits = response["hits"]["hits"]
+                yield from hits
+
+                if len(hits) < ACTIVE_EVENTS_LOOKUP_PAGE_SIZE:
+                    break
+
+                query["pit"]["id"] = response.get("pit_id", query["pit"]["id"])
+                query["search_after"] = hits[-1]["sort"]
+
+        finally:
+            elastic_client.close_point_in_time(id=query["pit"]["id"])
+
+    def _create(
+        self,
+        instance: dict,
+        user_id: str,
+        session_id: str,
+        active_events: dict[int, dict[str, ActiveEvent]],
+    ) -> None:
         _EVENT = EventType.CREATED.value
         is_prm = self._instance_name == AvailableInventoryInstances.PRM.value
 
@@ -164,34 +434,57 @@ class InventoryEventProcessor:
             attribute="creation_date",
             use_now_if_missing=is_prm,
         )
+        routing = get_instance_routing([instance["id"]])
+        instance_fields = self._get_instance_fields(
+            instance=instance,
+            current_events=active_events.get(int(instance["id"])) or {},
+        )
 
         for attribute, value in instance.items():
             if attribute in self._stop_list_attributes:
                 continue
 
-            new_event = EventsBase(
+            new_event = EventRecord(
                 event_type=_EVENT,
                 new_value=value,
-                instance_id=instance["id"],
+                instance_id=int(instance["id"]),
                 user_id=user_id,
                 attribute=attribute,
                 version=1,
                 is_active=True,
                 valid_from=creation_date,
                 session_id=session_id,
-            ).dict()
+            ).to_document()
+            new_event.update(instance_fields)
 
+            new_id = generate_record_id(
+                instance_id=instance["id"],
+                attribute=attribute,
+                version=1,
+                event_type=_EVENT,
+            )
             self._bulk.add_index(
-                doc_id=generate_record_id(
-                    instance_id=instance["id"],
-                    attribute=attribute,
-                    version=1,
-                    event_type=_EVENT,
-                ),
+                doc_id=new_id,
                 document=new_event,
+                index=self._write_index,
+                routing=routing,
+                key=int(instance["id"]),
             )
 
-    def _update(self, instance: dict, user_id: str, session_id: str) -> None:
+            active_events[int(instance["id"])][attribute] = ActiveEvent(
+                doc_id=new_id,
+                version=1,
+                new_value=value,
+                index=self._write_index,
+            )
+
+    def _update(
+        self,
+        instance: dict,
+        user_id: str,
+        session_id: str,
+        active_events: dict[int, dict[str, ActiveEvent]],
+    ) -> None:
         _EVENT = EventType.UPDATED.value
         is_prm = self._instance_name == AvailableInventoryInstances.PRM.value
 
@@ -208,91 +501,78 @@ class InventoryEventProcessor:
         attributes_to_update = remove_items_from_dict_by_list(
             instance=instance, keys_to_remove=self._stop_list_attributes
         )
+        current_events = active_events[int(instance["id"])]
+        routing = get_instance_routing([instance["id"]])
+        instance_fields = self._get_instance_fields(
+            instance=instance, current_events=current_events
+        )
 
-        query = {
-            "query": {
-                "bool": {
-                    "filter": [
-                        {"term": {"instance_id": instance["id"]}},
-                        {"term": {"is_active": True}},
-                        {
-                            "terms": {
-                                "attribute": list(attributes_to_update.keys())
-                            }
-                        },
-                    ]
-                }
-            }
-        }
-        response = elastic_client.search(index=self._elastic_index, body=query)
-        current_events_by_id: dict[str, dict] = {
-            doc["_id"]: doc["_source"] for doc in response["hits"]["hits"]
-        }
-
-        processed_attributes: set[str] = set()
-
-        for doc_id, old_attr in current_events_by_id.items():
-            attribute = old_attr["attribute"]
-            processed_attributes.add(attribute)
-
-            new_val = attributes_to_update[attribute]
-            if compare_values_equal(old_attr["new_value"], new_val):
-                continue
-
-            old_attr["valid_to"] = modification_date
-            old_attr["is_active"] = False
-            self._bulk.add_update(doc_id=doc_id, document=old_attr)
-
-            next_version = (old_attr.get("version") or 0) + 1
+        for attribute, new_val in attributes_to_update.items():
+            old_event = current_events.get(attribute)
+
+            if old_event is None:
+                next_version = 1
+                old_value = None
+
+            else:
+                if compare_values_equal(old_event.new_value, new_val):
+                    continue
+
+                self._bulk.add_update(
+                    doc_id=old_event.doc_id,
+                    index=old_event.index,
+                    document={
+                        "valid_to": modification_date,
+                        "is_active": False,
+                    },
+                    routing=routing,
+                    key=int(instance["id"]),
+                )
+                next_version = old_event.version + 1
+                old_value = old_event.new_value
 
-            event_to_update = EventsBase(
+            event_to_update = EventRecord(
                 event_type=_EVENT,
                 new_value=new_val,
-                old_value=old_attr["new_value"],
-                instance_id=instance["id"],
+                old_value=old_value,
+                instance_id=int(instance["id"]),
                 user_id=user_id,
                 attribute=attribute,
                 version=next_version,
                 is_active=True,
                 valid_from=modification_date,
                 session_id=session_id,
-            ).dict()
-
-            self._bulk.add_index(
-                doc_id=generate_record_id(
-                    instance_id=instance["id"],
-                    attribute=attribute,
-                    version=next_version,
-                    event_type=_EVENT,
-                ),
-                document=event_to_update,
-            )
-
-        attributes_to_create = set(attributes_to_update.keys()).difference(
-            processed_attributes
-        )
-        for attribute in attributes_to_create:
-            new_event = EventsBase(
-                event_type=_EVENT,
-                new_value=attributes_to_update[attribute],
-                instance_id=instance["id"],
-                user_id=user_id,
-                attribute=attribute,
-                version=1,
-                is_active=True,
-                valid_from=modification_date,
-                session_id=session_id,
-            ).dict()
+            ).to_document()
+            event_to_update.update(instance_fields)
 
             new_id = generate_record_id(
                 instance_id=instance["id"],
                 attribute=attribute,
-                version=1,
+                version=next_version,
                 event_type=_EVENT,
             )
-            self._bulk.add_index(doc_id=new_id, document=new_event)
+            self._bulk.add_index(
+                doc_id=new_id,
+                document=event_to_update,
+                index=self._write_index,
+                routing=routing,
+                key=int(instance["id"]),
+            )
 
-    def _delete(self, instance: dict, user_id: str, session_id: str) -> None:
+            current_events[attribute] = ActiveEvent(
+                doc_id=new_id,
+                version=next_version,
+                new_value=new_val,
+                index=self._write_index,
+            )
+
+    def _delete(
+        self,
+        instance: dict,
+        user_id: str,
+        session_id: str,
+        active_events: dict[int, dict[str, ActiveEvent]],
+    ) -> None:
         _EVENT = EventType.DELETED.value
 
         modification_date = format_recording_datetime(
@@ -302,48 +582,81 @@ class InventoryEventProcessor:
             use_now_if_missing=False,
         )
 
-        query = {
-            "query": {
-                "bool": {
-                    "filter": [
-                        {"term": {"instance_id": instance["id"]}},
-                        {"term": {"is_active": True}},
-                    ]
-                }
-            }
-        }
-        response = elastic_client.search(index=self._elastic_index, body=query)
-        attributes_to_update: dict[str, dict] = {
-            doc["_id"]: doc["_source"] for doc in response["hits"]["hits"]
-        }
+        current_events = active_events.pop(int(instance["id"]), {})
+        routing = get_instance_routing([instance["id"]])
+        instance_fields = self._get_instance_fields(
+            instance=instance, current_events=current_events
+        )
 
-        for doc_id, old_event in attributes_to_update.items():
-            next_version = (old_event.get("version") or 0) + 1
+        for attribute, old_event in current_events.items():
+            next_version = old_event.version + 1
 
-            event_to_delete = EventsBase(
+            event_to_delete = EventRecord(
                 event_type=_EVENT,
-                old_value=old_event["new_value"],
-                instance_id=instance["id"],
+                old_value=old_event.new_value,
+                instance_id=int(instance["id"]),
                 user_id=user_id,
-                attribute=old_event["attribute"],
+                attribute=attribute,
                 version=next_version,
                 valid_from=modification_date,
                 session_id=session_id,
-            ).dict()
+            ).to_document()
+            event_to_delete.update(instance_fields)
 
             self._bulk.add_index(
                 doc_id=generate_record_id(
                     instance_id=instance["id"],
-                    attribute=old_event["attribute"],
+                    attribute=attribute,
                     version=next_version,
                     event_type=_EVENT,
                 ),
                 document=event_to_delete,
+                index=self._write_index,
+                routing=routing,
+                key=int(instance["id"]),
+            )
+
+            self._bulk.add_update(
+                doc_id=old_event.doc_id,
+                index=old_event.index,
+                document={"valid_to": modification_date, "is_active": False},
+                routing=routing,
+                key=int(instance["id"]),
             )
 
-            old_event["valid_to"] = modification_date
-            old_event["is_active"] = False
-            self._bulk.add_update(doc_id=doc_id, document=old_event)
+    def _forget_active_events(self, instance_ids: set[int]) -> None:
+        """Delete the state docs of instances some writes of which failed,
+        their active events are looked up in the event index again."""
+        if self._state_index is None:
+            return
+
+        logger.warning(
+            "Writes of %s instances failed, dropping their state from %s",
+            len(instance_ids),
+            self._state_index,
+        )
+        for instance_id in sorted(instance_ids):
+            self._bulk.add_delete(
+                index=self._state_index,
+                doc_id=str(instance_id),
+                key=instance_id,
+            )
+        self._bulk.flush()
+
+        failed_ids = self._bulk.pop_failed_keys()
+        if failed_ids:
+            logger.error(
+                "Unable to drop the state of instances %s from %s",
+                sorted(failed_ids),
+                self._state_index,
+            )
+
+    @staticmethod
+    def _clear_caches() -> None:
+        # cached events may be ahead of what was actually written
+        active_events_cache.clear()
+        parameter_type_cache.clear()
+        linked_value_cache.clear()
 
     def process(
         self,
@@ -354,38 +667,89 @@ class InventoryEventProcessor:
         instance_type: AvailableInventoryInstances | str,
     ) -> None:
         event_type = format_event_type(event_type)
+        instance_name = get_value_from_enum(instance_type)
 
-        for instance in instances:
-            if not self.check_required_attributes(
-                instance=instance,
-                instance_name=get_value_from_enum(instance_type),
-            ):
-                continue
+        match event_type:
+            case EventType.CREATED.value:
+                handler = self._create
 
-            request = dict(
-                instance=instance, user_id=user_id, session_id=session_id
-            )
+            case EventType.UPDATED.value:
+                handler = self._update
+
+            case EventType.DELETED.value:
+                handler = self._delete
+
+            case _:
+                raise NotImplementedEventType(
+                    f"Unsupported event type: {event_type}"
+                )
 
-            match event_type:
-                case EventType.CREATED.value:
-                    self._create(**request)
+        if ES_ROLLOVER_ENABLED:
+            self._write_index = write_index_resolver.resolve(
+                self._elastic_index
+            )
 
-                case EventType.UPDATED.value:
-                    self._update(**request)
+        valid_instances = (
+            instance
+            for instance in instances
+            if self.check_required_attributes(
+                instance=instance, instance_name=instance_name
+            )
+        )
 
-                case EventType.DELETED.value:
-                    self._delete(**request)
+        try:
+            for chunk in split_into_chunks(
+                valid_instances, ACTIVE_EVENTS_LOOKUP_CHUNK_SIZE
+            ):
+                active_events: dict[int, dict[str, ActiveEvent]] = defaultdict(
+                    dict
+                )
+                if event_type != EventType.CREATED.value:
+                    active_events = self._get_active_events(
+                        instance_ids=list(
+                            {int(instance["id"]) for instance in chunk}
+                        )
+                    )
 
-                case _:
-                    raise NotImplementedEventType(
-                        f"Unsupported event type: {event_type}"
+                if (
+                    instance_name == AvailableInventoryInstances.PRM.value
+                    and event_type != EventType.DELETED.value
+                ):
+                    self._converter.prefetch(instances=chunk)
+
+                for instance in chunk:
+                    handler(
+                        instance=instance,
+                        user_id=user_id,
+                        session_id=session_id,
+                        active_events=active_events,
+                    )
+                    self._store_active_events(
+                        instance_id=int(instance["id"]),
+                        active_events=active_events,
                     )
 
-        self._bulk.flush()
+            self._bulk.flush()
+
+        except Exception:
+            self._bulk.abort()
+            self._clear_caches()
+            raise
+
+        failed_ids = self._bulk.pop_failed_keys()
+        if failed_ids:
+            self._clear_caches()
+            self._forget_active_events(failed_ids)
+
+        logger.debug("Bulk writer: %s", self._bulk.metrics.as_dict())
+        if active_events_cache.enabled:
+            logger.debug("Active events cache: %s", active_events_cache.stats())
 
 
 class ObjectTypeEventProcessor(InventoryEventProcessor):
-    def __init__(self, batch_size: int = INSTANCES_BATCH_SIZE) -> None:
+    def __init__(
+        self, batch_size: int = INSTANCES_BATCH_SIZE, **kwargs
+    ) -> None:
         super().__init__(
             stop_list_attributes={
                 "id",
@@ -395,11 +759,14 @@ class ObjectTypeEventProcessor(InventoryEventProcessor):
             },
             instance_name=AvailableInventoryInstances.TMO.value,
             batch_size=batch_size,
+            **kwargs,
         )
 
 
 class ObjectEventProcessor(InventoryEventProcessor):
-    def __init__(self, batch_size: int = INSTANCES_BATCH_SIZE) -> None:
+    def __init__(
+        self, batch_size: int = INSTANCES_BATCH_SIZE, **kwargs
+    ) -> None:
         super().__init__(
             stop_list_attributes={
                 "id",
@@ -409,11 +776,14 @@ class ObjectEventProcessor(InventoryEventProcessor):
             },
             instance_name=AvailableInventoryInstances.MO.value,
             batch_size=batch_size,
+            **kwargs,
         )
 
 
 class ParameterTypeEventProcessor(InventoryEventProcessor):
-    def __init__(self, batch_size: int = INSTANCES_BATCH_SIZE) -> None:
+    def __init__(
+        self, batch_size: int = INSTANCES_BATCH_SIZE, **kwargs
+    ) -> None:
         super().__init__(
             stop_list_attributes={
                 "id",
@@ -423,13 +793,30 @@ class ParameterTypeEventProcessor(InventoryEventProcessor):
             },
             instance_name=AvailableInventoryInstances.TPRM.value,
             batch_size=batch_size,
+            **kwargs,
         )
 
 
 class ParameterEventProcessor(InventoryEventProcessor):
-    def __init__(self, batch_size: int = INSTANCES_BATCH_SIZE) -> None:
+    def __init__(
+        self, batch_size: int = INSTANCES_BATCH_SIZE, **kwargs
+    ) -> None:
         super().__init__(
             stop_list_attributes={"id"},
             instance_name=AvailableInventoryInstances.PRM.value,
             batch_size=batch_size,
+            **kwargs,
         )
+
+    def _get_instance_fields(
+        self, instance: dict, current_events: dict[str, ActiveEvent]
+    ) -> dict[str, Any]:
+        # a delete or a partial update may come without the parent ids
+        fields = {}
+        for attribute in PARAMETER_PARENT_FIELDS:
+            value = instance.get(attribute)
+            if value is None and attribute in current_events:
+                value = current_events[attribute].new_value
+            if value is not None:
+                fields[attribute] = int(value)
+        return fields
@@ -0,0 +1,74 @@
+from typing import Any
+
+from services.event_processor.inventory_processor.typed_values import (
+    build_typed_value_fields,
+)
+
+
+class EventRecord:
+    """Event document of the ingestion hot path.
+
+    Has the fields of EventsBase but skips pydantic validation: the values
+    come from instances that already passed the required attributes check
+    and from the processor itself. The document also gets the typed copies
+    of the values that are indexed for filters.
+    """
+
+    __slots__ = (
+        "event_type",
+        "old_value",
+        "new_value",
+        "user_id",
+        "session_id",
+        "instance_id",
+        "attribute",
+        "version",
+        "valid_to",
+        "is_active",
+        "valid_from",
+    )
+
+    def __init__(
+        self,
+        *,
+        event_type: str,
+        instance_id: int,
+        attribute: str,
+        version: int,
+        valid_from: str,
+        old_value: Any = None,
+        new_value: Any = None,
+        user_id: str | None = None,
+        session_id: str | None = None,
+        valid_to: str | None = None,
+        is_active: bool = True,
+    ) -> None:
+        self.event_type = event_type
+        self.old_value = old_value
+        self.new_value = new_value
+        self.user_id = user_id
+        self.session_id = session_id
+        self.instance_id = instance_id
+        self.attribute = attribute
+        self.version = version
+        self.valid_to = valid_to
+        self.is_active = is_active
+        self.valid_from = valid_from
+
+    def to_document(self) -> dict:
+        document = {
+            "event_type": self.event_type,
+            "old_value": self.old_value,
+            "new_value": self.new_value,
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "instance_id": self.instance_id,
+            "attribute": self.attribute,
+            "version": self.version,
+            "valid_to": self.valid_to,
+            "is_active": self.is_active,
+            "valid_from": self.valid_from,
+        }
+        document.update(build_typed_value_fields("old_value", self.old_value))
+        document.update(build_typed_value_fields("new_value", self.new_value))
+        return document
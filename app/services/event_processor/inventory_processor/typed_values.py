@@ -0,0 +1,96 @@
+import math
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+# suffix -> mapping of the typed copies of old_value and new_value
+TYPED_VALUE_MAPPINGS = {
+    "num": {"type": "double"},
+    "str": {"type": "keyword", "ignore_above": 8191},
+    "bool": {"type": "boolean"},
+    "dt": {"type": "date", "ignore_malformed": True},
+    "len": {"type": "long"},
+}
+VALUE_ATTRIBUTES = ("old_value", "new_value")
+TYPED_VALUE_FIELDS = [
+    f"{attribute}_{suffix}"
+    for attribute in VALUE_ATTRIBUTES
+    for suffix in TYPED_VALUE_MAPPINGS
+]
+
+# epoch millis are stored as a long
+_MAX_EPOCH_MILLIS = 2**63 - 1
+
+_FIELD_NAMES = {
+    attribute: {
+        suffix: f"{attribute}_{suffix}" for suffix in TYPED_VALUE_MAPPINGS
+    }
+    for attribute in VALUE_ATTRIBUTES
+}
+
+
+def _parse_date_time(value: str) -> int | None:
+    # like Instant.parse, only "YYYY-MM-DDThh:mm..." with an offset is a date
+    if len(value) < 16 or value[4] != "-" or value[10] != "T":
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+    if parsed.tzinfo is None:
+        return None
+
+    return int(parsed.timestamp() * 1000)
+
+
+def _scalar_fields(names: dict[str, str], value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {names["bool"]: value}
+
+    if isinstance(value, str):
+        millis = _parse_date_time(value)
+        if millis is None:
+            return {names["str"]: value}
+        return {names["str"]: value, names["dt"]: millis}
+
+    if isinstance(value, (int, float, Decimal)):
+        try:
+            number = float(value)
+        except OverflowError:
+            return {}
+        # NaN and infinities are kept only in the value itself
+        if not math.isfinite(number):
+            return {}
+
+        fields: dict[str, Any] = {names["num"]: number}
+        millis = int(value)
+        # numbers are also epoch millis for date filters
+        if -_MAX_EPOCH_MILLIS <= millis <= _MAX_EPOCH_MILLIS:
+            fields[names["dt"]] = millis
+        return fields
+
+    return {}
+
+
+def build_typed_value_fields(attribute: str, value: Any) -> dict[str, Any]:
+    """Typed copies of an event value indexed for filters and sorting:
+    numbers, strings, booleans and ISO-8601 date times with an offset, taken
+    from the value or from the items of a list value, and the length of a
+    list value."""
+    if value is None:
+        return {}
+
+    names = _FIELD_NAMES[attribute]
+    if not isinstance(value, list):
+        return _scalar_fields(names, value)
+
+    fields: dict[str, Any] = {names["len"]: len(value)}
+    for item in value:
+        if item is None or isinstance(item, list):
+            continue
+        for name, typed in _scalar_fields(names, item).items():
+            fields.setdefault(name, []).append(typed)
+
+    return fields
@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
-from typing import Any
+from itertools import islice
+from typing import Any, Iterable, Iterator
 
 from common.constants import EventType
 from services.event_processor.inventory_processor.constants import (
@@ -87,3 +88,9 @@ def compare_values_equal(a: Any, b: Any) -> bool:
         return a == b
 
     return str(a) == str(b)
+
+
+def split_into_chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, NamedTuple
+
+from common.constants import InventoryChangesIndexes
+from services.converter_service.cache import (
+    ParameterTypeMetadata,
+    linked_value_cache,
+    parameter_type_cache,
+)
+from services.elastic_service.backpressure import (
+    BulkSample,
+    elastic_backpressure,
+)
+
+logger = logging.getLogger(__name__)
+
+_PROCESS_CHANGES = "process_changes"
+_UPDATE_CACHES = "update_caches"
+# instances whose values other workers cache, see LINKED_VALUE_ATTRIBUTES
+_LINKED_VALUE_INSTANCES = ("MO", "PRM")
+
+
+class IngestionExecutor:
+    """Runs blocking ingestion work outside the asyncio event loop.
+
+    Work is executed by a dedicated pool so it never competes with the
+    default executor used for Kafka polling. Callers await the result, so
+    a consumer never has more messages in flight than the pool has workers.
+    """
+
+    def __init__(self, max_workers: int = 1, name: str = "ingestion"):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+
+    async def run(self, function: Callable[..., Any], /, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(function, **kwargs)
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class IngestionWorkerError(Exception):
+    pass
+
+
+class CacheUpdate(NamedTuple):
+    """Cache entries of instances written by a worker, sent to the other
+    workers. Their indexes may not be refreshed yet, so the entries are
+    taken from the caches of the writing worker instead of being read
+    again. Instances without an entry are dropped from the caches."""
+
+    parameter_types: dict[int, ParameterTypeMetadata | None]
+    linked_value_index: str | None
+    linked_values: dict[int, Any]
+    unknown_linked_values: tuple[int, ...]
+
+
+class WorkerResult(NamedTuple):
+    task_id: int
+    worker_id: int
+    instances_count: int
+    duration: float
+    error: str | None = None
+    bulk_samples: tuple[BulkSample, ...] = ()
+    cache_update: CacheUpdate | None = None
+
+
+@dataclass
+class WorkerMetrics:
+    tasks: int = 0
+    instances: int = 0
+    failures: int = 0
+    busy_seconds: float = 0.0
+    restarts: int = 0
+
+
+def _get_instance_ids(changes: Any) -> set[int]:
+    instance_ids = set()
+    for instance in changes.instances:
+        try:
+            instance_ids.add(int(instance["id"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return instance_ids
+
+
+def _get_cache_update(
+    changes: Any, invalidate: bool = False
+) -> CacheUpdate | None:
+    """Cache entries of the written instances, or only their removal when
+    `invalidate` is set, e.g. after the changes failed."""
+    instance_ids = _get_instance_ids(changes)
+    if changes.instance_type == "TPRM":
+        found = {}
+        if not invalidate:
+            found, _ = parameter_type_cache.get_many(instance_ids)
+        return CacheUpdate(
+            parameter_types={
+                parameter_type_id: found.get(parameter_type_id)
+                for parameter_type_id in instance_ids
+            },
+            linked_value_index=None,
+            linked_values={},
+            unknown_linked_values=(),
+        )
+
+    if changes.instance_type in _LINKED_VALUE_INSTANCES:
+        index = InventoryChangesIndexes[changes.instance_type].value
+        found = {}
+        if not invalidate:
+            found, _ = linked_value_cache.get_many(index, instance_ids)
+        return CacheUpdate(
+            parameter_types={},
+            linked_value_index=index,
+            linked_values=found,
+            unknown_linked_values=tuple(instance_ids.difference(found)),
+        )
+
+    return None
+
+
+def _apply_cache_update(update: CacheUpdate) -> None:
+    for parameter_type_id, metadata in update.parameter_types.items():
+        if metadata is None:
+            parameter_type_cache.invalidate(parameter_type_id)
+        else:
+            parameter_type_cache.set(parameter_type_id, metadata)
+
+    if update.linked_value_index is None:
+        return
+
+    linked_value_cache.set_many(update.linked_value_index, update.linked_values)
+    for instance_id in update.unknown_linked_values:
+        linked_value_cache.invalidate(update.linked_value_index, instance_id)
+
+
+def _run_worker(
+    worker_id: int,
+    tasks: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    handler: Callable[[Any], None],
+) -> None:
+    logging.basicConfig(level=logging.INFO)
+    elastic_backpressure.collect_samples()
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        task_id, kind, payload = task
+        started = time.monotonic()
+        error = None
+        instances_count = 0
+        cache_update = None
+        try:
+            if kind == _UPDATE_CACHES:
+                _apply_cache_update(payload)
+            else:
+                changes, handler_options = payload
+                instances_count = len(changes.instances)
+                handler(changes, **handler_options)
+                cache_update = _get_cache_update(changes)
+
+        except Exception as e:
+            logger.exception("Ingestion worker %s failed", worker_id)
+            error = f"{type(e).__name__}: {e}"
+
+        results.put(
+            WorkerResult(
+                task_id=task_id,
+                worker_id=worker_id,
+                instances_count=instances_count,
+                duration=time.monotonic() - started,
+                error=error,
+                bulk_samples=tuple(elastic_backpressure.take_samples()),
+                cache_update=cache_update,
+            )
+        )
+
+
+class PartitionedIngestionPool:
+    """Processes changes in worker processes partitioned by instance id.
+
+    Every instance id is always handled by the same worker and each worker
+    processes its queue in order, so version chains of an instance are
+    built in the order of the messages while different instances are
+    processed on all cores.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        handler: Callable[[Any], None],
+        name: str = "ingestion",
+        metrics_interval: float = 60.0,
+    ):
+        self._name = name
+        self._handler = handler
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._tasks = [self._context.Queue() for _ in range(workers)]
+        self._processes: list[multiprocessing.Process | None] = [None] * workers
+        self._metrics = [WorkerMetrics() for _ in range(workers)]
+        self._metrics_interval = metrics_interval
+        self._pending: dict[int, tuple[asyncio.Future, int]] = {}
+        self._pending_lock = threading.Lock()
+        self._task_ids = itertools.count()
+
+        for worker_id in range(workers):
+            self._start_worker(worker_id)
+
+        threading.Thread(
+            target=self._collect_results,
+            name=f"{name}-results",
+            daemon=True,
+        ).start()
+
+    @property
+    def workers(self) -> int:
+        return len(self._tasks)
+
+    def _start_worker(self, worker_id: int) -> None:
+        process = self._context.Process(
+            target=_run_worker,
+            args=(
+                worker_id,
+                self._tasks[worker_id],
+                self._results,
+                self._handler,
+            ),
+            name=f"{self._name}-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _submit(
+        self, worker_id: int, kind: str, payload: Any
+    ) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        task_id = next(self._task_ids)
+        with self._pending_lock:
+            self._pending[task_id] = (future, worker_id)
+
+        self._tasks[worker_id].put((task_id, kind, payload))
+        return future
+
+    def _resolve(
+        self, task_id: int, error: str | None, result: Any = None
+    ) -> None:
+        with self._pending_lock:
+            future, _ = self._pending.pop(task_id, (None, None))
+
+        if future is None:
+            return
+
+        def set_result():
+            if future.done():
+                return
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(IngestionWorkerError(error))
+
+        future.get_loop().call_soon_threadsafe(set_result)
+
+    def _fail_dead_workers(self) -> None:
+        for worker_id, process in enumerate(self._processes):
+            if process is None or process.is_alive():
+                continue
+
+            logger.error(
+                "Ingestion worker %s exited with code %s, restarting",
+                worker_id,
+                process.exitcode,
+            )
+            with self._pending_lock:
+                lost = [
+                    task_id
+                    for task_id, (_, pending_worker_id) in self._pending.items()
+                    if pending_worker_id == worker_id
+                ]
+            for task_id in lost:
+                self._resolve(task_id, error="Ingestion worker exited")
+
+            self._metrics[worker_id].restarts += 1
+            self._start_worker(worker_id)
+
+    def _collect_results(self) -> None:
+        last_report = time.monotonic()
+        while True:
+            try:
+                result: WorkerResult = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._fail_dead_workers()
+            else:
+                metrics = self._metrics[result.worker_id]
+                metrics.tasks += 1
+                metrics.instances += result.instances_count
+                metrics.busy_seconds += result.duration
+                if result.error is not None:
+                    metrics.failures += 1
+                # pausing the consumer is decided in this process
+                for sample in result.bulk_samples:
+                    elastic_backpressure.record(*sample)
+                self._resolve(
+                    result.task_id,
+                    error=result.error,
+                    result=result.cache_update,
+                )
+
+            if time.monotonic() - last_report >= self._metrics_interval:
+                last_report = time.monotonic()
+                logger.info("%s workers: %s", self._name, self.metrics())
+
+    def metrics(self) -> dict[int, dict[str, Any]]:
+        return {
+            worker_id: asdict(metrics)
+            for worker_id, metrics in enumerate(self._metrics)
+        }
+
+    def _partition(self, changes: Any) -> dict[int, list[dict]]:
+        partitions: dict[int, list[dict]] = defaultdict(list)
+        for instance in changes.instances:
+            try:
+                worker_id = int(instance["id"]) % self.workers
+            except (KeyError, TypeError, ValueError):
+                worker_id = 0
+            partitions[worker_id].append(instance)
+
+        return partitions
+
+    async def process(self, changes: Any, **handler_options) -> None:
+        partitions = {
+            worker_id: changes._replace(instances=part)
+            for worker_id, part in self._partition(changes).items()
+        }
+        results = await asyncio.gather(
+            *[
+                self._submit(
+                    worker_id, _PROCESS_CHANGES, (part, handler_options)
+                )
+                for worker_id, part in partitions.items()
+            ],
+            return_exceptions=True,
+        )
+
+        # the writing worker has updated its caches, the others convert
+        # PRMs with the same entries
+        updates = []
+        for (owner_id, part), result in zip(partitions.items(), results):
+            if isinstance(result, Exception):
+                result = _get_cache_update(part, invalidate=True)
+            if result is not None:
+                updates.append((owner_id, result))
+
+        if updates:
+            await asyncio.gather(
+                *[
+                    self._submit(worker_id, _UPDATE_CACHES, update)
+                    for owner_id, update in updates
+                    for worker_id in range(self.workers)
+                    if worker_id != owner_id
+                ],
+                return_exceptions=True,
+            )
+
+        errors = [
+            str(result) for result in results if isinstance(result, Exception)
+        ]
+        if errors:
+            raise IngestionWorkerError("; ".join(errors))
+
+    def shutdown(self) -> None:
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join()
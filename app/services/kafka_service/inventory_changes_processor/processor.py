@@ -1,5 +1,12 @@
+import asyncio
+import functools
+import itertools
 import json
+import logging
+import time
+from typing import Iterable, NamedTuple
 
+from confluent_kafka import TopicPartition
 from resistant_kafka_avataa import (
     ConsumerInitializer,
     ConsumerConfig,
@@ -7,36 +14,151 @@ from resistant_kafka_avataa import (
 )
 from resistant_kafka_avataa.message_desirializers import MessageDeserializer
 
+from common.constants import EventType, InventoryChangesIndexes
 from common.exceptions import NotAvailableInstanceType
+from config.elastic_config import ES_BACKPRESSURE_PAUSE_SECONDS
+from config.kafka_config import KAFKA_PROTOBUF_FAST_PATH
+from services.elastic_service.backpressure import (
+    elastic_backpressure,
+    elasticsearch_is_available,
+)
+from services.elastic_service.elastic_client import elastic_client
 from services.event_processor.inventory_processor.processor import (
     ParameterEventProcessor,
     ObjectTypeEventProcessor,
     ParameterTypeEventProcessor,
     ObjectEventProcessor,
 )
+from services.kafka_service.ingestion_executor import (
+    IngestionExecutor,
+    PartitionedIngestionPool,
+)
+from services.kafka_service.inventory_changes_processor.protobuf_reader import (
+    DELETED_EVENT_FIELDS,
+    read_inventory_instances,
+)
+
+logger = logging.getLogger(__name__)
+
+# pause before the next poll after a failed one, e.g. while the broker is
+# unavailable
+_BATCH_ERROR_PAUSE_SECONDS = 1.0
+
+# failed batches are consumed again, changes no adapter handles would fail
+# forever and are skipped instead
+_SUPPORTED_INSTANCE_TYPES = {"TMO", "MO", "TPRM", "PRM"}
+_SUPPORTED_EVENT_TYPES = {
+    EventType.CREATED.value,
+    EventType.UPDATED.value,
+    EventType.DELETED.value,
+}
+
+
+class InventoryChanges(NamedTuple):
+    instance_type: str
+    event_type: str
+    user_id: str | None
+    session_id: str | None
+    instances: Iterable[dict]
+
+    @property
+    def is_supported(self) -> bool:
+        return (
+            self.instance_type in _SUPPORTED_INSTANCE_TYPES
+            and self.event_type.upper() in _SUPPORTED_EVENT_TYPES
+        )
+
+    @property
+    def group_key(self) -> tuple:
+        return (
+            self.instance_type,
+            self.event_type,
+            self.user_id,
+            self.session_id,
+        )
+
+
+def _get_header(message_headers: dict, name: str) -> str | None:
+    value = message_headers.get(name)
+    return value.decode("utf-8") if value else None
+
+
+def parse_inventory_changes(
+    message, deserializers: MessageDeserializer
+) -> InventoryChanges:
+    """Read a protobuf message of the inventory changes topic."""
+    instance_type, event_type = message.key().decode("utf-8").split(":")
+    message_headers = dict(message.headers() or [])
+
+    if KAFKA_PROTOBUF_FAST_PATH:
+        instances = read_inventory_instances(
+            deserializers=deserializers,
+            message=message,
+            fields=DELETED_EVENT_FIELDS
+            if event_type.upper() == EventType.DELETED.value
+            else None,
+        )
+    else:
+        instances = deserializers.deserialize_to_dict(message=message)[
+            "objects"
+        ]
+
+    return InventoryChanges(
+        instance_type=instance_type,
+        event_type=event_type,
+        user_id=_get_header(message_headers, "user_id"),
+        session_id=_get_header(message_headers, "session_id"),
+        instances=instances,
+    )
+
+
+def parse_event_changes(message) -> InventoryChanges:
+    """Read a JSON message of the event migration topic."""
+    instance_type, event_type = message.key().decode("utf-8").split(":")
+    message_headers = dict(message.headers() or [])
+
+    return InventoryChanges(
+        instance_type=instance_type,
+        event_type=event_type,
+        user_id=_get_header(message_headers, "user_id"),
+        session_id=_get_header(message_headers, "session_id"),
+        instances=json.loads(message.value()),
+    )
 
 
 class InventoryChangesProcessor(ConsumerInitializer):
     def __init__(
-        self, config: ConsumerConfig, deserializers: MessageDeserializer
+        self,
+        config: ConsumerConfig,
+        deserializers: MessageDeserializer,
+        workers: int = 1,
     ):
         super().__init__(config=config, deserializers=deserializers)
         self._config = config
+        self._executor = IngestionExecutor(name="inventory-changes")
+        self._paused_at: float | None = None
+        self._worker_pool = None
+        if workers > 1:
+            self._worker_pool = PartitionedIngestionPool(
+                workers=workers,
+                handler=InventoryChangesProcessor._process_changes,
+                name="inventory-changes",
+            )
 
     @staticmethod
-    def _get_adapter_for_process(instance_type: str):
+    def _get_adapter_for_process(instance_type: str, **kwargs):
         match instance_type:
             case "TMO":
-                adapter = ObjectTypeEventProcessor()
+                adapter = ObjectTypeEventProcessor(**kwargs)
 
             case "MO":
-                adapter = ObjectEventProcessor()
+                adapter = ObjectEventProcessor(**kwargs)
 
             case "TPRM":
-                adapter = ParameterTypeEventProcessor()
+                adapter = ParameterTypeEventProcessor(**kwargs)
 
             case "PRM":
-                adapter = ParameterEventProcessor()
+                adapter = ParameterEventProcessor(**kwargs)
 
             case _:
                 raise NotAvailableInstanceType(
@@ -45,104 +167,298 @@ class InventoryChangesProcessor(ConsumerInitializer):
 
         return adapter
 
-    @staticmethod
-    def _get_user_id_from_message_headers(
-        message_headers: dict,
-    ) -> str | None:
-        user_id = message_headers.get("user_id")
-        return user_id.decode("utf-8") if user_id else None
+    def _parse_message(self, message) -> InventoryChanges:
+        return parse_inventory_changes(
+            message=message, deserializers=self._deserializers
+        )
 
     @staticmethod
-    def _get_session_id_from_message_headers(
-        message_headers: dict,
-    ) -> str | None:
-        session_id = message_headers.get("session_id")
-        return session_id.decode("utf-8") if session_id else None
+    def _process_changes(changes: InventoryChanges, **adapter_options) -> None:
+        adapter = InventoryChangesProcessor._get_adapter_for_process(
+            instance_type=changes.instance_type, **adapter_options
+        )
+        adapter.process(
+            instances=changes.instances,
+            event_type=changes.event_type,
+            user_id=changes.user_id,
+            session_id=changes.session_id,
+            instance_type=changes.instance_type,
+        )
 
-    @kafka_processor(store_error_messages=False)
-    async def process(self, message):
-        instance_type, event_type = message.key().decode("utf-8").split(":")
-        message_headers = dict(message.headers())
+    async def dispatch_changes(
+        self, changes: InventoryChanges, **adapter_options
+    ) -> None:
+        """Process the changes on the ingestion thread or workers of this
+        consumer, in turn with its own changes of the same instances."""
+        if self._worker_pool is not None:
+            await self._worker_pool.process(changes, **adapter_options)
+            return
 
-        user_id = self._get_user_id_from_message_headers(
-            message_headers=message_headers
-        )
-        session_id = self._get_session_id_from_message_headers(
-            message_headers=message_headers
+        await self._executor.run(
+            self._process_changes, changes=changes, **adapter_options
         )
 
-        instances = self._deserializers.deserialize_to_dict(message=message)[
-            "objects"
-        ]
+    async def _dispatch_changes(self, changes: InventoryChanges) -> None:
+        await self.dispatch_changes(changes)
 
-        adapter = self._get_adapter_for_process(instance_type=instance_type)
-        adapter.process(
-            instances=instances,
-            event_type=event_type,
-            user_id=user_id,
-            session_id=session_id,
-            instance_type=instance_type,
+    def _should_pause(self) -> bool:
+        return elastic_backpressure.overloaded
+
+    async def _apply_backpressure(self) -> None:
+        if self._paused_at is None:
+            if self._should_pause():
+                self._consumer.pause(self._consumer.assignment())
+                self._paused_at = time.monotonic()
+                logger.warning(
+                    "Elasticsearch is under load, pausing %s: %s",
+                    self._config.processor_name,
+                    elastic_backpressure.stats(),
+                )
+            return
+
+        # partitions assigned by a rebalance during the pause are not paused
+        self._consumer.pause(self._consumer.assignment())
+        if time.monotonic() - self._paused_at < ES_BACKPRESSURE_PAUSE_SECONDS:
+            return
+
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, elasticsearch_is_available):
+            self._paused_at = time.monotonic()
+            return
+
+        elastic_backpressure.relax()
+        self._consumer.resume(self._consumer.assignment())
+        self._paused_at = None
+        logger.info(
+            "Elasticsearch recovered, resuming %s", self._config.processor_name
         )
 
+    async def get_message(self, consumer):
+        # paused partitions return no messages, polling keeps the consumer
+        # in its group while Elasticsearch recovers
+        await self._apply_backpressure()
+        return await super().get_message(consumer)
+
+    @kafka_processor(store_error_messages=False)
+    async def process(self, message):
+        changes = await self._executor.run(self._parse_message, message=message)
+        await self._dispatch_changes(changes)
+
+
+class BatchingInventoryChangesProcessor(InventoryChangesProcessor):
+    """Accumulates messages up to `max_objects` objects or `max_wait_ms`
+    after the first message, then processes consecutive messages with the
+    same key and headers as one group and commits offsets afterwards.
+
+    A batch that fails is not committed, the consumer seeks back to its
+    first messages and consumes them again."""
 
-class EventChangesProcessor(ConsumerInitializer):
     def __init__(
-        self, config: ConsumerConfig, deserializers: MessageDeserializer
+        self,
+        config: ConsumerConfig,
+        deserializers: MessageDeserializer,
+        max_objects: int,
+        max_wait_ms: int,
+        workers: int = 1,
     ):
-        super().__init__(config=config, deserializers=deserializers)
-        self._config = config
+        super().__init__(
+            config=config, deserializers=deserializers, workers=workers
+        )
+        self._max_objects = max_objects
+        self._max_wait = max_wait_ms / 1000
+        # (topic, partition) -> offset of the first message of the batch
+        self._batch_offsets: dict[tuple[str, int], int] = {}
 
     @staticmethod
-    def _get_adapter_for_process(instance_type: str):
-        match instance_type:
-            case "TMO":
-                adapter = ObjectTypeEventProcessor()
+    def _group_changes(
+        batch: list[InventoryChanges],
+    ) -> list[list[InventoryChanges]]:
+        # only consecutive messages are merged to keep per-instance order
+        return [
+            list(group)
+            for _, group in itertools.groupby(
+                batch, key=lambda changes: changes.group_key
+            )
+        ]
 
-            case "MO":
-                adapter = ObjectEventProcessor()
+    async def _process_batch(self, batch: list[InventoryChanges]) -> None:
+        for group in self._group_changes(batch):
+            try:
+                await self._dispatch_changes(
+                    group[0]._replace(
+                        instances=[
+                            instance
+                            for changes in group
+                            for instance in changes.instances
+                        ]
+                    )
+                )
+            except Exception:
+                logger.exception(
+                    "Processing of %s messages as one group failed, "
+                    "processing them one by one",
+                    len(group),
+                )
+                for changes in group:
+                    try:
+                        await self._dispatch_changes(changes)
+                    except Exception:
+                        logger.error(
+                            "Processing of changes %s failed",
+                            changes.group_key,
+                        )
+                        raise
 
-            case "TPRM":
-                adapter = ParameterTypeEventProcessor()
+    async def process(self):
+        # unlike kafka_processor of the base class nothing catches errors
+        # above, an exception would end the consume loop
+        try:
+            await self._process_next_batch()
+        except Exception:
+            logger.exception(
+                "Batch of %s failed, consuming it again",
+                self._config.processor_name,
+            )
+            try:
+                self._rewind()
+            except Exception:
+                logger.exception("Unable to seek back to the failed batch")
+            await asyncio.sleep(_BATCH_ERROR_PAUSE_SECONDS)
 
-            case "PRM":
-                adapter = ParameterEventProcessor()
+    def _rewind(self) -> None:
+        """Seek the partitions back to the first message of the failed
+        batch, the next successful commit would skip the batch otherwise."""
+        assigned = {
+            (partition.topic, partition.partition)
+            for partition in self._consumer.assignment()
+        }
+        for (topic, partition), offset in self._batch_offsets.items():
+            if (topic, partition) in assigned:
+                self._consumer.seek(TopicPartition(topic, partition, offset))
+        self._batch_offsets = {}
 
-            case _:
-                raise NotAvailableInstanceType(
-                    f"Instance {instance_type} does not available"
+    async def _process_next_batch(self) -> None:
+        await self._apply_backpressure()
+        loop = asyncio.get_running_loop()
+        batch: list[InventoryChanges] = []
+        objects_count = 0
+        deadline = None
+        self._batch_offsets = {}
+
+        while objects_count < self._max_objects:
+            timeout = 1.0 if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            message = await loop.run_in_executor(
+                None, functools.partial(self._consumer.poll, timeout)
+            )
+            if message is None:
+                if deadline is None:
+                    return
+                continue
+
+            if deadline is None:
+                deadline = time.monotonic() + self._max_wait
+
+            if message.error():
+                continue
+
+            self._batch_offsets.setdefault(
+                (message.topic(), message.partition()), message.offset()
+            )
+            if message.key() is None:
+                continue
+
+            try:
+                changes = await self._executor.run(
+                    self._parse_message, message=message
+                )
+            except Exception:
+                logger.error(
+                    "Unable to parse message %s:%s:%s",
+                    message.topic(),
+                    message.partition(),
+                    message.offset(),
                 )
+                raise
 
-        return adapter
+            if not changes.is_supported:
+                logger.warning(
+                    "Skipping unsupported changes %s", changes.group_key
+                )
+                continue
 
-    @staticmethod
-    def _get_user_id_from_message_headers(
-        message_headers: dict,
-    ) -> str | None:
-        user_id = message_headers.get("user_id")
-        return user_id.decode("utf-8") if user_id else None
+            batch.append(changes)
+            objects_count += len(changes.instances)
 
-    @staticmethod
-    def _get_session_id_from_message_headers(
-        message_headers: dict,
-    ) -> str | None:
-        session_id = message_headers.get("session_id")
-        return session_id.decode("utf-8") if session_id else None
+        if batch:
+            await self._process_batch(batch)
 
-    @kafka_processor(store_error_messages=False)
-    async def process(self, message):
-        instance_type, event_type = message.key().decode("utf-8").split(":")
-        message_headers = dict(message.headers())
-        user_id = self._get_user_id_from_message_headers(
-            message_headers=message_headers
+        await loop.run_in_executor(
+            None, functools.partial(self._consumer.commit, asynchronous=False)
         )
-        session_id = self._get_session_id_from_message_headers(
-            message_headers=message_headers
+        self._batch_offsets = {}
+
+
+class EventChangesProcessor(BatchingInventoryChangesProcessor):
+    """Migration consumer of JSON lists of instances.
+
+    Runs with its own consumer group and batch sizes. It writes the same
+    event indexes and version chains as the inventory changes consumer, so
+    the changes are processed by the ingestion thread or workers of
+    `ingestion`: both never build the next version of an instance at the
+    same time. It gives way as soon as bulk requests get slower than the
+    target latency. With `refresh_after_batch` the written indexes are
+    refreshed before offsets are committed, so the next batch finds the
+    events of the previous one.
+    """
+
+    def __init__(
+        self,
+        config: ConsumerConfig,
+        deserializers: MessageDeserializer,
+        ingestion: InventoryChangesProcessor,
+        max_objects: int,
+        max_wait_ms: int,
+        bulk_batch_size: int,
+        bulk_in_flight: int,
+        refresh_after_batch: bool,
+    ):
+        super().__init__(
+            config=config,
+            deserializers=deserializers,
+            max_objects=max_objects,
+            max_wait_ms=max_wait_ms,
         )
-        instances = json.loads(message.value().decode("utf-8"))
-        adapter = self._get_adapter_for_process(instance_type=instance_type)
-        adapter.process(
-            instances=instances,
-            event_type=event_type,
-            user_id=user_id,
-            session_id=session_id,
+        self._executor = IngestionExecutor(name="event-changes")
+        self._ingestion = ingestion
+        self._bulk_batch_size = bulk_batch_size
+        self._bulk_in_flight = bulk_in_flight
+        self._refresh_after_batch = refresh_after_batch
+        self._written_indexes: set[str] = set()
+
+    def _parse_message(self, message) -> InventoryChanges:
+        return parse_event_changes(message)
+
+    def _should_pause(self) -> bool:
+        return elastic_backpressure.busy
+
+    async def _dispatch_changes(self, changes: InventoryChanges) -> None:
+        self._written_indexes.add(
+            InventoryChangesIndexes[changes.instance_type].value
+        )
+        await self._ingestion.dispatch_changes(
+            changes,
+            batch_size=self._bulk_batch_size,
+            bulk_in_flight=self._bulk_in_flight,
         )
+
+    def _refresh_written_indexes(self) -> None:
+        elastic_client.indices.refresh(index=",".join(self._written_indexes))
+        self._written_indexes.clear()
+
+    async def _process_batch(self, batch: list[InventoryChanges]) -> None:
+        await super()._process_batch(batch)
+        if self._refresh_after_batch and self._written_indexes:
+            await self._executor.run(self._refresh_written_indexes)
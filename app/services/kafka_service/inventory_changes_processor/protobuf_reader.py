@@ -0,0 +1,131 @@
+import base64
+import functools
+import math
+from typing import Any, Callable, Iterator
+
+from google.protobuf import json_format
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.message import Message
+from google.protobuf.timestamp_pb2 import Timestamp
+from resistant_kafka_avataa.message_desirializers import MessageDeserializer
+
+_SCHEMA_REGISTRY_VALUE_FLAG = 0
+_SCHEMA_REGISTRY_SERVICE_VALUES = 7
+
+_INT64_TYPES = {FieldDescriptor.CPPTYPE_INT64, FieldDescriptor.CPPTYPE_UINT64}
+_FLOAT_TYPES = {FieldDescriptor.CPPTYPE_FLOAT, FieldDescriptor.CPPTYPE_DOUBLE}
+
+# deletions only read the id, the required attributes and the dates
+DELETED_EVENT_FIELDS = frozenset(
+    {"id", "version", "value", "creation_date", "modification_date"}
+)
+
+
+def _float_to_json(value: float) -> float | str:
+    if math.isinf(value):
+        return "-Infinity" if value < 0 else "Infinity"
+    if math.isnan(value):
+        return "NaN"
+    return value
+
+
+def _message_to_json(value: Message) -> Any:
+    return json_format.MessageToDict(value, preserving_proto_field_name=True)
+
+
+def _build_value_converter(field: FieldDescriptor) -> Callable | None:
+    match field.cpp_type:
+        case FieldDescriptor.CPPTYPE_MESSAGE:
+            if field.message_type.full_name == Timestamp.DESCRIPTOR.full_name:
+                return Timestamp.ToJsonString
+            return _message_to_json
+
+        case FieldDescriptor.CPPTYPE_ENUM:
+            values = field.enum_type.values_by_number
+            return lambda value: (
+                values[value].name if value in values else value
+            )
+
+        case FieldDescriptor.CPPTYPE_STRING:
+            if field.type == FieldDescriptor.TYPE_BYTES:
+                return lambda value: base64.b64encode(value).decode("utf-8")
+
+        case cpp_type if cpp_type in _INT64_TYPES:
+            return str
+
+        case cpp_type if cpp_type in _FLOAT_TYPES:
+            return _float_to_json
+
+    return None
+
+
+def _build_field_converter(field: FieldDescriptor) -> Callable | None:
+    converter = _build_value_converter(field)
+    if field.label != FieldDescriptor.LABEL_REPEATED:
+        return converter
+
+    if converter is None:
+        return list
+    return lambda values: [converter(value) for value in values]
+
+
+@functools.cache
+def _get_field_converters(
+    descriptor: Descriptor,
+) -> dict[str, Callable | None]:
+    return {
+        field.name: _build_field_converter(field) for field in descriptor.fields
+    }
+
+
+def message_to_instance(
+    message: Message, fields: frozenset[str] | None = None
+) -> dict:
+    """Same result as MessageToDict with preserved field names, limited to
+    `fields` when they are given."""
+    converters = _get_field_converters(message.DESCRIPTOR)
+    instance = {}
+
+    for field, value in message.ListFields():
+        name = field.name
+        if fields is not None and name not in fields:
+            continue
+
+        converter = converters[name]
+        instance[name] = value if converter is None else converter(value)
+
+    return instance
+
+
+class ProtobufInstances:
+    """Lazy view over the repeated `objects` of an inventory list message,
+    converting each object to a dict only when it is iterated."""
+
+    def __init__(
+        self, message: Message, fields: frozenset[str] | None = None
+    ) -> None:
+        self._objects = message.objects
+        self._fields = fields
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def __iter__(self) -> Iterator[dict]:
+        for obj in self._objects:
+            yield message_to_instance(obj, fields=self._fields)
+
+
+def read_inventory_instances(
+    deserializers: MessageDeserializer,
+    message: Any,
+    fields: frozenset[str] | None = None,
+) -> ProtobufInstances:
+    key = "List" + message.key().decode("utf-8").split(":")[0]
+    proto_message = deserializers.proto_deserializers[key]()
+
+    message_value = message.value()
+    if message_value[0] == _SCHEMA_REGISTRY_VALUE_FLAG:
+        message_value = message_value[_SCHEMA_REGISTRY_SERVICE_VALUES:]
+
+    proto_message.ParseFromString(message_value)
+    return ProtobufInstances(message=proto_message, fields=fields)
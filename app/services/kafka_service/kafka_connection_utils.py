@@ -20,6 +20,22 @@ from config.kafka_config import (
     KAFKA_SECURED,
     KAFKA_SECURITY_PROTOCOL,
     KAFKA_SASL_MECHANISMS,
+    KAFKA_MICRO_BATCHING,
+    KAFKA_BATCH_MAX_OBJECTS,
+    KAFKA_BATCH_MAX_WAIT_MS,
+    KAFKA_INGESTION_WORKERS,
+    KAFKA_EVENT_CHANGES_TOPICS,
+    KAFKA_EVENT_CHANGES_TURN_ON,
+    KAFKA_EVENT_CHANGES_GROUP_ID,
+    KAFKA_EVENT_CHANGES_OFFSET,
+    KAFKA_EVENT_CHANGES_BATCH_MAX_OBJECTS,
+    KAFKA_EVENT_CHANGES_BATCH_MAX_WAIT_MS,
+    KAFKA_EVENT_CHANGES_BULK_BATCH_SIZE,
+    KAFKA_EVENT_CHANGES_BULK_IN_FLIGHT,
+    KAFKA_EVENT_CHANGES_REFRESH_AFTER_BATCH,
+)
+from services.elastic_service.elastic_client import (
+    create_basic_indexes_if_not_exists,
 )
 from services.grpc_service.proto_files.inventory_instances.files.inventory_instances_pb2 import (
     ListTMO,
@@ -29,6 +45,8 @@ from services.grpc_service.proto_files.inventory_instances.files.inventory_insta
 )
 from services.kafka_service.inventory_changes_processor.processor import (
     InventoryChangesProcessor,
+    BatchingInventoryChangesProcessor,
+    EventChangesProcessor,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -72,26 +90,33 @@ def get_token_for_kafka_by_keycloak(conf):
     raise TokenIsNotValid("Token verification service unavailable")
 
 
-def start_kafka_consumer():
-    inventory_changes_config = ConsumerConfig(
-        topic_to_subscribe=KAFKA_SUBSCRIBE_TOPICS,
-        processor_name="InventoryChangesProcessor",
+def create_consumer_config(
+    topic: str,
+    processor_name: str,
+    group_id: str = KAFKA_CONSUMER_GROUP_ID,
+    auto_offset_reset: str = KAFKA_CONSUMER_OFFSET,
+) -> ConsumerConfig:
+    config = ConsumerConfig(
+        topic_to_subscribe=topic,
+        processor_name=processor_name,
         bootstrap_servers=KAFKA_URL,
-        group_id=KAFKA_CONSUMER_GROUP_ID,
-        auto_offset_reset=KAFKA_CONSUMER_OFFSET,
+        group_id=group_id,
+        auto_offset_reset=auto_offset_reset,
         enable_auto_commit=False,
     )
 
     if KAFKA_SECURED:
-        inventory_changes_config.security_config = KafkaSecurityConfig(
+        config.security_config = KafkaSecurityConfig(
             oauth_cb=get_token_for_kafka_by_keycloak,
             security_protocol=KAFKA_SECURITY_PROTOCOL,
             sasl_mechanisms=KAFKA_SASL_MECHANISMS,
         )
 
-    inventory_changes_deserializers = MessageDeserializer(
-        topic=inventory_changes_config.topic_to_subscribe,
-    )
+    return config
+
+
+def create_inventory_changes_deserializers(topic: str) -> MessageDeserializer:
+    inventory_changes_deserializers = MessageDeserializer(topic=topic)
     inventory_changes_deserializers.register_protobuf_deserializer(
         message_type=ListTMO
     )
@@ -105,9 +130,80 @@ def start_kafka_consumer():
         message_type=ListPRM
     )
 
-    inventory_changes_processor = InventoryChangesProcessor(
+    return inventory_changes_deserializers
+
+
+def create_inventory_changes_processor() -> InventoryChangesProcessor:
+    inventory_changes_config = create_consumer_config(
+        topic=KAFKA_SUBSCRIBE_TOPICS,
+        processor_name="InventoryChangesProcessor",
+    )
+    inventory_changes_deserializers = create_inventory_changes_deserializers(
+        topic=inventory_changes_config.topic_to_subscribe
+    )
+
+    if KAFKA_MICRO_BATCHING:
+        return BatchingInventoryChangesProcessor(
+            config=inventory_changes_config,
+            deserializers=inventory_changes_deserializers,
+            max_objects=KAFKA_BATCH_MAX_OBJECTS,
+            max_wait_ms=KAFKA_BATCH_MAX_WAIT_MS,
+            workers=KAFKA_INGESTION_WORKERS,
+        )
+
+    return InventoryChangesProcessor(
         config=inventory_changes_config,
         deserializers=inventory_changes_deserializers,
+        workers=KAFKA_INGESTION_WORKERS,
     )
 
-    asyncio.create_task(process_kafka_connection([inventory_changes_processor]))
+
+def create_event_changes_processor(
+    ingestion: InventoryChangesProcessor,
+) -> EventChangesProcessor:
+    event_changes_config = create_consumer_config(
+        topic=KAFKA_EVENT_CHANGES_TOPICS,
+        processor_name="EventChangesProcessor",
+        group_id=KAFKA_EVENT_CHANGES_GROUP_ID,
+        auto_offset_reset=KAFKA_EVENT_CHANGES_OFFSET,
+    )
+
+    return EventChangesProcessor(
+        config=event_changes_config,
+        deserializers=MessageDeserializer(
+            topic=event_changes_config.topic_to_subscribe
+        ),
+        ingestion=ingestion,
+        max_objects=KAFKA_EVENT_CHANGES_BATCH_MAX_OBJECTS,
+        max_wait_ms=KAFKA_EVENT_CHANGES_BATCH_MAX_WAIT_MS,
+        bulk_batch_size=KAFKA_EVENT_CHANGES_BULK_BATCH_SIZE,
+        bulk_in_flight=KAFKA_EVENT_CHANGES_BULK_IN_FLIGHT,
+        refresh_after_batch=KAFKA_EVENT_CHANGES_REFRESH_AFTER_BATCH,
+    )
+
+
+def _create_consumer_connections() -> list:
+    # every processor polls in its own loop, a long migration batch must
+    # not hold back the next poll of the inventory changes
+    inventory_changes_processor = create_inventory_changes_processor()
+    connections = [process_kafka_connection([inventory_changes_processor])]
+    if KAFKA_EVENT_CHANGES_TURN_ON:
+        connections.append(
+            process_kafka_connection(
+                [create_event_changes_processor(inventory_changes_processor)]
+            )
+        )
+
+    return connections
+
+
+def start_kafka_consumer():
+    for connection in _create_consumer_connections():
+        asyncio.create_task(connection)
+
+
+async def run_kafka_consumer():
+    # without the API nothing else creates the indexes, bulk writes would
+    # create them with dynamic mappings
+    create_basic_indexes_if_not_exists()
+    await asyncio.gather(*_create_consumer_connections())
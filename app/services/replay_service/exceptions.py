@@ -0,0 +1,18 @@
+class ReplayException(Exception):
+    pass
+
+
+class LiveIndexIsNotAlias(ReplayException):
+    pass
+
+
+class ReplayTopicNotFound(ReplayException):
+    pass
+
+
+class PartialReplay(ReplayException):
+    pass
+
+
+class ReplayIsIncomplete(ReplayException):
+    pass
@@ -0,0 +1,607 @@
+"""Rebuild of the event indexes by replaying a Kafka topic.
+
+The topic is read from the given offsets or timestamp up to the end offsets
+at start, merging partitions by message timestamp, and processed by the
+usual event processors into fresh indexes. While they are written the
+indexes are not refreshed, have no replicas and don't fsync every request.
+Afterwards they get the serving settings back and the live names are
+switched to them with one alias update. With rollover the write alias is
+moved to the rebuilt index too and rolled over to a new backing index.
+
+The online consumer should be stopped while the aliases are switched, or
+restarted afterwards, as it keeps active events of the old indexes in its
+caches.
+
+The aliases are not switched when objects failed or bulk items went to the
+dead letter index, the rebuilt indexes are kept for inspection instead. A
+replay from a later offset or timestamp holds none of the earlier history,
+so it is only switched to with `allow_partial` and never deletes the old
+indexes.
+"""
+
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, NamedTuple
+
+from confluent_kafka import (
+    OFFSET_BEGINNING,
+    Consumer,
+    KafkaError,
+    KafkaException,
+    TopicPartition,
+)
+from resistant_kafka_avataa import ConsumerInitializer
+
+from common.constants import InventoryChangesIndexes, InventoryStateIndexes
+from config.elastic_config import ES_ROLLOVER_ENABLED, ES_STATE_INDEXES_ENABLED
+from config.kafka_config import (
+    KAFKA_CONSUMER_GROUP_ID,
+    KAFKA_EVENT_CHANGES_TOPICS,
+    KAFKA_SUBSCRIBE_TOPICS,
+)
+from services.converter_service.processor import ConvertParameterValues
+from services.elastic_service.aliases import (
+    get_alias_switch_actions,
+    get_write_alias_switch_actions,
+    roll_over_to_backing_index,
+)
+from services.elastic_service.elastic_client import (
+    BULK_LOAD_SETTINGS,
+    SERVING_SETTINGS,
+    elastic_client,
+    get_events_index_body,
+    get_state_index_body,
+)
+from services.event_processor.inventory_processor.bulk_writer import (
+    configure_bulk_parallelism,
+)
+from services.event_processor.inventory_processor.processor import (
+    InventoryEventProcessor,
+    ObjectEventProcessor,
+    ObjectTypeEventProcessor,
+    ParameterEventProcessor,
+    ParameterTypeEventProcessor,
+)
+from services.kafka_service.inventory_changes_processor.processor import (
+    InventoryChanges,
+    parse_event_changes,
+    parse_inventory_changes,
+)
+from services.kafka_service.kafka_connection_utils import (
+    create_consumer_config,
+    create_inventory_changes_deserializers,
+)
+from services.replay_service.exceptions import (
+    LiveIndexIsNotAlias,
+    PartialReplay,
+    ReplayIsIncomplete,
+    ReplayTopicNotFound,
+)
+
+logger = logging.getLogger(__name__)
+
+REPLAY_SOURCE_TOPICS = {
+    "inventory": KAFKA_SUBSCRIBE_TOPICS,
+    "migrate": KAFKA_EVENT_CHANGES_TOPICS,
+}
+REPLAY_INSTANCES = ("TMO", "MO", "TPRM", "PRM")
+
+_PROCESSORS: dict[str, type[InventoryEventProcessor]] = {
+    "TMO": ObjectTypeEventProcessor,
+    "MO": ObjectEventProcessor,
+    "TPRM": ParameterTypeEventProcessor,
+    "PRM": ParameterEventProcessor,
+}
+
+# messages buffered per partition before fetching it is paused
+_PARTITION_BUFFER_SIZE = 1000
+_KAFKA_TIMEOUT = 30
+_PROGRESS_INTERVAL = 30
+
+
+class ReplayTarget(NamedTuple):
+    alias: str
+    index: str
+
+
+@dataclass
+class ReplayStats:
+    messages: int = 0
+    skipped_messages: int = 0
+    objects: int = 0
+    failed_objects: int = 0
+    dead_letters: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ReplayParameterConverter(ConvertParameterValues):
+    """Reads parameter types and linked values from the rebuilt indexes.
+    They are not refreshed during the replay, so they are refreshed before
+    a lookup when something was written since the previous one."""
+
+    def __init__(self, indexes: dict[str, str]):
+        super().__init__(indexes=indexes)
+        self._written = False
+
+    def mark_written(self) -> None:
+        self._written = True
+
+    def _refresh(self) -> None:
+        if not self._written or not self._indexes:
+            return
+
+        elastic_client.indices.refresh(index=",".join(self._indexes.values()))
+        self._written = False
+
+    def _fetch_parameter_types(self, parameter_type_ids: set[int]):
+        self._refresh()
+        return super()._fetch_parameter_types(parameter_type_ids)
+
+    def _fetch_linked_values(
+        self, index: str, attribute: str, instance_ids: set[int]
+    ):
+        self._refresh()
+        return super()._fetch_linked_values(
+            index=index, attribute=attribute, instance_ids=instance_ids
+        )
+
+
+class TopicReplay:
+    def __init__(
+        self,
+        source: str = "inventory",
+        topic: str | None = None,
+        from_offsets: dict[int, int] | int | None = None,
+        from_timestamp: datetime | None = None,
+        instances: Iterable[str] = REPLAY_INSTANCES,
+        batch_objects: int = 50_000,
+        bulk_in_flight: int = 8,
+        swap: bool = True,
+        delete_old: bool = False,
+        allow_partial: bool = False,
+    ):
+        self._source = source
+        self._topic = topic or REPLAY_SOURCE_TOPICS[source]
+        self._from_offsets = from_offsets
+        self._from_timestamp = from_timestamp
+        self._batch_objects = batch_objects
+        self._bulk_in_flight = bulk_in_flight
+        self._swap = swap
+        self._delete_old = delete_old
+        self._allow_partial = allow_partial
+        self.stats = ReplayStats()
+
+        suffix = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        self._suffix = suffix
+        self._group_id = f"{KAFKA_CONSUMER_GROUP_ID}-replay-{suffix}"
+        # "rebuild_" keeps the new indexes out of the event_manager* pattern,
+        # they are reached through the aliases once switched
+        self._targets = {
+            name: ReplayTarget(
+                alias=InventoryChangesIndexes[name].value,
+                index=f"rebuild_{InventoryChangesIndexes[name].value}_{suffix}",
+            )
+            for name in instances
+        }
+        self._state_targets = {
+            name: ReplayTarget(
+                alias=InventoryStateIndexes[name].value,
+                index=f"rebuild_{InventoryStateIndexes[name].value}_{suffix}",
+            )
+            for name in instances
+        }
+        self._converter = ReplayParameterConverter(
+            indexes={
+                name: target.index for name, target in self._targets.items()
+            }
+        )
+        self._processors: dict[str, InventoryEventProcessor] = {}
+
+        if source == "inventory":
+            deserializers = create_inventory_changes_deserializers(
+                topic=self._topic
+            )
+            self._parse = lambda message: parse_inventory_changes(
+                message=message, deserializers=deserializers
+            )
+        else:
+            self._parse = parse_event_changes
+
+    def _check_partial_replay(self) -> None:
+        if self._from_offsets is None and self._from_timestamp is None:
+            return
+
+        if not self._allow_partial:
+            raise PartialReplay(
+                "A replay from an offset or timestamp misses the earlier "
+                "history, run it with --no-swap or --allow-partial"
+            )
+        if self._delete_old:
+            raise PartialReplay(
+                "The indexes replaced by a partial replay can't be deleted"
+            )
+
+        logger.warning(
+            "Partial replay from %s: the aliases will be switched to "
+            "indexes without the history before it",
+            self._from_timestamp or self._from_offsets,
+        )
+
+    def _check_live_indexes(self) -> None:
+        targets = list(self._targets.values())
+        if ES_STATE_INDEXES_ENABLED:
+            targets.extend(self._state_targets.values())
+
+        for target in targets:
+            if (
+                elastic_client.indices.exists(index=target.alias)
+                and not elastic_client.indices.exists_alias(name=target.alias)
+                and not self._delete_old
+            ):
+                raise LiveIndexIsNotAlias(
+                    f"{target.alias} is an index, it can only be replaced "
+                    f"by an alias when the old indexes are deleted"
+                )
+
+    def _create_indexes(self) -> None:
+        for target in self._targets.values():
+            elastic_client.indices.create(
+                index=target.index,
+                body=get_events_index_body(**BULK_LOAD_SETTINGS),
+            )
+
+        # active events are read with realtime mget from the state indexes,
+        # the events indexes can't be searched without a refresh
+        for target in self._state_targets.values():
+            elastic_client.indices.create(
+                index=target.index,
+                body=get_state_index_body(**BULK_LOAD_SETTINGS),
+            )
+
+    def _create_processors(self) -> None:
+        configure_bulk_parallelism(self._bulk_in_flight)
+        for name, target in self._targets.items():
+            self._processors[name] = _PROCESSORS[name](
+                elastic_index=target.index,
+                state_index=self._state_targets[name].index,
+                converter=self._converter,
+                search_fallback=False,
+            )
+
+    def _create_consumer(self) -> Consumer:
+        config = create_consumer_config(
+            topic=self._topic,
+            processor_name="TopicReplay",
+            group_id=self._group_id,
+            auto_offset_reset="earliest",
+        )
+        consumer_config = ConsumerInitializer._set_consumer_config(config)
+        consumer_config["enable.partition.eof"] = True
+        return Consumer(consumer_config)
+
+    def _get_start_offsets(
+        self, consumer: Consumer, partitions: list[int]
+    ) -> dict[int, int]:
+        if self._from_timestamp is not None:
+            timestamp = int(self._from_timestamp.timestamp() * 1000)
+            found = consumer.offsets_for_times(
+                [
+                    TopicPartition(self._topic, partition, timestamp)
+                    for partition in partitions
+                ],
+                timeout=_KAFKA_TIMEOUT,
+            )
+            return {tp.partition: tp.offset for tp in found}
+
+        if isinstance(self._from_offsets, int):
+            return {partition: self._from_offsets for partition in partitions}
+
+        from_offsets = self._from_offsets or {}
+        return {
+            partition: from_offsets.get(partition, OFFSET_BEGINNING)
+            for partition in partitions
+        }
+
+    def _get_offset_ranges(
+        self, consumer: Consumer
+    ) -> dict[int, tuple[int, int]]:
+        metadata = consumer.list_topics(
+            topic=self._topic, timeout=_KAFKA_TIMEOUT
+        ).topics.get(self._topic)
+        if metadata is None or metadata.error is not None:
+            raise ReplayTopicNotFound(f"Topic {self._topic} is not available")
+
+        partitions = sorted(metadata.partitions)
+        start_offsets = self._get_start_offsets(consumer, partitions)
+
+        ranges = {}
+        for partition in partitions:
+            low, high = consumer.get_watermark_offsets(
+                TopicPartition(self._topic, partition), timeout=_KAFKA_TIMEOUT
+            )
+            start = start_offsets[partition]
+            if start == OFFSET_BEGINNING:
+                start = low
+            elif start < 0:
+                # no messages after the timestamp
+                continue
+
+            start = max(start, low)
+            if start < high:
+                ranges[partition] = (start, high)
+
+        return ranges
+
+    def _read_messages(
+        self, consumer: Consumer, ranges: dict[int, tuple[int, int]]
+    ) -> Iterator:
+        """Yield the messages of the partitions up to their end offsets.
+        Partitions are merged by message timestamp, so that changes of one
+        instance sent with different keys keep their order."""
+        consumer.assign(
+            [
+                TopicPartition(self._topic, partition, start)
+                for partition, (start, _) in ranges.items()
+            ]
+        )
+        buffers = {partition: deque() for partition in ranges}
+        reading = set(ranges)
+        paused = set()
+
+        def finish(partition: int) -> None:
+            reading.discard(partition)
+            paused.discard(partition)
+            consumer.pause([TopicPartition(self._topic, partition)])
+
+        while buffers:
+            if not all(buffers[partition] for partition in reading):
+                for message in consumer.consume(
+                    num_messages=_PARTITION_BUFFER_SIZE, timeout=1.0
+                ):
+                    partition = message.partition()
+                    if message.error():
+                        if message.error().code() != KafkaError._PARTITION_EOF:
+                            raise KafkaException(message.error())
+                        finish(partition)
+                        continue
+
+                    if partition not in reading:
+                        continue
+
+                    end = ranges[partition][1]
+                    if message.offset() < end:
+                        buffers[partition].append(message)
+                    if message.offset() >= end - 1:
+                        finish(partition)
+                    elif len(buffers[partition]) >= _PARTITION_BUFFER_SIZE:
+                        consumer.pause([TopicPartition(self._topic, partition)])
+                        paused.add(partition)
+                continue
+
+            while all(buffers[partition] for partition in reading):
+                candidates = [p for p, buffer in buffers.items() if buffer]
+                if not candidates:
+                    break
+
+                partition = min(
+                    candidates,
+                    key=lambda p: (buffers[p][0].timestamp()[1], p),
+                )
+                yield buffers[partition].popleft()
+
+                if (
+                    partition in paused
+                    and len(buffers[partition]) < _PARTITION_BUFFER_SIZE // 2
+                ):
+                    consumer.resume([TopicPartition(self._topic, partition)])
+                    paused.discard(partition)
+
+            for partition in [p for p, buffer in buffers.items() if not buffer]:
+                if partition not in reading:
+                    del buffers[partition]
+
+    def _read_changes(self, messages: Iterable) -> Iterator[InventoryChanges]:
+        for message in messages:
+            self.stats.messages += 1
+            if message.key() is None:
+                self.stats.skipped_messages += 1
+                continue
+
+            try:
+                changes = self._parse(message)
+            except Exception:
+                logger.exception(
+                    "Unable to parse message %s:%s",
+                    message.partition(),
+                    message.offset(),
+                )
+                self.stats.skipped_messages += 1
+                continue
+
+            if changes.instance_type not in self._processors:
+                self.stats.skipped_messages += 1
+                continue
+
+            yield changes
+
+    @staticmethod
+    def _group_changes(
+        changes: Iterable[InventoryChanges], max_objects: int
+    ) -> Iterator[InventoryChanges]:
+        # only consecutive messages are merged to keep per-instance order
+        for _, same_key in itertools.groupby(
+            changes, key=lambda item: item.group_key
+        ):
+            group: list[InventoryChanges] = []
+            objects_count = 0
+            for item in same_key:
+                group.append(item)
+                objects_count += len(item.instances)
+                if objects_count >= max_objects:
+                    yield _merge_changes(group)
+                    group, objects_count = [], 0
+
+            if group:
+                yield _merge_changes(group)
+
+    def _process(self, changes: InventoryChanges) -> None:
+        instances = list(changes.instances)
+        try:
+            self._processors[changes.instance_type].process(
+                instances=instances,
+                event_type=changes.event_type,
+                user_id=changes.user_id,
+                session_id=changes.session_id,
+                instance_type=changes.instance_type,
+            )
+        except Exception:
+            logger.exception(
+                "Replay of %s %s %s objects failed",
+                len(instances),
+                changes.instance_type,
+                changes.event_type,
+            )
+            self.stats.failed_objects += len(instances)
+
+        self.stats.objects += len(instances)
+        self._converter.mark_written()
+
+    def _check_complete(self) -> None:
+        self.stats.dead_letters = sum(
+            processor.bulk_metrics.dead_letters
+            for processor in self._processors.values()
+        )
+        if not self.stats.failed_objects and not self.stats.dead_letters:
+            return
+
+        raise ReplayIsIncomplete(
+            f"{self.stats.failed_objects} objects failed and "
+            f"{self.stats.dead_letters} bulk items were sent to the dead "
+            f"letter index, the aliases are not switched to "
+            f"{[target.index for target in self._targets.values()]}"
+        )
+
+    def _finish_indexes(self) -> None:
+        indexes = [target.index for target in self._targets.values()]
+        if ES_STATE_INDEXES_ENABLED:
+            indexes.extend(
+                target.index for target in self._state_targets.values()
+            )
+        else:
+            elastic_client.indices.delete(
+                index=",".join(
+                    target.index for target in self._state_targets.values()
+                )
+            )
+
+        elastic_client.indices.put_settings(
+            index=",".join(indexes), settings=SERVING_SETTINGS
+        )
+        elastic_client.indices.refresh(index=",".join(indexes))
+
+    def _switch_aliases(self) -> None:
+        targets = list(self._targets.values())
+        if ES_STATE_INDEXES_ENABLED:
+            targets.extend(self._state_targets.values())
+
+        actions = []
+        old_indexes = []
+        for target in targets:
+            target_actions, replaced = get_alias_switch_actions(
+                alias=target.alias, indexes=[target.index]
+            )
+            actions.extend(target_actions)
+            old_indexes.extend(replaced)
+
+        if ES_ROLLOVER_ENABLED:
+            for target in self._targets.values():
+                actions.extend(
+                    get_write_alias_switch_actions(
+                        alias=target.alias, index=target.index
+                    )
+                )
+
+        elastic_client.indices.update_aliases(actions=actions)
+        logger.info("Aliases switched: %s", actions)
+
+        if ES_ROLLOVER_ENABLED:
+            for target in self._targets.values():
+                roll_over_to_backing_index(
+                    alias=target.alias, suffix=self._suffix
+                )
+
+        if not old_indexes:
+            return
+
+        if self._delete_old:
+            elastic_client.indices.delete(index=",".join(old_indexes))
+            logger.info("Deleted previous indexes: %s", old_indexes)
+        else:
+            logger.info("Previous indexes are kept: %s", old_indexes)
+
+    def _log_progress(self, started: float) -> None:
+        seconds = time.monotonic() - started
+        logger.info(
+            "Replayed %s messages, %s objects in %.0f s (%.0f objects/s)",
+            self.stats.messages,
+            self.stats.objects,
+            seconds,
+            self.stats.objects / seconds if seconds else 0,
+        )
+
+    def run(self) -> ReplayStats:
+        if self._swap:
+            self._check_partial_replay()
+            self._check_live_indexes()
+
+        self._create_indexes()
+        self._create_processors()
+        logger.info(
+            "Replaying %s into %s",
+            self._topic,
+            [target.index for target in self._targets.values()],
+        )
+
+        started = time.monotonic()
+        last_progress = started
+        consumer = self._create_consumer()
+        try:
+            ranges = self._get_offset_ranges(consumer)
+            logger.info("Offset ranges by partition: %s", ranges)
+
+            changes = self._read_changes(self._read_messages(consumer, ranges))
+            for group in self._group_changes(changes, self._batch_objects):
+                self._process(group)
+                if time.monotonic() - last_progress >= _PROGRESS_INTERVAL:
+                    self._log_progress(started)
+                    last_progress = time.monotonic()
+
+        finally:
+            consumer.close()
+
+        self._log_progress(started)
+        self._finish_indexes()
+        self.stats.seconds = time.monotonic() - started
+        if self._swap:
+            self._check_complete()
+            self._switch_aliases()
+
+        return self.stats
+
+
+def _merge_changes(group: list[InventoryChanges]) -> InventoryChanges:
+    if len(group) == 1:
+        return group[0]
+
+    return group[0]._replace(
+        instances=[
+            instance for changes in group for instance in changes.instances
+        ]
+    )
@@ -0,0 +1,10 @@
+class UserDirectoryException(Exception):
+    pass
+
+
+class UserDirectoryAccessDenied(UserDirectoryException):
+    pass
+
+
+class UserDirectoryUnavailable(UserDirectoryException):
+    pass
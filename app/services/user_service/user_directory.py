@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import NamedTuple
+from urllib.parse import quote
+
+import aiohttp
+from cachetools import LRUCache, TTLCache
+
+from config.cache_config import (
+    USER_DIRECTORY_CACHE_MAX_SIZE,
+    USER_DIRECTORY_CACHE_TTL_SECONDS,
+    USER_DIRECTORY_MAX_CONCURRENT_REQUESTS,
+)
+from config.security_config import (
+    KEYCLOAK_REALM,
+    KEYCLOAK_REDIRECT_HOST,
+    KEYCLOAK_REDIRECT_PROTOCOL,
+)
+from services.user_service.exceptions import (
+    UserDirectoryAccessDenied,
+    UserDirectoryUnavailable,
+)
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_TIMEOUT_SECONDS = 10
+_ACCESS_CACHE_MAX_SIZE = 10_000
+_ACCESS_CACHE_TTL_SECONDS = 60
+
+
+class CachedUser(NamedTuple):
+    username: str | None
+    fetched_at: float
+
+
+class UserDirectory:
+    """Usernames of Keycloak user ids, fetched one user at a time for the
+    ids actually shown instead of the whole realm.
+
+    A cached name older than `ttl` is still returned and refreshed in the
+    background, only unknown ids wait for Keycloak. Lookups of the same id
+    running at the same time share one request. Ids Keycloak does not know
+    are cached as None, failed requests are not cached.
+
+    Names are shared by all callers, so a caller has to pass
+    `check_access` first: its token must be allowed to read the users of
+    the realm, like the realm user list the names used to come from.
+    """
+
+    def __init__(
+        self,
+        max_size: int = USER_DIRECTORY_CACHE_MAX_SIZE,
+        ttl: float = USER_DIRECTORY_CACHE_TTL_SECONDS,
+        max_concurrent_requests: int = USER_DIRECTORY_MAX_CONCURRENT_REQUESTS,
+    ):
+        self._ttl = ttl
+        self._max_concurrent_requests = max_concurrent_requests
+        self._users: LRUCache = LRUCache(maxsize=max_size)
+        # token digest -> whether the token may read the users
+        self._access: TTLCache = TTLCache(
+            maxsize=_ACCESS_CACHE_MAX_SIZE, ttl=_ACCESS_CACHE_TTL_SECONDS
+        )
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._background_tasks: set[asyncio.Task] = set()
+        self._session: aiohttp.ClientSession | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @staticmethod
+    def _get_users_url() -> str:
+        return (
+            f"{KEYCLOAK_REDIRECT_PROTOCOL}://{KEYCLOAK_REDIRECT_HOST}"
+            f"/admin/realms/{KEYCLOAK_REALM}/users"
+        )
+
+    def _get_url(self, user_id: str) -> str:
+        return f"{self._get_users_url()}/{quote(user_id, safe='')}"
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=_REQUEST_TIMEOUT_SECONDS)
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+        return self._session
+
+    async def _request(self, user_id: str, token: str | None) -> str | None:
+        session = self._get_session()
+        headers = {"Authorization": token} if token else {}
+        async with self._semaphore:
+            async with session.get(
+                self._get_url(user_id), headers=headers
+            ) as response:
+                if response.status == 404:
+                    return None
+                response.raise_for_status()
+                return (await response.json()).get("username")
+
+    async def _request_access(self, token: str | None) -> bool:
+        session = self._get_session()
+        headers = {"Authorization": token} if token else {}
+        try:
+            async with self._semaphore:
+                async with session.get(
+                    f"{self._get_users_url()}/count", headers=headers
+                ) as response:
+                    if response.status in (401, 403):
+                        return False
+                    response.raise_for_status()
+                    return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise UserDirectoryUnavailable(
+                "Unable to check access to the users"
+            ) from e
+
+    async def check_access(self, token: str | None) -> None:
+        """Raise UserDirectoryAccessDenied unless the token may read the
+        users of the realm. The answer is kept for a minute per token."""
+        key = hashlib.sha256((token or "").encode()).hexdigest()
+        allowed = self._access.get(key)
+        if allowed is None:
+            allowed = await self._request_access(token)
+            self._access[key] = allowed
+
+        if not allowed:
+            raise UserDirectoryAccessDenied("Not allowed to read the users")
+
+    async def _fetch(self, user_id: str, token: str | None) -> str | None:
+        try:
+            username = await self._request(user_id, token)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.warning("Unable to fetch user %s", user_id, exc_info=True)
+            cached = self._users.get(user_id)
+            return cached.username if cached is not None else None
+        finally:
+            self._in_flight.pop(user_id, None)
+
+        self._users[user_id] = CachedUser(
+            username=username, fetched_at=time.monotonic()
+        )
+        return username
+
+    def _start_fetch(self, user_id: str, token: str | None) -> asyncio.Future:
+        future = self._in_flight.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(user_id, token))
+            self._in_flight[user_id] = future
+        return future
+
+    def _refresh_in_background(self, user_id: str, token: str | None) -> None:
+        if user_id in self._in_flight:
+            return
+        task = self._start_fetch(user_id, token)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def get_usernames(
+        self, user_ids: set[str], token: str | None
+    ) -> dict[str, str | None]:
+        now = time.monotonic()
+        usernames: dict[str, str | None] = {}
+        missing: list[str] = []
+        for user_id in user_ids:
+            cached = self._users.get(user_id)
+            if cached is None:
+                missing.append(user_id)
+                continue
+
+            usernames[user_id] = cached.username
+            if now - cached.fetched_at >= self._ttl:
+                self._refresh_in_background(user_id, token)
+
+        if missing:
+            # a cancelled caller must not cancel the requests other
+            # lookups of the same ids wait for
+            fetched = await asyncio.gather(
+                *(
+                    asyncio.shield(self._start_fetch(user_id, token))
+                    for user_id in missing
+                )
+            )
+            usernames.update(zip(missing, fetched))
+
+        return usernames
+
+    async def close(self) -> None:
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+user_directory = UserDirectory()
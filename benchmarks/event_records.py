@@ -0,0 +1,101 @@
+"""Per-attribute cost of building an event document for the bulk request:
+the pydantic EventsBase model against the slotted EventRecord, with and
+without JSON serialization by the Elasticsearch client.
+
+    python benchmarks/event_records.py --attributes 1000000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from elastic_transport import JsonSerializer  # noqa: E402
+
+from services.event_processor.inventory_processor.records import (  # noqa: E402
+    EventRecord,
+)
+from services.event_processor.inventory_processor.typed_values import (  # noqa: E402
+    TYPED_VALUE_FIELDS,
+)
+from services.kafka_service.inventory_changes_processor.schemas import (  # noqa: E402
+    EventsBase,
+)
+
+_serializer = JsonSerializer()
+
+
+def _pydantic_document(attribute: int) -> dict:
+    return EventsBase(
+        event_type="UPDATED",
+        new_value=f"value-{attribute}",
+        old_value="previous",
+        instance_id="1234567",
+        user_id="user",
+        attribute="name",
+        version=2,
+        is_active=True,
+        valid_from="2024-01-01T00:00:00.000000Z",
+        session_id="session",
+    ).dict()
+
+
+def _record_document(attribute: int) -> dict:
+    return EventRecord(
+        event_type="UPDATED",
+        new_value=f"value-{attribute}",
+        old_value="previous",
+        instance_id=int("1234567"),
+        user_id="user",
+        attribute="name",
+        version=2,
+        is_active=True,
+        valid_from="2024-01-01T00:00:00.000000Z",
+        session_id="session",
+    ).to_document()
+
+
+def _run(build, attributes: int, serialize: bool) -> None:
+    for attribute in range(attributes):
+        document = build(attribute)
+        if serialize:
+            _serializer.dumps(document)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--attributes", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    record_document = {
+        key: value
+        for key, value in _record_document(0).items()
+        if key not in TYPED_VALUE_FIELDS
+    }
+    if _serializer.dumps(_pydantic_document(0)) != _serializer.dumps(
+        record_document
+    ):
+        raise AssertionError("EventRecord document differs from EventsBase")
+
+    print(f"{'builder':<10} {'serialized':<11} {'ns/attribute':>13}")
+    for serialize in (False, True):
+        for name, build in (
+            ("pydantic", _pydantic_document),
+            ("record", _record_document),
+        ):
+            seconds = min(
+                timeit.repeat(
+                    lambda: _run(build, args.attributes, serialize),
+                    number=1,
+                    repeat=args.repeat,
+                )
+            )
+            per_attribute = seconds / args.attributes * 1e9
+            print(f"{name:<10} {str(serialize):<11} {per_attribute:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
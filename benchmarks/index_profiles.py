@@ -0,0 +1,205 @@
+"""Compares the event index profiles on a running Elasticsearch: disk
+footprint of the same synthetic events and latency of the history and
+active events queries.
+
+    python benchmarks/index_profiles.py --events 1000000 --profiles 1,2
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from services.elastic_service.elastic_client import (  # noqa: E402
+    BULK_LOAD_SETTINGS,
+    elastic_client,
+    get_events_index_body,
+)
+from services.event_processor.inventory_processor.bulk_writer import (  # noqa: E402
+    ElasticsearchBulkWriter,
+)
+from services.event_processor.inventory_processor.constants import (  # noqa: E402
+    DATETIME_FORMAT,
+)
+from services.event_processor.inventory_processor.records import (  # noqa: E402
+    EventRecord,
+)
+from services.event_processor.inventory_processor.utils import (  # noqa: E402
+    generate_record_id,
+)
+
+_ATTRIBUTES = ("value", "tprm_id", "mo_id", "version")
+_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _generate_events(events: int, instances: int, seed: int) -> list[tuple]:
+    """Events of random instances in arrival order, like the consumer
+    writes them: versions of an instance interleaved with others."""
+    rng = random.Random(seed)
+    versions: dict[tuple[int, str], int] = {}
+    generated = []
+    for number in range(events):
+        instance_id = rng.randrange(1, instances + 1)
+        attribute = rng.choice(_ATTRIBUTES)
+        version = versions.get((instance_id, attribute), 0) + 1
+        versions[(instance_id, attribute)] = version
+        valid_from = _START + timedelta(seconds=number)
+        value = (
+            f"value-{rng.randrange(1000)}"
+            if attribute == "value"
+            else rng.randrange(1, 100_000)
+        )
+        generated.append((instance_id, attribute, version, valid_from, value))
+    return generated
+
+
+def _load(index: str, profile: int, events: list[tuple]) -> float:
+    if elastic_client.indices.exists(index=index):
+        elastic_client.indices.delete(index=index)
+    elastic_client.indices.create(
+        index=index,
+        body=get_events_index_body(
+            profile_version=profile, routing=False, **BULK_LOAD_SETTINGS
+        ),
+    )
+
+    started = time.perf_counter()
+    writer = ElasticsearchBulkWriter(index)
+    for instance_id, attribute, version, valid_from, value in events:
+        event_type = "CREATED" if version == 1 else "UPDATED"
+        writer.add_index(
+            doc_id=generate_record_id(
+                instance_id=instance_id,
+                attribute=attribute,
+                version=version,
+                event_type=event_type,
+            ),
+            document=EventRecord(
+                event_type=event_type,
+                new_value=value,
+                instance_id=instance_id,
+                user_id="benchmark",
+                attribute=attribute,
+                version=version,
+                is_active=True,
+                valid_from=valid_from.strftime(DATETIME_FORMAT),
+                session_id=None,
+            ).to_document(),
+        )
+    writer.flush()
+    seconds = time.perf_counter() - started
+
+    elastic_client.indices.refresh(index=index)
+    # compare merged indexes, not the segments left by the load
+    elastic_client.indices.forcemerge(index=index, max_num_segments=1)
+    return seconds
+
+
+def _store_size(index: str) -> int:
+    stats = elastic_client.indices.stats(index=index, metric="store")
+    return stats["indices"][index]["primaries"]["store"]["size_in_bytes"]
+
+
+def _queries(instances: int, rng: random.Random) -> dict[str, dict]:
+    instance_id = rng.randrange(1, instances + 1)
+    instance_ids = rng.sample(range(1, instances + 1), 50)
+    return {
+        "instance history": {
+            "query": {
+                "bool": {"filter": [{"term": {"instance_id": instance_id}}]}
+            },
+            "sort": [{"valid_from": {"order": "desc"}}],
+            "size": 50,
+        },
+        "parameter values": {
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"terms": {"instance_id": instance_ids}},
+                        {"term": {"attribute": "value"}},
+                    ]
+                }
+            },
+            "sort": [{"valid_from": {"order": "desc"}}],
+            "size": 100,
+            "track_total_hits": True,
+        },
+        "active events": {
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"terms": {"instance_id": instance_ids}},
+                        {"term": {"is_active": True}},
+                    ]
+                }
+            },
+            "sort": [
+                {"instance_id": "asc"},
+                {"attribute": "asc"},
+                {"version": "asc"},
+            ],
+            "size": 1000,
+            "track_total_hits": False,
+        },
+    }
+
+
+def _measure(
+    index: str, instances: int, queries: int, seed: int
+) -> dict[str, list[float]]:
+    rng = random.Random(seed)
+    latencies: dict[str, list[float]] = {}
+    for _ in range(queries):
+        for name, body in _queries(instances, rng).items():
+            started = time.perf_counter()
+            elastic_client.search(index=index, body=body, request_cache=False)
+            latencies.setdefault(name, []).append(
+                (time.perf_counter() - started) * 1000
+            )
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--instances", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--profiles", default="1,2")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the benchmark indexes"
+    )
+    args = parser.parse_args()
+
+    profiles = [int(profile) for profile in args.profiles.split(",")]
+    events = _generate_events(args.events, args.instances, args.seed)
+
+    print(
+        f"{'profile':<8} {'query':<17} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'MiB':>8} {'load s':>8}"
+    )
+    for profile in profiles:
+        index = f"benchmark_events_profile_{profile}"
+        load_seconds = _load(index, profile, events)
+        size = _store_size(index) / 2**20
+        latencies = _measure(index, args.instances, args.queries, args.seed)
+        for name, values in latencies.items():
+            values.sort()
+            p50 = statistics.median(values)
+            p95 = values[int(len(values) * 0.95) - 1]
+            print(
+                f"{profile:<8} {name:<17} {p50:>8.2f} {p95:>8.2f} "
+                f"{size:>8.1f} {load_seconds:>8.1f}"
+            )
+
+        if not args.keep:
+            elastic_client.indices.delete(index=index)
+
+
+if __name__ == "__main__":
+    main()
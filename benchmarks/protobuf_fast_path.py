@@ -0,0 +1,193 @@
+"""Compares the dict deserialization of inventory changes with the protobuf
+fast path on a single message, for CPU time and peak memory.
+
+    python benchmarks/protobuf_fast_path.py --objects 100000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from google.protobuf.struct_pb2 import Struct  # noqa: E402
+from google.protobuf.timestamp_pb2 import Timestamp  # noqa: E402
+from resistant_kafka_avataa.message_desirializers import (  # noqa: E402
+    MessageDeserializer,
+)
+
+from services.grpc_service.proto_files.inventory_instances.files.inventory_instances_pb2 import (  # noqa: E402
+    ListMO,
+    ListPRM,
+    MO,
+    PRM,
+)
+from services.kafka_service.inventory_changes_processor.protobuf_reader import (  # noqa: E402
+    DELETED_EVENT_FIELDS,
+    read_inventory_instances,
+)
+
+# magic byte, schema id and message index written by the schema registry
+_SCHEMA_REGISTRY_PREFIX = b"\x00\x00\x00\x00\x01\x00\x00"
+
+
+class _Message:
+    def __init__(self, key: str, value: bytes) -> None:
+        self._key = key.encode("utf-8")
+        self._value = value
+
+    def key(self) -> bytes:
+        return self._key
+
+    def value(self) -> bytes:
+        return self._value
+
+
+def _build_mo_message(objects: int, event_type: str) -> _Message:
+    timestamp = Timestamp(seconds=1_700_000_000, nanos=123_000_000)
+    message = ListMO()
+    for i in range(1, objects + 1):
+        pov = Struct()
+        pov.update({"color": "red", "size": i % 10, "visible": True})
+        geometry = Struct()
+        geometry.update(
+            {
+                "path": {
+                    "type": "LineString",
+                    "coordinates": [[i * 0.1, i * 0.2], [i * 0.3, i * 0.4]],
+                },
+            }
+        )
+        message.objects.append(
+            MO(
+                id=i,
+                name=f"object-{i}",
+                pov=pov,
+                geometry=geometry,
+                active=True,
+                latitude=55.75 + i / objects,
+                longitude=37.61 + i / objects,
+                tmo_id=i % 100 + 1,
+                p_id=i // 2,
+                model="model",
+                version=i % 5 + 1,
+                status="ACTIVE",
+                creation_date=timestamp,
+                modification_date=timestamp,
+                label=f"label-{i}",
+            )
+        )
+    return _Message(
+        key=f"MO:{event_type}",
+        value=_SCHEMA_REGISTRY_PREFIX + message.SerializeToString(),
+    )
+
+
+def _build_prm_message(objects: int, event_type: str) -> _Message:
+    message = ListPRM()
+    for i in range(1, objects + 1):
+        message.objects.append(
+            PRM(
+                id=i,
+                value=f"value-{i}",
+                tprm_id=i % 300 + 1,
+                mo_id=i // 3 + 1,
+                version=i % 5 + 1,
+            )
+        )
+    return _Message(
+        key=f"PRM:{event_type}",
+        value=_SCHEMA_REGISTRY_PREFIX + message.SerializeToString(),
+    )
+
+
+def _dict_path(deserializers: MessageDeserializer, message: _Message) -> int:
+    count = 0
+    for _ in deserializers.deserialize_to_dict(message=message)["objects"]:
+        count += 1
+    return count
+
+
+def _fast_path(
+    deserializers: MessageDeserializer,
+    message: _Message,
+    fields: frozenset[str] | None,
+) -> int:
+    count = 0
+    for _ in read_inventory_instances(
+        deserializers=deserializers, message=message, fields=fields
+    ):
+        count += 1
+    return count
+
+
+def _measure(function, *args) -> tuple[float, float]:
+    gc.collect()
+    started = time.process_time()
+    function(*args)
+    cpu_seconds = time.process_time() - started
+
+    gc.collect()
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return cpu_seconds, peak / 1024 / 1024
+
+
+def _check_equal(
+    deserializers: MessageDeserializer,
+    message: _Message,
+    fields: frozenset[str] | None,
+) -> None:
+    expected = deserializers.deserialize_to_dict(message=message)["objects"]
+    if fields is not None:
+        expected = [
+            {key: value for key, value in instance.items() if key in fields}
+            for instance in expected
+        ]
+    actual = list(
+        read_inventory_instances(
+            deserializers=deserializers, message=message, fields=fields
+        )
+    )
+    if actual != expected:
+        raise AssertionError("Fast path differs from MessageToDict")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=100_000)
+    args = parser.parse_args()
+
+    deserializers = MessageDeserializer(topic="inventory.changes")
+    deserializers.register_protobuf_deserializer(ListMO)
+    deserializers.register_protobuf_deserializer(ListPRM)
+
+    cases = [
+        ("MO:UPDATED", _build_mo_message(args.objects, "UPDATED"), None),
+        (
+            "MO:DELETED",
+            _build_mo_message(args.objects, "DELETED"),
+            DELETED_EVENT_FIELDS,
+        ),
+        ("PRM:UPDATED", _build_prm_message(args.objects, "UPDATED"), None),
+    ]
+
+    print(f"{'case':<12} {'path':<6} {'cpu, s':>8} {'peak, MiB':>10}")
+    for name, message, fields in cases:
+        _check_equal(deserializers, message, fields)
+        for path, function, function_args in (
+            ("dict", _dict_path, (deserializers, message)),
+            ("fast", _fast_path, (deserializers, message, fields)),
+        ):
+            cpu_seconds, peak = _measure(function, *function_args)
+            print(f"{name:<12} {path:<6} {cpu_seconds:>8.2f} {peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from services.event_processor.inventory_processor.cache import (
+    ActiveEvent,
+    ActiveEventsCache,
+)
+
+_EVENTS = {
+    "name": ActiveEvent(doc_id="1:name:1:CREATED", version=1, new_value="a")
+}
+
+
+def test_disabled():
+    cache = ActiveEventsCache(max_bytes=0)
+    cache.set(index="events", instance_id=1, events=_EVENTS)
+
+    assert not cache.enabled
+    assert cache.get_many(index="events", instance_ids=[1]) == ({}, [1])
+
+
+def test_get_many():
+    cache = ActiveEventsCache(max_bytes=1_000_000)
+    cache.set(index="events", instance_id=1, events=_EVENTS)
+    cache.set(index="events", instance_id=2, events={})
+
+    found, missing_ids = cache.get_many(index="events", instance_ids=[1, 2, 3])
+
+    assert found == {1: _EVENTS, 2: {}}
+    assert missing_ids == [3]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_are_per_index():
+    cache = ActiveEventsCache(max_bytes=1_000_000)
+    cache.set(index="events", instance_id=1, events=_EVENTS)
+
+    assert cache.get_many(index="other", instance_ids=[1]) == ({}, [1])
+
+
+def test_entries_are_copies():
+    cache = ActiveEventsCache(max_bytes=1_000_000)
+    events = dict(_EVENTS)
+    cache.set(index="events", instance_id=1, events=events)
+    events["label"] = ActiveEvent(doc_id="x", version=1, new_value="b")
+
+    found, _ = cache.get_many(index="events", instance_ids=[1])
+    found[1].pop("name")
+
+    assert cache.get_many(index="events", instance_ids=[1])[0] == {1: _EVENTS}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ActiveEventsCache(max_bytes=1_000)
+    for instance_id in range(10):
+        cache.set(index="events", instance_id=instance_id, events=_EVENTS)
+
+    found, missing_ids = cache.get_many(
+        index="events", instance_ids=list(range(10))
+    )
+
+    assert 9 in found
+    assert 0 in missing_ids
+    assert cache.stats()["size_bytes"] <= 1_000
+
+
+def test_entry_larger_than_the_budget_is_dropped():
+    cache = ActiveEventsCache(max_bytes=1_000)
+    cache.set(index="events", instance_id=1, events=_EVENTS)
+    large = {"name": ActiveEvent(doc_id="1", version=2, new_value="a" * 2_000)}
+    cache.set(index="events", instance_id=1, events=large)
+
+    assert cache.get_many(index="events", instance_ids=[1]) == ({}, [1])
+
+
+def test_clear():
+    cache = ActiveEventsCache(max_bytes=1_000_000)
+    cache.set(index="events", instance_id=1, events=_EVENTS)
+    cache.clear()
+
+    assert cache.get_many(index="events", instance_ids=[1]) == ({}, [1])
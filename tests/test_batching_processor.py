@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from services.kafka_service.inventory_changes_processor import processor
+from services.kafka_service.inventory_changes_processor.processor import (
+    BatchingInventoryChangesProcessor,
+    InventoryChanges,
+)
+
+
+class _Message:
+    def __init__(self, partition, offset, key=b"MO:created"):
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+
+    def error(self):
+        return None
+
+    def key(self):
+        return self._key
+
+    def topic(self):
+        return "inventory"
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+
+class _Partition:
+    def __init__(self, topic, partition):
+        self.topic = topic
+        self.partition = partition
+
+
+class _Consumer:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.commits = 0
+        self.seeks = []
+
+    def poll(self, timeout):
+        return self.messages.pop(0) if self.messages else None
+
+    def commit(self, asynchronous):
+        self.commits += 1
+
+    def assignment(self):
+        return [_Partition("inventory", 0), _Partition("inventory", 1)]
+
+    def seek(self, partition):
+        self.seeks.append(
+            (partition.topic, partition.partition, partition.offset)
+        )
+
+
+class _Executor:
+    async def run(self, function, **kwargs):
+        return function(**kwargs)
+
+
+class _Config:
+    processor_name = "inventory-changes"
+
+
+def _parse_message(message):
+    instance_type, event_type = message.key().decode().split(":")
+    return InventoryChanges(
+        instance_type=instance_type,
+        event_type=event_type,
+        user_id=None,
+        session_id=None,
+        instances=[{"id": message.offset()}],
+    )
+
+
+def _build_processor(messages, dispatch):
+    batching = BatchingInventoryChangesProcessor.__new__(
+        BatchingInventoryChangesProcessor
+    )
+    batching._config = _Config()
+    batching._consumer = _Consumer(messages)
+    batching._executor = _Executor()
+    batching._paused_at = None
+    batching._max_objects = 100
+    batching._max_wait = 0.01
+    batching._batch_offsets = {}
+    batching._parse_message = _parse_message
+    batching._dispatch_changes = dispatch
+    return batching
+
+
+@pytest.fixture(autouse=True)
+def _no_pause(monkeypatch):
+    monkeypatch.setattr(processor, "_BATCH_ERROR_PAUSE_SECONDS", 0)
+
+
+def test_batch_is_committed():
+    dispatched = []
+
+    async def dispatch(changes):
+        dispatched.extend(changes.instances)
+
+    batching = _build_processor(
+        [_Message(0, 5), _Message(0, 6), _Message(1, 3)], dispatch
+    )
+    asyncio.run(batching.process())
+
+    assert dispatched == [{"id": 5}, {"id": 6}, {"id": 3}]
+    assert batching._consumer.commits == 1
+    assert batching._consumer.seeks == []
+
+
+def test_failed_batch_is_consumed_again():
+    async def dispatch(changes):
+        raise RuntimeError("Elasticsearch is unavailable")
+
+    batching = _build_processor(
+        [_Message(0, 5), _Message(0, 6), _Message(1, 3)], dispatch
+    )
+    asyncio.run(batching.process())
+
+    assert batching._consumer.commits == 0
+    assert sorted(batching._consumer.seeks) == [
+        ("inventory", 0, 5),
+        ("inventory", 1, 3),
+    ]
+
+
+def test_unparsable_message_is_consumed_again():
+    async def dispatch(changes):
+        pass
+
+    batching = _build_processor(
+        [_Message(0, 5), _Message(0, 6, key=b"no type")], dispatch
+    )
+    asyncio.run(batching.process())
+
+    assert batching._consumer.commits == 0
+    assert batching._consumer.seeks == [("inventory", 0, 5)]
+
+
+def test_unsupported_changes_are_skipped():
+    dispatched = []
+
+    async def dispatch(changes):
+        dispatched.extend(changes.instances)
+
+    batching = _build_processor(
+        [_Message(0, 5, key=b"XYZ:created"), _Message(0, 6)], dispatch
+    )
+    asyncio.run(batching.process())
+
+    assert dispatched == [{"id": 6}]
+    assert batching._consumer.commits == 1
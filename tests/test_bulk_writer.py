@@ -0,0 +1,112 @@
+from elasticsearch import ConnectionError
+
+from services.event_processor.inventory_processor import bulk_writer
+from services.event_processor.inventory_processor.bulk_writer import (
+    ElasticsearchBulkWriter,
+    dump_ndjson_line,
+    split_failed_items,
+)
+
+
+def _item(action: str, doc_id: str) -> bytes:
+    return dump_ndjson_line({action: {"_index": "events", "_id": doc_id}})
+
+
+def test_no_errors():
+    items = [_item("create", "1")]
+    response = {"errors": False, "items": [{"create": {"status": 201}}]}
+
+    assert split_failed_items(items, response) == ([], [])
+
+
+def test_create_conflict_counts_as_written():
+    items = [_item("create", "1")]
+    response = {
+        "errors": True,
+        "items": [
+            {
+                "create": {
+                    "status": 409,
+                    "error": {"type": "version_conflict_engine_exception"},
+                }
+            }
+        ],
+    }
+
+    assert split_failed_items(items, response) == ([], [])
+
+
+def test_update_conflict_fails():
+    items = [_item("update", "1")]
+    response = {
+        "errors": True,
+        "items": [
+            {
+                "update": {
+                    "status": 409,
+                    "error": {"type": "version_conflict_engine_exception"},
+                }
+            }
+        ],
+    }
+
+    to_retry, failed = split_failed_items(items, response)
+
+    assert to_retry == []
+    assert [failed_item.item for failed_item in failed] == items
+
+
+def test_rejected_items_are_retried():
+    items = [_item("create", str(doc_id)) for doc_id in range(4)]
+    response = {
+        "errors": True,
+        "items": [
+            {"create": {"status": 201}},
+            {"create": {"status": 429, "error": {"type": "circuit_breaking"}}},
+            {
+                "create": {
+                    "status": 500,
+                    "error": {"type": "es_rejected_execution_exception"},
+                }
+            },
+            {"create": {"status": 400, "error": {"type": "mapper_parsing"}}},
+        ],
+    }
+
+    to_retry, failed = split_failed_items(items, response)
+
+    assert [failed_item.item for failed_item in to_retry] == items[1:3]
+    assert [failed_item.item for failed_item in failed] == items[3:]
+    assert failed[0].outcome["status"] == 400
+
+
+class _RestartingNode:
+    def __init__(self, failures):
+        self.failures = failures
+        self.requests = 0
+
+    def options(self, **kwargs):
+        return self
+
+    def bulk(self, body):
+        self.requests += 1
+        if self.requests <= self.failures:
+            raise ConnectionError("Connection refused")
+
+        items = body.splitlines()[::2]
+        return {"errors": False, "items": [{"create": {}} for _ in items]}
+
+
+def test_connection_errors_are_retried(monkeypatch):
+    node = _RestartingNode(failures=2)
+    monkeypatch.setattr(bulk_writer, "elastic_client", node)
+    writer = ElasticsearchBulkWriter(
+        "events", max_in_flight=1, initial_backoff=0, max_backoff=0
+    )
+
+    writer.add_index(doc_id="1", document={"attribute": "name"})
+    writer.flush()
+
+    assert node.requests == 3
+    assert writer.metrics.retried_items == 2
+    assert writer.metrics.dead_letters == 0
@@ -0,0 +1,28 @@
+import pytest
+
+from common.constants import get_instance_by_event_index
+
+
+@pytest.mark.parametrize(
+    ("index", "instance"),
+    [
+        ("event_manager_object", "MO"),
+        ("event_manager_object_type", "TMO"),
+        ("event_manager_parameter", "PRM"),
+        ("event_manager_parameter_type", "TPRM"),
+        ("event_manager_object-000002", "MO"),
+        ("rebuild_event_manager_parameter_20240101120000", "PRM"),
+        ("rebuild_event_manager_parameter_type_20240101120000-000001", "TPRM"),
+        ("legacy_event_manager_object_type", "TMO"),
+    ],
+)
+def test_event_index(index, instance):
+    assert get_instance_by_event_index(index) == instance
+
+
+@pytest.mark.parametrize(
+    "index",
+    ["event_dead_letter", "event_state_object", "event_manager_other", ""],
+)
+def test_other_index(index):
+    assert get_instance_by_event_index(index) is None
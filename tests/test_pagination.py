@@ -0,0 +1,42 @@
+import base64
+
+import pytest
+
+from routers.event_router.exceptions import InvalidCursor
+from routers.event_router.pagination import decode_cursor, encode_cursor
+
+
+def test_round_trip():
+    cursor = encode_cursor(
+        pit_id="pit", search_after=[1, "a", 7], total=42, query_hash="hash"
+    )
+
+    assert decode_cursor(cursor, query_hash="hash") == {
+        "pit": "pit",
+        "after": [1, "a", 7],
+        "total": 42,
+    }
+
+
+def test_cursor_of_another_query():
+    cursor = encode_cursor(
+        pit_id="pit", search_after=[1], total=1, query_hash="hash"
+    )
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, query_hash="other")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"[1, 2]").decode(),
+        base64.urlsafe_b64encode(b'{"pit": "pit"}').decode(),
+    ],
+)
+def test_malformed_cursor(cursor):
+    with pytest.raises(InvalidCursor) as error:
+        decode_cursor(cursor, query_hash="hash")
+
+    assert error.value.status_code == 400
@@ -0,0 +1,106 @@
+from services.event_processor.inventory_processor.bulk_writer import (
+    BulkWriterMetrics,
+)
+from services.event_processor.inventory_processor.cache import ActiveEvent
+from services.event_processor.inventory_processor.processor import (
+    ParameterEventProcessor,
+)
+
+
+class _Writer:
+    def __init__(self):
+        self.events = []
+        self.metrics = BulkWriterMetrics()
+
+    def add_index(self, *, document, **kwargs):
+        self.events.append(document)
+
+    def add_update(self, **kwargs):
+        pass
+
+    def add_document(self, **kwargs):
+        pass
+
+    def add_delete(self, **kwargs):
+        pass
+
+    def flush(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def pop_failed_keys(self):
+        return set()
+
+
+class _Converter:
+    def prefetch(self, instances):
+        pass
+
+    def convert(self, parameter_instance):
+        return parameter_instance.value
+
+
+def _build_processor(monkeypatch, active_events=None):
+    processor = ParameterEventProcessor(converter=_Converter())
+    writer = _Writer()
+    processor._bulk = writer
+    monkeypatch.setattr(
+        processor,
+        "_get_active_events",
+        lambda instance_ids: {
+            instance_id: dict((active_events or {}).get(instance_id, {}))
+            for instance_id in instance_ids
+        },
+    )
+    return processor, writer
+
+
+def _process(processor, instance, event_type):
+    processor.process(
+        instances=[instance],
+        event_type=event_type,
+        user_id=None,
+        session_id=None,
+        instance_type="PRM",
+    )
+
+
+def test_created_events_carry_the_parent_ids(monkeypatch):
+    processor, writer = _build_processor(monkeypatch)
+
+    _process(
+        processor,
+        {"id": "1", "value": "a", "mo_id": "3", "tprm_id": "7", "version": 1},
+        "CREATED",
+    )
+
+    assert {event["attribute"] for event in writer.events} == {
+        "value",
+        "mo_id",
+        "tprm_id",
+        "version",
+    }
+    assert all(
+        event["mo_id"] == 3 and event["tprm_id"] == 7 for event in writer.events
+    )
+
+
+def test_parent_ids_of_partial_changes_come_from_active_events(monkeypatch):
+    active_events = {
+        1: {
+            "value": ActiveEvent(doc_id="v", version=1, new_value="a"),
+            "mo_id": ActiveEvent(doc_id="m", version=1, new_value=3),
+            "tprm_id": ActiveEvent(doc_id="t", version=1, new_value=7),
+        }
+    }
+    processor, writer = _build_processor(monkeypatch, active_events)
+
+    _process(processor, {"id": "1", "value": "b", "version": 2}, "UPDATED")
+    _process(processor, {"id": "1", "value": "b", "version": 3}, "DELETED")
+
+    assert writer.events
+    assert all(
+        event["mo_id"] == 3 and event["tprm_id"] == 7 for event in writer.events
+    )
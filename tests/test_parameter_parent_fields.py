@@ -0,0 +1,97 @@
+from services.elastic_service.elastic_client import EVENTS_INDEX_MAPPINGS
+from services.elastic_service.migrations import parameter_parent_fields
+
+
+class _Writer:
+    def __init__(self):
+        self.updates = []
+
+    def add_update(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+def _event(doc_id, instance_id, attribute, version, new_value=None):
+    return {
+        "_id": doc_id,
+        "_index": "event_manager_parameter",
+        "_source": {
+            "instance_id": instance_id,
+            "attribute": attribute,
+            "version": version,
+            "new_value": new_value,
+        },
+    }
+
+
+_PARENT_EVENTS = [
+    _event("1:mo_id:1", 1, "mo_id", 1, "3"),
+    _event("1:mo_id:2", 1, "mo_id", 2, "4"),
+    _event("1:tprm_id:1", 1, "tprm_id", 1, "7"),
+    # a deleted PRM keeps the ids of its last events
+    _event("2:mo_id:1", 2, "mo_id", 1, "5"),
+    _event("2:mo_id:2", 2, "mo_id", 2),
+]
+
+
+def _iter_parent_events(queries):
+    def iter_index_documents(index, source, filter_query):
+        queries.append(filter_query)
+        return iter(_PARENT_EVENTS)
+
+    return iter_index_documents
+
+
+def test_parent_fields_are_read_from_the_newest_events(monkeypatch):
+    queries = []
+    monkeypatch.setattr(
+        parameter_parent_fields,
+        "iter_index_documents",
+        _iter_parent_events(queries),
+    )
+
+    parents = parameter_parent_fields._get_parent_fields(
+        ["event_manager_parameter"], [1, 2]
+    )
+
+    assert parents == {1: {"mo_id": 4, "tprm_id": 7}, 2: {"mo_id": 5}}
+    # the events index is not dynamic, a filter on an unmapped field
+    # matches nothing
+    mapped_fields = EVENTS_INDEX_MAPPINGS["properties"]
+    for clause in queries[0]["bool"]["filter"]:
+        ((_, condition),) = clause.items()
+        field = (
+            condition["field"]
+            if "field" in condition
+            else next(iter(condition))
+        )
+        assert field in mapped_fields
+
+
+def test_backfill_chunk_updates_the_events_of_known_prms(monkeypatch):
+    monkeypatch.setattr(
+        parameter_parent_fields,
+        "iter_index_documents",
+        _iter_parent_events([]),
+    )
+    writer = _Writer()
+    hits = [
+        _event("1:value:1", 1, "value", 1, "a"),
+        _event("2:value:1", 2, "value", 1, "b"),
+        _event("9:value:1", 9, "value", 1, "c"),
+    ]
+
+    documents = parameter_parent_fields._backfill_chunk(
+        writer, ["event_manager_parameter"], hits
+    )
+
+    assert documents == 2
+    assert [
+        (update["doc_id"], update["document"]) for update in writer.updates
+    ] == [
+        ("1:value:1", {"mo_id": 4, "tprm_id": 7}),
+        ("2:value:1", {"mo_id": 5}),
+    ]
+    assert all(
+        update["index"] == "event_manager_parameter"
+        for update in writer.updates
+    )
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+from google.protobuf import json_format
+
+from services.grpc_service.proto_files.inventory_instances.files.inventory_instances_pb2 import (
+    MO,
+    TMO,
+)
+from services.kafka_service.inventory_changes_processor.protobuf_reader import (
+    DELETED_EVENT_FIELDS,
+    message_to_instance,
+)
+
+
+def _build_mo(**fields) -> MO:
+    message = MO(
+        id=2**40,
+        name="object",
+        active=True,
+        tmo_id=3,
+        version=2,
+        **fields,
+    )
+    message.pov.update({"key": "value", "nested": {"count": 1}})
+    message.creation_date.FromJsonString("2024-01-01T00:00:00.500Z")
+    return message
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        _build_mo(latitude=1.5, longitude=-2.25),
+        _build_mo(latitude=math.nan, longitude=math.inf),
+        _build_mo(longitude=-math.inf),
+        MO(),
+        TMO(id=1, primary=[1, 2**40], label=[3], virtual=True),
+    ],
+)
+def test_same_as_message_to_dict(message):
+    assert message_to_instance(message) == json_format.MessageToDict(
+        message, preserving_proto_field_name=True
+    )
+
+
+def test_limited_fields():
+    message = _build_mo(latitude=1.5)
+
+    assert message_to_instance(message, fields=DELETED_EVENT_FIELDS) == {
+        "id": str(2**40),
+        "version": 2,
+        "creation_date": "2024-01-01T00:00:00.500Z",
+    }
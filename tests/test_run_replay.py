@@ -0,0 +1,17 @@
+import pytest
+
+from run_replay import parse_offsets
+
+
+def test_offset_of_every_partition():
+    assert parse_offsets("100") == 100
+
+
+def test_offsets_by_partition():
+    assert parse_offsets("0:100,1:0,2:5") == {0: 100, 1: 0, 2: 5}
+
+
+@pytest.mark.parametrize("value", ["a", "0:a", "0:1:2", "0:1,"])
+def test_malformed_offsets(value):
+    with pytest.raises(ValueError):
+        parse_offsets(value)
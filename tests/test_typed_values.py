@@ -0,0 +1,83 @@
+import math
+from decimal import Decimal
+
+import pytest
+
+from services.event_processor.inventory_processor.typed_values import (
+    build_typed_value_fields,
+)
+
+
+def test_none():
+    assert build_typed_value_fields("new_value", None) == {}
+
+
+def test_bool_is_not_a_number():
+    assert build_typed_value_fields("new_value", True) == {
+        "new_value_bool": True
+    }
+
+
+def test_string():
+    assert build_typed_value_fields("old_value", "abc") == {
+        "old_value_str": "abc"
+    }
+
+
+def test_date_time_with_offset():
+    assert build_typed_value_fields(
+        "new_value", "2024-01-01T00:00:00+00:00"
+    ) == {
+        "new_value_str": "2024-01-01T00:00:00+00:00",
+        "new_value_dt": 1_704_067_200_000,
+    }
+
+
+@pytest.mark.parametrize(
+    "value", ["2024-01-01T00:00:00", "2024-01-01", "2024-13-01T00:00:00Z"]
+)
+def test_not_a_date_time(value):
+    assert build_typed_value_fields("new_value", value) == {
+        "new_value_str": value
+    }
+
+
+@pytest.mark.parametrize(
+    ("value", "number"), [(5, 5.0), (2.5, 2.5), (Decimal("1.5"), 1.5)]
+)
+def test_number(value, number):
+    assert build_typed_value_fields("new_value", value) == {
+        "new_value_num": number,
+        "new_value_dt": int(value),
+    }
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_non_finite_number(value):
+    assert build_typed_value_fields("new_value", value) == {}
+
+
+def test_number_beyond_float():
+    assert build_typed_value_fields("new_value", 10**400) == {}
+
+
+def test_number_beyond_epoch_millis():
+    assert build_typed_value_fields("new_value", 2**70) == {
+        "new_value_num": float(2**70)
+    }
+
+
+def test_list():
+    assert build_typed_value_fields(
+        "new_value", [1, "a", None, [2], math.nan, True]
+    ) == {
+        "new_value_len": 6,
+        "new_value_num": [1.0],
+        "new_value_dt": [1],
+        "new_value_str": ["a"],
+        "new_value_bool": [True],
+    }
+
+
+def test_empty_list():
+    assert build_typed_value_fields("new_value", []) == {"new_value_len": 0}